@@ -0,0 +1,81 @@
+# log_generator.py - Deterministic synthetic log files in the viewer's format
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+WORDS = ['connection', 'timeout', 'refused', 'request', 'user', 'session', 'cache',
+         'reset', 'database', 'query', 'retry', 'handler', 'worker', 'started', 'done',
+         'payload', 'socket', 'commit', 'rollback', 'scheduler', 'token', 'expired']
+
+# Share of each level, roughly what a service at info verbosity writes
+DEFAULT_LEVELS = {'info': 0.6, 'debug': 0.25, 'warning': 0.1, 'error': 0.04, 'trace': 0.01}
+
+START = datetime(2024, 1, 1)
+
+
+def parse_level_mix(value):
+    # 'info=60,error=5' -> {'info': 60.0, 'error': 5.0}
+    mix = {}
+    for part in value.split(','):
+        level, _, weight = part.partition('=')
+        mix[level.strip().lower()] = float(weight)
+    return mix
+
+
+def generate_lines(count, seed=0, levels=None, out_of_order=0.001, line_length=(40, 160),
+                   step_us=2000, multiline=0.0):
+    # Lines of one file: timestamps advance by up to step_us, a share of
+    # out_of_order lines is written up to a second late, like a buffered
+    # writer. multiline is the share of entries followed by a continuation
+    # line (a stack trace frame) the parser does not match
+    rng = random.Random(seed)
+    levels = levels or DEFAULT_LEVELS
+    names, weights = list(levels), list(levels.values())
+    micros = seed * 997
+    min_length, max_length = line_length
+    for line_num in range(count):
+        micros += rng.randint(0, step_us)
+        stamp = micros
+        if out_of_order and rng.random() < out_of_order:
+            stamp = max(0, micros - rng.randint(1, 1000000))
+        timestamp = (START + timedelta(microseconds=stamp)).strftime('%Y-%m-%d %H:%M:%S.%f')
+        level = rng.choices(names, weights)[0]
+        message = f"user={rng.randint(1, 9999)} request_id=r{rng.randint(1, 999)} took {rng.randint(1, 999)}ms"
+        length = rng.randint(min_length, max_length)
+        while len(message) < length:
+            message += ' ' + rng.choice(WORDS)
+        yield f"[{timestamp}] [{level.upper()}] {message}\n"
+        if multiline and rng.random() < multiline:
+            yield f"    at {rng.choice(WORDS)}.{rng.choice(WORDS)}(Handler.java:{rng.randint(1, 500)})\n"
+
+
+def generate_files(directory, files=4, lines=250000, seed=42, **options):
+    # Writes files app0.log ... and returns their paths. The same arguments
+    # always give the same bytes
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(files):
+        path = os.path.join(directory, f"app{index}.log")
+        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+            f.writelines(generate_lines(lines, seed=seed * 1000 + index, **options))
+        paths.append(path)
+    return paths
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Generate synthetic log files")
+    arg_parser.add_argument('directory')
+    arg_parser.add_argument('--files', type=int, default=4)
+    arg_parser.add_argument('--lines', type=int, default=250000, help="lines per file")
+    arg_parser.add_argument('--seed', type=int, default=42)
+    arg_parser.add_argument('--levels', type=parse_level_mix, help="level weights, e.g. info=60,error=5")
+    arg_parser.add_argument('--out-of-order', type=float, default=0.001, help="share of late lines")
+    arg_parser.add_argument('--min-length', type=int, default=40)
+    arg_parser.add_argument('--max-length', type=int, default=160)
+    arg_parser.add_argument('--multiline', type=float, default=0.0, help="share of entries with a continuation line")
+    args = arg_parser.parse_args()
+    paths = generate_files(args.directory, args.files, args.lines, args.seed, levels=args.levels,
+                           out_of_order=args.out_of_order, line_length=(args.min_length, args.max_length),
+                           multiline=args.multiline)
+    print(f"{len(paths)} files, {sum(map(os.path.getsize, paths)) / 1e6:.1f} MB in {args.directory}")
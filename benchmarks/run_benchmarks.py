@@ -0,0 +1,243 @@
+# run_benchmarks.py - Times loading, filtering, display and export on generated logs
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from core.exporter import export_to_json, export_to_ndjson, export_to_txt
+from core.field_extractor import DEFAULT_FIELDS
+from core.highlight_map import HighlightMap
+from core.log_filter import LogFilter
+from core.log_parser import LogParser
+from core.log_query import parse_query
+from core.log_store import from_micros
+from log_generator import generate_files
+
+# A case is slower than the baseline when its time grows by more than this
+REGRESSION_THRESHOLD = 0.10
+
+
+class StubText:
+    # The calls LogView makes on its Text widget, without a display
+
+    def __init__(self, height=800):
+        self.height = height
+        self.chars = 0
+
+    def delete(self, *args):
+        self.chars = 0
+
+    def insert(self, index, text, *tags):
+        self.chars += len(text)
+
+    def tag_add(self, *args):
+        pass
+
+    def tag_config(self, *args, **kwargs):
+        pass
+
+    def tag_raise(self, *args):
+        pass
+
+    def yview_moveto(self, fraction):
+        pass
+
+    def winfo_height(self):
+        return self.height
+
+
+class StubScrollbar:
+
+    def set(self, first, last):
+        pass
+
+
+def make_view():
+    # LogView without its widgets, None when tkinter is not installed
+    try:
+        from gui.log_view import LogView
+    except ImportError:
+        return None
+    view = LogView.__new__(LogView)
+    view.entries = []
+    view.first = 0
+    view.all_selected = False
+    view.text = StubText()
+    view.y_scrollbar = StubScrollbar()
+    view.line_height = 16
+    view.highlights = HighlightMap()
+    view.highlight_tags = set()
+    return view
+
+
+def measure(function, repeat, memory):
+    # Best wall time of repeat runs, then one traced run for the peak
+    # (tracemalloc slows Python code down, so it is never timed)
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def build_cases(paths, work_dir):
+    # name -> (function, input bytes for the parse cases)
+    input_bytes = sum(map(os.path.getsize, paths))
+    store = LogParser().parse_files(paths)
+    middle = from_micros(store.timestamps[len(store) // 2])
+    quarter = timedelta(microseconds=(store.timestamps[-1] - store.timestamps[0]) // 4)
+
+    query = parse_query(f'level:error,warning after:"{middle - quarter}" (timeout OR re:"took 9\\d\\dms") -msg:retry')
+
+    warm = LogFilter()
+    warm.apply_query(store, query)
+
+    def filtered(**kwargs):
+        # A fresh LogFilter, so indexes are built as on the first filter after a load
+        return lambda: LogFilter().apply(store, **kwargs)
+
+    cases = {
+        'parse': (lambda: LogParser().parse_files(paths), input_bytes),
+        'parse_parallel': (lambda: LogParser(workers=0).parse_files(paths), input_bytes),
+        'parse_lazy_text': (lambda: LogParser(lazy_text=True).parse_files(paths), input_bytes),
+        'parse_templates': (lambda: LogParser(templates=True).parse_files(paths), input_bytes),
+        'parse_fields': (lambda: LogParser(fields=DEFAULT_FIELDS).parse_files(paths), input_bytes),
+        'filter_level': (filtered(levels=['error', 'warning']), None),
+        'filter_time': (filtered(time_from=middle - quarter, time_to=middle + quarter), None),
+        'filter_text': (filtered(search_text='timeout'), None),
+        'filter_regex': (filtered(search_text=r'took 9\d\dms', regex=True), None),
+        'filter_combined': (filtered(levels=['error'], time_from=middle - quarter, search_text='retry'), None),
+        'filter_query': ((lambda: LogFilter().apply_query(store, query)), None),
+        # Going back to a recent filter, answered from the result cache
+        'filter_cached': ((lambda: warm.apply_query(store, query)), None),
+    }
+
+    view = make_view()
+    if view is not None:
+        selection = LogFilter().apply(store, levels=['error', 'warning', 'info'])
+
+        def display():
+            view.set_entries(selection)
+            for row in range(0, len(selection), max(1, len(selection) // 100)):
+                view.scroll_to(row)
+        cases['display'] = (display, None)
+
+    for name, exporter in (('export_txt', export_to_txt), ('export_json', export_to_json),
+                           ('export_ndjson', export_to_ndjson)):
+        path = os.path.join(work_dir, f"{name}.out")
+        cases[name] = ((lambda exporter=exporter, path=path: exporter(store, path)), None)
+    return store, cases
+
+
+def run(args):
+    work_dir = args.data or tempfile.mkdtemp(prefix='logviewer_bench_')
+    try:
+        return run_in(args, work_dir)
+    finally:
+        if not args.data:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_in(args, work_dir):
+    paths = generate_files(work_dir, args.files, args.lines, args.seed,
+                           out_of_order=args.out_of_order, line_length=(args.min_length, args.max_length))
+    store, cases = build_cases(paths, work_dir)
+    selected = [name for name in cases if not args.cases or name in args.cases]
+
+    results = {}
+    for name in selected:
+        function, input_bytes = cases[name]
+        seconds, peak, result = measure(function, args.repeat, not args.no_memory)
+        # Entries produced (parsed, matched); display and exports produce files or nothing
+        entries = len(result) if hasattr(result, '__len__') else len(store)
+        results[name] = {
+            'seconds': round(seconds, 6),
+            'entries': entries,
+            'entries_per_second': round(len(store) / seconds) if seconds else None,
+            'mb_per_second': round(input_bytes / 1e6 / seconds, 2) if input_bytes and seconds else None,
+            'peak_mb': round(peak / 1e6, 2) if peak is not None else None,
+        }
+        print(f"{name:18} {seconds * 1000:10.1f} ms  {results[name]['entries']:10} entries"
+              + (f"  peak {results[name]['peak_mb']:8.1f} MB" if peak is not None else ''), file=sys.stderr)
+
+    return {
+        'meta': {
+            'time': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'files': args.files,
+            'lines_per_file': args.lines,
+            'entries': len(store),
+            'input_mb': round(sum(map(os.path.getsize, paths)) / 1e6, 2),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    # Cases whose time or peak memory grew by more than threshold
+    regressions = []
+    for name, result in report['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        for key in ('seconds', 'peak_mb'):
+            old, new = before.get(key), result.get(key)
+            if old and new and new > old * (1 + threshold):
+                regressions.append({'case': name, 'metric': key, 'baseline': old, 'current': new,
+                                    'change': round(new / old - 1, 3)})
+    return regressions
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmark parsing, filtering, display and export")
+    arg_parser.add_argument('--files', type=int, default=4)
+    arg_parser.add_argument('--lines', type=int, default=100000, help="lines per file")
+    arg_parser.add_argument('--seed', type=int, default=42)
+    arg_parser.add_argument('--out-of-order', type=float, default=0.001)
+    arg_parser.add_argument('--min-length', type=int, default=40)
+    arg_parser.add_argument('--max-length', type=int, default=160)
+    arg_parser.add_argument('--repeat', type=int, default=3, help="timed runs per case, the best is kept")
+    arg_parser.add_argument('--cases', nargs='*', help="only run these cases")
+    arg_parser.add_argument('--data', help="directory for the generated logs (default: a temporary one)")
+    arg_parser.add_argument('--no-memory', action='store_true', help="skip the traced run for peak memory")
+    arg_parser.add_argument('--output', help="write the JSON report here instead of standard output")
+    arg_parser.add_argument('--baseline', help="JSON report to compare against")
+    arg_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = arg_parser.parse_args()
+
+    report = run(args)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report['regressions'] = regressions
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']} {regression['metric']}: "
+                  f"{regression['baseline']} -> {regression['current']} (+{regression['change']:.0%})", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,55 @@
+# search_benchmark.py - Substring vs regex search throughput on a synthetic store
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from core.log_store import LogStore
+from core.text_search import TextSearch
+
+WORDS = ['connection', 'timeout', 'refused', 'request', 'user', 'session', 'cache',
+         'reset', 'database', 'query', 'retry', 'handler', 'worker', 'started', 'done']
+
+QUERIES = [
+    ('substring', 'timeout', False),
+    ('regex literal', 'timeout', True),
+    ('regex alternatives', 'timeout|refused|reset', True),
+    ('regex class', r'user=\d+', True),
+    ('regex anchored', r'^retry \w+', True),
+]
+
+
+def build_store(count, seed=42):
+    rng = random.Random(seed)
+    store = LogStore()
+    file_id = store.file_id('synthetic.log')
+    for line_num in range(1, count + 1):
+        message = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+        message += f" user={rng.randint(1, 9999)} took {rng.randint(1, 999)}ms"
+        raw = f"[2024-01-01 00:00:00.000000] [info] {message}"
+        store.append(line_num, 'info', file_id, line_num, raw, len(raw) - len(message))
+    return store
+
+
+def run(count):
+    store = build_store(count)
+    search = TextSearch(store)
+    search.update()
+    text_mb = sum(len(haystack) for haystack, _ in search.blocks) / 1e6
+
+    baseline = None
+    for name, query, regex in QUERIES:
+        search.last_query = None
+        start = time.perf_counter()
+        matches = search.find_regex(query) if regex else search.find(query)
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = elapsed
+        print(f"{name:20} {query:24} {len(matches):8} matches "
+              f"{text_mb / elapsed:8.1f} MB/s  x{elapsed / baseline:.1f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -1,10 +1,18 @@
-from gui.app_window import AppWindow
-import tkinter as tk
+import multiprocessing
+import sys
 
 def main():
+    multiprocessing.freeze_support()
+    if '--no-gui' in sys.argv[1:]:
+        # Headless, tkinter is never imported
+        from cli import run
+        sys.exit(run(sys.argv[1:]))
+
+    import tkinter as tk
+    from gui.app_window import AppWindow
     root = tk.Tk()
     AppWindow(root)
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
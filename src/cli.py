@@ -0,0 +1,174 @@
+import argparse
+from datetime import datetime
+import os
+import re
+import sys
+from typing import Iterable, Iterator, List
+
+from core.exporter import EXPORTERS, STDOUT
+from core.log_entry import LogEntry
+from core.log_filter import LogFilter
+from core.log_merger import REORDER_WINDOW, merge_streams
+from core.log_parser import LogParser
+from core.log_query import QueryError, check_field_names, parse_query
+from core.log_store import KNOWN_LEVELS
+from core.source_reader import find_log_files
+
+# Headless mode, started with --no-gui. Files are read line by line and
+# merged as streams, so memory stays flat whatever their size; nothing
+# here imports tkinter
+
+EXIT_OK = 0
+EXIT_NO_MATCH = 1
+EXIT_ERROR = 2
+EXIT_INTERRUPTED = 130
+
+
+class EntryCounter:
+    # Passes entries through and counts them, for the exit code, and the
+    # ones written before an earlier timestamp (late beyond the window)
+
+    def __init__(self, entries: Iterable[LogEntry]):
+        self.entries = entries
+        self.count = 0
+        self.late = 0
+
+    def __iter__(self) -> Iterator[LogEntry]:
+        last = None
+        for entry in self.entries:
+            self.count += 1
+            if last is not None and entry.timestamp < last:
+                self.late += 1
+            else:
+                last = entry.timestamp
+            yield entry
+
+
+def parse_time(value: str) -> datetime:
+    # 'YYYY-MM-DD HH:MM:SS' as in the window, fractions and a 'T' are accepted too
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time '{value}', expected YYYY-MM-DD HH:MM:SS")
+
+
+def parse_levels(value: str) -> List[str]:
+    return [level.strip().lower() for level in value.split(',') if level.strip()]
+
+
+def positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"invalid number '{value}', expected a positive integer")
+    return number
+
+
+def parse_fields(value: str) -> List[str]:
+    try:
+        return list(check_field_names(name.strip() for name in value.split(',') if name.strip()))
+    except QueryError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(
+        prog='LogViewer',
+        description="Merge log files by time, filter them and write the entries without the window.",
+        epilog="Files are merged as they are read, so memory stays flat: a line more than --window "
+               "entries late in its file cannot be moved back and is written out of time order, "
+               "with a warning giving the count. "
+               "Exit status is 0 when entries were written, 1 when none matched, 2 on errors.")
+    arg_parser.add_argument('--no-gui', action='store_true', help="run without the window (required)")
+    arg_parser.add_argument('paths', nargs='+', metavar='PATH', help="log files, or folders to take the log files from")
+    arg_parser.add_argument('--level', dest='levels', action='append', type=parse_levels, metavar='LEVEL',
+                            help=f"keep these levels, repeated or comma separated ({', '.join(KNOWN_LEVELS)})")
+    arg_parser.add_argument('--from', dest='time_from', type=parse_time, metavar='TIME', help="keep entries at or after TIME")
+    arg_parser.add_argument('--to', dest='time_to', type=parse_time, metavar='TIME', help="keep entries at or before TIME")
+    arg_parser.add_argument('--grep', dest='search_text', metavar='TEXT', help="keep messages containing TEXT, ignoring case")
+    arg_parser.add_argument('--regex', action='store_true', help="TEXT is a regular expression")
+    arg_parser.add_argument('--fields', type=parse_fields, default=(), metavar='NAME,...',
+                            help="extract these key=value fields, usable as query terms (request_id:r42)")
+    arg_parser.add_argument('--query', metavar='QUERY',
+                            help="keep entries matching QUERY, e.g. 'level:error file:db*.log -msg:\"heartbeat\"'")
+    arg_parser.add_argument('--format', dest='export_format', choices=sorted(EXPORTERS), default='txt', help="output format (default: txt)")
+    arg_parser.add_argument('-o', '--output', default=STDOUT, metavar='FILE', help="write to FILE instead of standard output")
+    arg_parser.add_argument('--gzip', action='store_true', help="gzip compress the output")
+    arg_parser.add_argument('--window', type=positive_int, default=REORDER_WINDOW, metavar='N',
+                            help=f"entries held back per file to put late lines in time order (default: {REORDER_WINDOW})")
+    return arg_parser
+
+
+def collect_files(paths: List[str]) -> List[str]:
+    # Folders expand to their log files, like File > Open Folder
+    file_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_paths += sorted(find_log_files(path))
+        elif path not in file_paths:
+            file_paths.append(path)
+    return file_paths
+
+
+def run(argv: List[str]) -> int:
+    args = build_arg_parser().parse_args(argv)
+    levels = [level for group in args.levels for level in group] if args.levels else None
+
+    file_paths = collect_files(args.paths)
+    missing = [path for path in file_paths if not os.path.isfile(path)]
+    if missing or not file_paths:
+        print(f"LogViewer: no such file: {', '.join(missing) or ' '.join(args.paths)}", file=sys.stderr)
+        return EXIT_ERROR
+
+    parser = LogParser(fields=args.fields)
+    try:
+        matches = LogFilter().matcher(levels, args.time_from, args.time_to, args.search_text, args.regex)
+    except re.error as e:
+        print(f"LogViewer: invalid pattern: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    if args.query:
+        try:
+            query = parse_query(args.query, args.fields)
+        except QueryError as e:
+            print(f"LogViewer: invalid query: {e}", file=sys.stderr)
+            return EXIT_ERROR
+        fixed = matches
+        matches = lambda entry: fixed(entry) and query.matches(entry)
+
+    entries = EntryCounter(filter(matches, merge_streams([parser.iter_entries(path) for path in file_paths], args.window)))
+    exporter = EXPORTERS[args.export_format]
+    kwargs = {'compress': args.gzip}
+    if args.export_format == 'json':
+        # The count is only known at the end
+        kwargs['metadata'] = {'export_time': datetime.now().isoformat(), 'files': file_paths}
+
+    try:
+        exporter(entries, args.output, **kwargs)
+    except BrokenPipeError:
+        # The reader stopped early (| head); stdout goes nowhere from here
+        # on so the interpreter does not fail flushing it at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+    except KeyboardInterrupt:
+        remove_partial(args.output)
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        remove_partial(args.output)
+        print(f"LogViewer: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    if entries.late:
+        print(f"LogViewer: {entries.late} entries were more than {args.window} entries late in their file "
+              f"and are out of time order, use a larger --window", file=sys.stderr)
+    return EXIT_OK if entries.count else EXIT_NO_MATCH
+
+
+def remove_partial(file_path: str):
+    if file_path == STDOUT:
+        return
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
@@ -1,31 +1,185 @@
+import gzip
 import json
+from json.encoder import encode_basestring_ascii
+import os
+import sys
+import threading
 from datetime import datetime
-from typing import List
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
+from core import perf
 from core.log_entry import LogEntry
+from core.log_store import LogSelection, LogStore, from_micros
 
-def export_to_json(entries : List[LogEntry], file_path, metadata=None):
-    export_data = {
-        'metadata': metadata or {
-            'export_time': datetime.now().isoformat(),
-            'entry_count': len(entries)
-        },
-        'entries': [entry.to_dict() for entry in entries]
+# Entries formatted per write, the memory used by an export stays around
+# one chunk of text whatever the number of entries
+EXPORT_CHUNK = 4096
+
+WRITE_BUFFER = 1024 * 1024
+
+class ExportCancelled(Exception):
+    pass
+
+# Output path that stands for standard output
+STDOUT = '-'
+
+def open_output(file_path, compress=False):
+    # Text file for the export, gzip compressed on the fly when asked.
+    # Standard output is wrapped, not closed, when the export ends
+    if file_path == STDOUT:
+        if compress:
+            return gzip.open(sys.stdout.buffer, 'wt', encoding='utf-8', compresslevel=6)
+        return open(sys.stdout.fileno(), 'w', encoding='utf-8', buffering=WRITE_BUFFER, closefd=False)
+    if compress:
+        return gzip.open(file_path, 'wt', encoding='utf-8', compresslevel=6)
+    return open(file_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER)
+
+def iter_records(entries) -> Iterator[Tuple[str, str, str, str, int]]:
+    # (ISO timestamp, level, message, file name, line number) per entry.
+    # Store-backed entries are read from the columns, without building a
+    # LogEntry; entries are in time order, so the formatted second is reused
+    if isinstance(entries, (LogStore, LogSelection)):
+        store = entries.store if isinstance(entries, LogSelection) else entries
+        indices = entries.indices if isinstance(entries, LogSelection) else range(len(store))
+        timestamps, level_codes, file_ids = store.timestamps, store.level_codes, store.file_ids
+        line_numbers, levels, files, message = store.line_numbers, store.levels, store.files, store.message
+        second, prefix = None, None
+        for index in indices:
+            micros = timestamps[index]
+            if micros // 1000000 != second:
+                second = micros // 1000000
+                prefix = from_micros(second * 1000000).isoformat()
+            fraction = micros % 1000000
+            # Same text as datetime.isoformat(), which drops a zero fraction
+            timestamp = f"{prefix}.{fraction:06d}" if fraction else prefix
+            yield (timestamp, levels[level_codes[index]], message(index),
+                   files[file_ids[index]][1], line_numbers[index])
+        return
+
+    for entry in entries:
+        yield entry.timestamp.isoformat(), entry.level, entry.message, entry.file_name, entry.line_number
+
+def write_chunks(f, lines: Iterable[str], progress: Optional[Callable[[int], None]] = None) -> int:
+    # Writes EXPORT_CHUNK lines at a time; progress gets the running count
+    # and may raise ExportCancelled
+    written = 0
+    chunk = []
+    with perf.Timer('export') as timer:
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) == EXPORT_CHUNK:
+                f.write(''.join(chunk))
+                written += len(chunk)
+                timer.items = written
+                chunk.clear()
+                if progress:
+                    progress(written)
+        f.write(''.join(chunk))
+        written += len(chunk)
+        timer.items = written
+        if progress:
+            progress(written)
+    return written
+
+def record_json(record) -> str:
+    # Same text as json.dumps() of LogEntry.to_dict(), without building the
+    # dict; only the strings need escaping and the timestamp never does
+    timestamp, level, message, file_name, line_number = record
+    return (f'{{"timestamp": "{timestamp}", "level": {encode_basestring_ascii(level)}, '
+            f'"message": {encode_basestring_ascii(message)}, "file": {encode_basestring_ascii(file_name)}, '
+            f'"line_number": {line_number}}}')
+
+def export_to_json(entries : List[LogEntry], file_path, metadata=None, compress=False, progress=None):
+    # Streamed: the entries array is written one compact object per line
+    # instead of building the whole document in memory
+    metadata = metadata or {
+        'export_time': datetime.now().isoformat(),
+        'entry_count': len(entries)
     }
-    
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(export_data, f, indent=2)
-    
+    records = iter_records(entries)
+
+    def lines():
+        first = next(records, None)
+        if first is None:
+            return
+        yield '\n    ' + record_json(first)
+        for record in records:
+            yield ',\n    ' + record_json(record)
+
+    with open_output(file_path, compress) as f:
+        f.write('{\n  "metadata": ' + json.dumps(metadata) + ',\n  "entries": [')
+        write_chunks(f, lines(), progress)
+        f.write('\n  ]\n}\n')
+
     return True
 
-def export_to_txt(entries, file_path):
-    with open(file_path, 'w', encoding='utf-8') as f:
+def export_to_ndjson(entries, file_path, compress=False, progress=None):
+    # One JSON object per line
+    with open_output(file_path, compress) as f:
+        write_chunks(f, (record_json(record) + '\n' for record in iter_records(entries)), progress)
+
+    return True
+
+def export_to_txt(entries, file_path, compress=False, progress=None):
+    with open_output(file_path, compress) as f:
         f.write("EXPORTED LOG ENTRIES\n")
         f.write("=" * 80 + "\n")
-        
-        for entry in entries:
-            entry_dict = entry.to_dict()
-            f.write(f"[{entry_dict['timestamp']}] [{entry_dict['level']:7}] ")
-            f.write(f"{entry_dict['message']} (Line {entry_dict['line_number']})\n")
-    
-    return True
\ No newline at end of file
+
+        lines = (f"[{timestamp}] [{level:7}] {message} (Line {line_number})\n"
+                 for timestamp, level, message, _, line_number in iter_records(entries))
+        write_chunks(f, lines, progress)
+
+    return True
+
+EXPORTERS = {
+    'txt': export_to_txt,
+    'json': export_to_json,
+    'ndjson': export_to_ndjson,
+}
+
+class ExportJob:
+    # Runs one of the exporters in a background thread. Like LoadJob the
+    # window polls the attributes; a cancelled or failed export removes
+    # the partial file
+
+    def __init__(self, entries, file_path, export_format, compress=False):
+        self.entries = entries
+        self.file_path = file_path
+        self.exporter = EXPORTERS[export_format]
+        self.compress = compress
+        self.total = len(entries)
+        self.written = 0
+        self.cancelled = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled = True
+
+    @property
+    def done(self) -> bool:
+        return not self.thread.is_alive()
+
+    def report(self, written: int):
+        self.written = written
+        if self.cancelled:
+            raise ExportCancelled()
+
+    def run(self):
+        try:
+            with perf.Profiler('export'):
+                self.exporter(self.entries, self.file_path, compress=self.compress, progress=self.report)
+        except ExportCancelled:
+            self.remove_output()
+        except Exception as e:
+            self.error = e
+            self.remove_output()
+
+    def remove_output(self):
+        try:
+            os.remove(self.file_path)
+        except OSError:
+            pass
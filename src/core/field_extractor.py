@@ -0,0 +1,79 @@
+from array import array
+import re
+import string
+from typing import Dict, Iterable, List, Optional
+
+
+# key=value fields most of our services write. Extraction is off unless
+# configured, the GUI offers these when none are
+DEFAULT_FIELDS = ('request_id', 'thread', 'user', 'tenant')
+
+# A value is a quoted string or runs up to whitespace, a comma, a semicolon
+# or a closing bracket
+VALUE = re.compile(r'"(?:[^"\\]|\\.)*"|[^\s,;)\]}]+')
+
+# Characters that make a key part of a longer word when they precede it
+WORD_CHARACTERS = frozenset(string.ascii_letters + string.digits + '_.-')
+
+
+class FieldExtractor:
+    # Finds the chosen key=value fields in one line. Each key is looked up
+    # with str.find, about twice as fast as a regex alternation that is
+    # tried at every position. A key only counts at the start of a word, so
+    # user= does not match inside other_user=. The first occurrence wins
+
+    def __init__(self, names: Iterable[str]):
+        self.names = tuple(names)
+        self.keys = [(name, name + '=', len(name) + 1) for name in self.names]
+
+    def extract(self, line: str) -> Dict[str, str]:
+        found = {}
+        if '=' not in line:
+            return found
+        find, match = line.find, VALUE.match
+        for name, key, size in self.keys:
+            start = find(key)
+            while start > 0 and line[start - 1] in WORD_CHARACTERS:
+                start = find(key, start + 1)
+            if start >= 0:
+                value = match(line, start + size)
+                if value:
+                    value = value.group()
+                    found[name] = unquote(value) if value[0] == '"' and len(value) > 1 else value
+        return found
+
+
+def unquote(value: str) -> str:
+    return re.sub(r'\\(.)', r'\1', value[1:-1])
+
+
+class FieldColumn:
+    # One extracted field of a LogStore: the value id of each entry, 0 when
+    # it has none, and each distinct value once. Entries with the same value
+    # share one string, a column costs 4 bytes per entry plus its values
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.ids = array('I')
+        self.values: List[Optional[str]] = [None]
+        self.index: Dict[str, int] = {}
+        for value in values:
+            self.value_id(value)
+
+    def value_id(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        value_id = self.index.get(value)
+        if value_id is None:
+            value_id = self.index[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+    def value(self, entry_id: int) -> Optional[str]:
+        return self.values[self.ids[entry_id]]
+
+    def remap(self, other: 'FieldColumn') -> List[int]:
+        # Ids here for the value ids of another column
+        return [self.value_id(value) for value in other.values]
+
+    def nbytes(self) -> int:
+        return self.ids.itemsize * len(self.ids) + sum(len(value) for value in self.values[1:])
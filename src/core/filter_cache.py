@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from core.log_store import LogSelection, LogStore
+
+
+# Default bound on the bytes of index arrays kept, about 16 selections of
+# every entry of a million-entry store
+FILTER_CACHE_BUDGET = 64 * 1024 * 1024
+
+# Bytes counted per result on top of its ids, so ranges and empty results
+# count against the budget too
+ENTRY_BYTES = 64
+
+
+class FilterCache:
+    # Recent filter results for one store, least recently used first. A key
+    # is a normalized filter (see LogFilter.filter_key and Predicate.key), a
+    # result is the LogSelection itself: an index array or a range, never
+    # entry objects. Results are for the store as it was, so a different
+    # store, or the same one with a different length, empties the cache;
+    # LogFilter also clears it when entries are added or the files closed
+
+    def __init__(self, budget: int = FILTER_CACHE_BUDGET):
+        self.budget = budget
+        self.results: 'OrderedDict[Hashable, LogSelection]' = OrderedDict()
+        self.nbytes = 0
+        self.store = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.results)
+
+    def get(self, store: LogStore, key: Hashable) -> Optional[LogSelection]:
+        if store is not self.store or len(store) != self.size:
+            self.clear()
+            self.store, self.size = store, len(store)
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.results.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, store: LogStore, key: Hashable, result: LogSelection):
+        # Call after get() for the same store and key
+        if store is not self.store or len(store) != self.size:
+            return
+        nbytes = result_bytes(result)
+        if nbytes > self.budget:
+            return
+        old = self.results.pop(key, None)
+        if old is not None:
+            self.nbytes -= result_bytes(old)
+        while self.results and self.nbytes + nbytes > self.budget:
+            _, evicted = self.results.popitem(last=False)
+            self.nbytes -= result_bytes(evicted)
+        self.results[key] = result
+        self.nbytes += nbytes
+
+    def clear(self):
+        self.results.clear()
+        self.nbytes = 0
+        self.store = None
+        self.size = 0
+
+
+def result_bytes(result: LogSelection) -> int:
+    indices = result.indices
+    itemsize = getattr(indices, 'itemsize', 0)
+    return ENTRY_BYTES + itemsize * len(indices)
@@ -0,0 +1,70 @@
+from typing import Dict, Iterator, List, Tuple
+
+
+class HighlightMap:
+    # Highlights kept in data space: per entry id (store index), the sorted
+    # and non-overlapping (start, end, color) character ranges of its row.
+    # Ids do not change when filtering or scrolling, so the view only has to
+    # look up the rows it shows. A new highlight replaces whatever it overlaps
+
+    def __init__(self):
+        self.ranges: Dict[int, List[Tuple[int, int, str]]] = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def get(self, entry_id: int) -> List[Tuple[int, int, str]]:
+        return self.ranges.get(entry_id, ())
+
+    def add(self, entry_id: int, start: int, end: int, color: str):
+        spans = self._cut(entry_id, start, end)[0]
+        spans.append((start, end, color))
+        spans.sort()
+        self.ranges[entry_id] = spans
+        self.count += 1
+
+    def remove(self, entry_id: int, start: int, end: int) -> int:
+        # Removes the highlighted characters in [start, end), returns the
+        # number of ranges that were cut or removed
+        spans, touched = self._cut(entry_id, start, end)
+        if spans:
+            self.ranges[entry_id] = spans
+        else:
+            self.ranges.pop(entry_id, None)
+        return touched
+
+    def _cut(self, entry_id: int, start: int, end: int):
+        # The entry's ranges without [start, end), and how many overlapped
+        spans = []
+        touched = 0
+        for span in self.ranges.get(entry_id, ()):
+            span_start, span_end, color = span
+            if span_end <= start or span_start >= end:
+                spans.append(span)
+                continue
+            touched += 1
+            self.count -= 1
+            if span_start < start:
+                spans.append((span_start, start, color))
+                self.count += 1
+            if span_end > end:
+                spans.append((end, span_end, color))
+                self.count += 1
+        return spans, touched
+
+    def drop_from(self, first: int):
+        # For entries that moved (entries inserted into the store before them)
+        for entry_id in [entry_id for entry_id in self.ranges if entry_id >= first]:
+            self.count -= len(self.ranges.pop(entry_id))
+
+    def clear(self) -> int:
+        count = self.count
+        self.ranges.clear()
+        self.count = 0
+        return count
+
+    def items(self) -> Iterator[Tuple[int, Tuple[int, int, str]]]:
+        for entry_id in sorted(self.ranges):
+            for span in self.ranges[entry_id]:
+                yield entry_id, span
@@ -1,7 +1,8 @@
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Dict, Optional
 
-@dataclass
+@dataclass(slots=True)
 class LogEntry:
     timestamp: datetime
     level: str
@@ -10,6 +11,8 @@ class LogEntry:
     file_path: str
     line_number: int
     raw: str
+    # Extracted key=value fields, None when the parser extracts none
+    fields: Optional[Dict[str, str]] = None
     
     def to_dict(self):
         return {
@@ -18,4 +21,4 @@ class LogEntry:
             'message': self.message,
             'file': self.file_name,
             'line_number': self.line_number
-        }
\ No newline at end of file
+        }
@@ -1,32 +1,259 @@
+from array import array
+from bisect import bisect_left
 from datetime import datetime
-from typing import List, Optional
+from typing import Callable, Hashable, List, Optional
 
+from core import perf
+from core.filter_cache import FilterCache
 from core.log_entry import LogEntry
+from core.log_index import LogIndex
+from core.log_query import Predicate, QueryContext
+from core.log_store import LogSelection, LogStore, to_micros
+from core.text_search import TEXT_SEARCH_BUDGET, TextSearch, compile_pattern
+from core.timeline import Timeline
+from core.trigram_index import TRIGRAM_BUDGET, TrigramIndex
 
 
 class LogFilter:
+
+    def __init__(self):
+        self.index = None
+        self.text_search = None
+        self.timeline = None
+        # Results of recent filters over the whole store, so going back to
+        # one is a dictionary lookup
+        self.cache = FilterCache()
    
     def apply(self, 
               entries: List[LogEntry],
               levels: Optional[List[str]] = None,
               time_from: Optional[datetime] = None,
               time_to: Optional[datetime] = None,
-              search_text: Optional[str] = None) -> List[LogEntry]:
-        filtered = []
-        
-        for entry in entries:
+              search_text: Optional[str] = None,
+              regex: bool = False) -> List[LogEntry]:
+        # With regex=True search_text is a regular expression, matched
+        # case-insensitively; an invalid one raises re.error
+        with perf.Timer('filter', items=len(entries)):
+            if isinstance(entries, LogStore):
+                key = self.filter_key(levels, time_from, time_to, search_text, regex)
+                return self.cached(entries, key, lambda: self.apply_columns(
+                    entries, levels, time_from, time_to, search_text, regex))
+            if isinstance(entries, LogSelection):
+                return self.apply_columns(entries, levels, time_from, time_to, search_text, regex)
+
+            return list(filter(self.matcher(levels, time_from, time_to, search_text, regex), entries))
+
+
+    def apply_query(self, entries, query: Predicate):
+        # Entries matching a compiled query (see log_query.parse_query)
+        with perf.Timer('query', items=len(entries)):
+            if isinstance(entries, LogSelection):
+                store, candidates = entries.store, entries.indices
+            elif isinstance(entries, LogStore):
+                store, candidates = entries, None
+            else:
+                return list(filter(query.matches, entries))
+
+            context = QueryContext(store, self.get_index(store), lambda: self.get_text_search(store))
+            if candidates is None:
+                return self.cached(store, ('query', query.key()), lambda: LogSelection(
+                    store, query.select(context, 0, len(store))))
+            return LogSelection(store, query.refine(context, candidates))
+
+
+    def cached(self, store: LogStore, key: Hashable, run: Callable[[], LogSelection]) -> LogSelection:
+        result = self.cache.get(store, key)
+        if result is None:
+            result = run()
+            self.cache.put(store, key, result)
+        return result
+
+
+    @staticmethod
+    def filter_key(levels: Optional[List[str]] = None,
+                   time_from: Optional[datetime] = None,
+                   time_to: Optional[datetime] = None,
+                   search_text: Optional[str] = None,
+                   regex: bool = False) -> tuple:
+        # The arguments of apply() in one form per set of matching entries:
+        # level order and duplicates, and the case of plain text, do not count
+        levels = tuple(sorted(set(levels))) if levels else None
+        if not search_text:
+            search_text, regex = None, False
+        elif not regex:
+            search_text = search_text.lower()
+        return ('filter', levels, time_from, time_to, search_text, bool(regex))
+
+
+    def matcher(self,
+                levels: Optional[List[str]] = None,
+                time_from: Optional[datetime] = None,
+                time_to: Optional[datetime] = None,
+                search_text: Optional[str] = None,
+                regex: bool = False) -> Callable[[LogEntry], bool]:
+        # The checks of apply() for one entry at a time, used for lists and
+        # for entries streamed without a store
+        pattern = compile_pattern(search_text, lowercase_text=False) if search_text and regex else None
+        search_text = search_text.lower() if search_text else None
+
+        def matches(entry: LogEntry) -> bool:
             if levels and entry.level not in levels:
-                continue
+                return False
             
             if time_from and entry.timestamp < time_from:
-                continue
+                return False
 
             if time_to and entry.timestamp > time_to:
-                continue
-            
-            if search_text and search_text.lower() not in entry.message.lower():
-                continue
+                return False
             
-            filtered.append(entry)
+            if pattern:
+                return bool(pattern.search(entry.message))
+            return not search_text or search_text in entry.message.lower()
         
-        return filtered
\ No newline at end of file
+        return matches
+
+
+    def apply_columns(self,
+                      entries,
+                      levels: Optional[List[str]] = None,
+                      time_from: Optional[datetime] = None,
+                      time_to: Optional[datetime] = None,
+                      search_text: Optional[str] = None,
+                      regex: bool = False) -> LogSelection:
+        # Same checks as apply(), answered from the store columns and indexes
+        if isinstance(entries, LogSelection):
+            store, candidates = entries.store, entries.indices
+        else:
+            store, candidates = entries, None
+
+        codes = {store.level_index[level] for level in levels if level in store.level_index} if levels else None
+        micros_from = to_micros(time_from) if time_from else None
+        micros_to = to_micros(time_to) if time_to else None
+
+        if candidates is not None:
+            return self.scan(store, candidates, codes, micros_from, micros_to, search_text, regex)
+
+        # Time bounds are a bisect on the sorted timestamps
+        index = self.get_index(store)
+        low, high = index.time_range(micros_from, micros_to)
+
+        if search_text:
+            # Text matches are sorted ids: cut them to the time range, then check levels
+            matches = self.find_text(store, search_text, regex)
+            matches = matches[bisect_left(matches, low):bisect_left(matches, high)]
+            if codes is None or index.covers(codes):
+                return LogSelection(store, matches)
+            level_codes = store.level_codes
+            return LogSelection(store, array('I', (i for i in matches if level_codes[i] in codes)))
+
+        if codes is None:
+            return LogSelection(store, range(low, high))
+        return LogSelection(store, index.select(codes, low, high))
+
+
+    def scan(self, store: LogStore, candidates, codes, micros_from, micros_to, search_text, regex) -> LogSelection:
+        # Linear check of an existing selection
+        if search_text:
+            allowed = set(candidates)
+            matches = self.find_text(store, search_text, regex)
+            candidates = [index for index in matches if index in allowed]
+
+        level_codes = store.level_codes
+        timestamps = store.timestamps
+        filtered = array('I')
+
+        for index in candidates:
+            if codes is not None and level_codes[index] not in codes:
+                continue
+
+            if micros_from is not None and timestamps[index] < micros_from:
+                continue
+
+            if micros_to is not None and timestamps[index] > micros_to:
+                continue
+
+            filtered.append(index)
+
+        return LogSelection(store, filtered)
+
+
+    def find_text(self, store: LogStore, search_text: str, regex: bool) -> array:
+        text_search = self.get_text_search(store)
+        if regex:
+            return text_search.find_regex(search_text)
+        return text_search.find(search_text.lower())
+
+
+    def prepare(self, store: LogStore):
+        # Build the level index right after loading so the first filter is fast
+        self.get_index(store)
+
+
+    def get_index(self, store: LogStore) -> LogIndex:
+        if self.index is None or self.index.store is not store:
+            self.index = LogIndex(store)
+        else:
+            self.index.update()
+        return self.index
+
+
+    def get_timeline(self, store: LogStore) -> Timeline:
+        # Rebuilt when the store or its size changed, e.g. after follow added lines
+        index = self.get_index(store)
+        if self.timeline is None or self.timeline.index is not index or self.timeline.size != len(store):
+            self.timeline = Timeline(index)
+        return self.timeline
+
+
+    def get_text_search(self, store: LogStore) -> TextSearch:
+        # Lowercased messages are built once per store and kept between
+        # calls, in low memory mode only up to TEXT_SEARCH_BUDGET of them
+        if self.text_search is None or self.text_search.store is not store:
+            self.stop_text_index()
+            self.text_search = TextSearch(store, TEXT_SEARCH_BUDGET if store.lazy_text else None)
+        return self.text_search
+
+
+    def start_text_index(self, store: LogStore, budget: int = TRIGRAM_BUDGET) -> TrigramIndex:
+        # Builds the trigram index in a background thread, searches use
+        # whatever part of it is ready
+        text_search = self.get_text_search(store)
+        if text_search.trigrams is None:
+            text_search.trigrams = TrigramIndex(text_search, budget)
+            text_search.trigrams.start()
+        return text_search.trigrams
+
+
+    def entries_added(self, store: LogStore, first: int):
+        # Called after store.insert_sorted(), ids before first are unchanged.
+        # The indexes forget the entries from first on and index them again,
+        # appends only extend them. Cached results are dropped
+        self.cache.clear()
+        if self.index is not None and self.index.store is store:
+            self.index.rollback(first)
+
+        text_search = self.text_search
+        if text_search is None or text_search.store is not store:
+            return
+        trigrams = text_search.trigrams
+        if first < text_search.size:
+            if trigrams is not None:
+                trigrams.rollback(first)
+            text_search.rollback(first)
+            if trigrams is not None:
+                trigrams.start()
+        elif trigrams is not None and not trigrams.full and not trigrams.is_running():
+            trigrams.start()
+
+
+    def stop_text_index(self):
+        if self.text_search is not None and self.text_search.trigrams is not None:
+            self.text_search.trigrams.cancel()
+
+
+    def reset(self):
+        self.stop_text_index()
+        self.cache.clear()
+        self.text_search = None
+        self.index = None
+        self.timeline = None
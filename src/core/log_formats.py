@@ -0,0 +1,159 @@
+from datetime import datetime
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.log_store import KNOWN_LEVELS
+from core.timestamp_decoder import FIXED_FORMAT, IsoTimestampDecoder, TimestampDecoder
+
+
+# Lines looked at to choose the format of a file
+SAMPLE_LINES = 64
+
+# Keys tried, in order, for the fields of a JSON-lines entry
+JSON_TIME_KEYS = ('timestamp', '@timestamp', 'time', 'ts', 'datetime', 'date')
+JSON_LEVEL_KEYS = ('level', 'severity', 'levelname', 'loglevel', 'lvl')
+
+# Level of an entry whose line has none (JSON entries, ISO 8601 lines)
+DEFAULT_LEVEL = 'info'
+
+# Spellings other loggers use for the known levels
+LEVEL_ALIASES = {
+    'warn': 'warning',
+    'err': 'error',
+    'fatal': 'error',
+    'critical': 'error',
+    'information': 'info',
+    'dbg': 'debug',
+}
+
+
+class LogFormat:
+    # A precompiled line matcher and the decoder for its timestamps. The
+    # regex groups are (timestamp, level, message), the level group may be
+    # optional; match() returns (timestamp, level, raw line, message start)
+    # or None. levels maps lowercase level names to the ones stored
+
+    def __init__(self, name: str, pattern: str, decoder, levels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.decoder = decoder
+        self.levels = levels or {}
+
+    def key(self) -> str:
+        # Anything that changes what the format produces for the same line
+        levels = ','.join(f"{name}={level}" for name, level in sorted(self.levels.items()))
+        return f"{self.name}:{self.pattern}:{self.decoder.time_format}:{levels}"
+
+    def match(self, line: str) -> Optional[Tuple[datetime, str, str, int]]:
+        line = line.rstrip('\n')
+        if not line.strip():
+            return None
+
+        match = self.regex.match(line)
+        if match:
+            try:
+                timestamp = self.decoder.decode(match.group(1))
+            except ValueError:
+                return None
+            level = (match.group(2) or DEFAULT_LEVEL).lower()
+            return timestamp, self.levels.get(level, level), line, match.start(3)
+        return None
+
+
+class JsonLinesFormat(LogFormat):
+    # One JSON object per line. The raw line is kept as it is and is also
+    # the message, so searches see every field
+
+    def __init__(self, name: str = 'jsonl', levels: Optional[Dict[str, str]] = LEVEL_ALIASES):
+        super().__init__(name, r'\s*\{', IsoTimestampDecoder(), levels)
+
+    def key(self) -> str:
+        return ':'.join((super().key(), *JSON_TIME_KEYS, *JSON_LEVEL_KEYS))
+
+    def match(self, line: str) -> Optional[Tuple[datetime, str, str, int]]:
+        line = line.rstrip('\n')
+        if not self.regex.match(line):
+            return None
+        try:
+            fields = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(fields, dict):
+            return None
+
+        value = first_value(fields, JSON_TIME_KEYS)
+        try:
+            if isinstance(value, str):
+                timestamp = self.decoder.decode(value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                timestamp = self.decoder.decode_number(value)
+            else:
+                return None
+        except (ValueError, OverflowError):
+            return None
+        level = first_value(fields, JSON_LEVEL_KEYS)
+        level = str(level).lower() if level is not None else DEFAULT_LEVEL
+        return timestamp, self.levels.get(level, level), line, 0
+
+
+def first_value(fields: dict, keys: Tuple[str, ...]):
+    for key in keys:
+        value = fields.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+# The bracketed format LogViewer started with:
+# [YYYY-MM-DD HH:MM:SS.ffffff] [LEVEL] message
+BRACKETED = LogFormat('bracketed', r'\[(.+?)\] \[(\w+)\] (.+)', TimestampDecoder(FIXED_FORMAT))
+
+# Level names ISO 8601 lines are read with, any case. Another word after the
+# timestamp is the start of the message
+LEVEL_PATTERN = '(?i:{})'.format('|'.join(sorted({*KNOWN_LEVELS, *LEVEL_ALIASES}, key=len, reverse=True)))
+
+# ISO 8601 with 'T' or a space, any fraction and 'Z' or an offset, the
+# timestamp and the level optionally in brackets, lines without a known
+# level get DEFAULT_LEVEL:
+# 2024-01-01T10:00:00.123Z ERROR message, [2024-01-01T10:00:00+02:00] [error] message
+ISO8601 = LogFormat(
+    'iso8601',
+    r'\[?(\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(?:[.,]\d+)?(?:[Zz]|[+-]\d\d:?\d\d)?)\]?\s+'
+    rf'(?:\[?({LEVEL_PATTERN})\]?:?\s+)?(.+)',
+    IsoTimestampDecoder(),
+    LEVEL_ALIASES)
+
+JSON_LINES = JsonLinesFormat()
+
+# Registered formats by name, in the order they win ties when detecting
+FORMATS: Dict[str, LogFormat] = {}
+
+
+def register_format(log_format: LogFormat):
+    FORMATS[log_format.name] = log_format
+
+
+def get_format(name: str) -> LogFormat:
+    log_format = FORMATS.get(name)
+    if log_format is None:
+        raise ValueError(f"Unknown log format: {name}")
+    return log_format
+
+
+def detect_format(lines: Iterable[str], formats: List[LogFormat]) -> Optional[LogFormat]:
+    # The format matching the most of the sampled lines, the first one on
+    # ties. None when no line matches any format
+    lines = [line for line in lines if line.strip()]
+    best, best_count = None, 0
+    for log_format in formats:
+        count = sum(1 for line in lines if log_format.match(line))
+        if count > best_count:
+            best, best_count = log_format, count
+    return best
+
+
+register_format(BRACKETED)
+register_format(ISO8601)
+register_format(JSON_LINES)
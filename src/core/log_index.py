@@ -0,0 +1,141 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+import heapq
+from itertools import compress
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from core.log_store import LogStore
+
+
+class LogIndex:
+    # Per-level and per-file posting lists (sorted entry ids) for a
+    # time-sorted LogStore. Time bounds are found by bisecting the timestamp
+    # column directly. The posting sizes are the statistics queries use to
+    # order their predicates. Extracted fields get hash indexes (facets)
+    # from value id to posting, built the first time a field is used
+
+    def __init__(self, store: LogStore):
+        self.store = store
+        self.postings = {}
+        self.file_postings = {}
+        self.facets: Dict[str, Dict[int, array]] = {}
+        self.facet_sizes: Dict[str, int] = {}
+        self.size = 0
+        self.update()
+
+    def update(self):
+        # Adds entries appended since the last call
+        size = len(self.store)
+        ids = range(self.size, size)
+        for column, postings in ((self.store.level_codes, self.postings),
+                                 (self.store.file_ids, self.file_postings)):
+            added = column[self.size:size]
+            for code in set(added):
+                posting = postings.setdefault(code, array('I'))
+                posting.extend(compress(ids, map(code.__eq__, added)))
+        self.size = size
+
+    def rollback(self, first: int):
+        # Forget the entries from first on, update() indexes them again
+        for posting in (*self.postings.values(), *self.file_postings.values()):
+            del posting[bisect_left(posting, first):]
+        self.size = min(self.size, first)
+        for name, postings in self.facets.items():
+            if first < self.facet_sizes[name]:
+                trim_postings(postings, first)
+                self.facet_sizes[name] = first
+
+    def facet(self, name: str) -> Dict[int, array]:
+        # Value id -> entry ids of an extracted field, extended with the
+        # entries appended since the last call
+        column = self.store.fields[name].ids
+        postings = self.facets.setdefault(name, {})
+        start, size = self.facet_sizes.get(name, 0), len(column)
+        get = postings.get
+        for entry_id, value_id in zip(range(start, size), column[start:size]):
+            if value_id:
+                posting = get(value_id)
+                if posting is None:
+                    posting = postings[value_id] = array('I')
+                posting.append(entry_id)
+        self.facet_sizes[name] = size
+        return postings
+
+    def top_values(self, name: str, count: int) -> List[Tuple[str, int]]:
+        # The most frequent values of a field and their entry counts
+        values = self.store.fields[name].values
+        postings = self.facet(name)
+        top = heapq.nlargest(count, postings, key=lambda value_id: len(postings[value_id]))
+        return [(values[value_id], len(postings[value_id])) for value_id in top]
+
+    def top_files(self, count: int) -> List[Tuple[str, int]]:
+        # The file names with the most entries, files of the same name in
+        # different folders count together
+        names = Counter()
+        for file_id, posting in self.file_postings.items():
+            names[self.store.files[file_id][1]] += len(posting)
+        return [(name, size) for name, size in names.most_common(count) if size]
+
+    def time_range(self, micros_from: Optional[int], micros_to: Optional[int]) -> Tuple[int, int]:
+        timestamps = self.store.timestamps
+        low = 0 if micros_from is None else bisect_left(timestamps, micros_from)
+        high = len(timestamps) if micros_to is None else bisect_right(timestamps, micros_to)
+        return low, max(low, high)
+
+    def covers(self, codes: Iterable[int]) -> bool:
+        # True when every level present in the store is selected
+        return all(code in codes for code, posting in self.postings.items() if posting)
+
+    def count(self, codes: Iterable[int], files: bool = False) -> int:
+        # Entries with one of the level codes (or file ids)
+        postings = self.file_postings if files else self.postings
+        return sum(len(postings.get(code, ())) for code in codes)
+
+    def select(self, codes: Iterable[int], low: int, high: int, files: bool = False):
+        # Entry ids in [low, high) with one of the level codes (or file
+        # ids), in order
+        postings = self.file_postings if files else self.postings
+        if all(code in codes for code, posting in postings.items() if posting):
+            return range(low, high)
+        return merge_postings(postings, codes, low, high)
+
+    def count_field(self, name: str, value_ids: Iterable[int]) -> int:
+        facet = self.facet(name)
+        return sum(len(facet.get(value_id, ())) for value_id in value_ids)
+
+    def select_field(self, name: str, value_ids: Iterable[int], low: int, high: int):
+        # Entry ids in [low, high) with one of the values of a field, a hash
+        # lookup per value instead of a scan
+        return merge_postings(self.facet(name), value_ids, low, high)
+
+
+def merge_postings(postings: Dict[int, array], codes: Iterable[int], low: int, high: int):
+    # Sorted ids in [low, high) found in the postings of the codes
+    parts = []
+    for code in codes:
+        posting = postings.get(code)
+        if posting:
+            parts.append(posting[bisect_left(posting, low):bisect_left(posting, high)])
+    if len(parts) == 1:
+        return parts[0]
+    # Each part is sorted, Timsort merges them as runs
+    merged = array('I')
+    for part in parts:
+        merged.extend(part)
+    return array('I', sorted(merged))
+
+
+def trim_postings(postings: Dict[Any, array], first: int) -> int:
+    # Drops the ids from first on, and the postings left empty. Returns the
+    # number of ids dropped
+    dropped = 0
+    for key in [key for key, posting in postings.items() if posting[-1] >= first]:
+        posting = postings[key]
+        start = bisect_left(posting, first)
+        dropped += len(posting) - start
+        if start:
+            del posting[start:]
+        else:
+            del postings[key]
+    return dropped
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from typing import List, Optional
+
+from core import perf
+from core.log_parser import LoadCancelled, LogParser, ParseProgress
+from core.log_store import LogStore
+
+
+# A partial result is published once this many entries are loaded, and
+# again each time the count doubles, so the merges stay within twice the
+# cost of the final one
+SNAPSHOT_MIN = 100000
+
+
+class LoadJob:
+    # Parses a set of files in a background thread. Nothing here touches
+    # tkinter: the window polls the public attributes from root.after.
+    # snapshot is replaced, never modified, once published, so the UI thread
+    # can filter and display it while loading continues
+
+    def __init__(self, parser: LogParser, file_paths: List[str]):
+        self.parser = parser
+        self.file_paths = list(file_paths)
+        self.progress = ParseProgress()
+        self.total_bytes = sum(self._size(path) for path in self.file_paths)
+        self.files_done = 0
+        self.snapshot: Optional[LogStore] = None
+        self.result: Optional[LogStore] = None
+        self.error: Optional[Exception] = None
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def _size(self, file_path: str) -> int:
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        # Workers stop at their next progress report; the partial stores go
+        # away with the thread
+        self.progress.cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.progress.cancelled.is_set()
+
+    @property
+    def done(self) -> bool:
+        return not self.thread.is_alive()
+
+    @property
+    def bytes_read(self) -> int:
+        return self.progress.bytes_read.value
+
+    @property
+    def lines_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.progress.lines_read.value / elapsed if elapsed > 0 else 0.0
+
+    def run(self):
+        try:
+            with perf.Profiler('load'):
+                self.result = self.load()
+        except LoadCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            self.snapshot = None
+
+    def load(self) -> LogStore:
+        # Files may finish in any order, but they are merged in input order
+        # so ties come out as in LogParser.parse_files(). A stable sort of
+        # (sorted prefix + more runs) equals the sort of all the runs, so
+        # each snapshot is merged from the previous one and the new files
+        pending = {}
+        ready = []
+        next_index = 0
+        for index, store in self.parser.iter_parsed(self.file_paths, self.progress):
+            self.files_done += 1
+            pending[index] = store
+            while next_index in pending:
+                ready.append(pending.pop(next_index))
+                next_index += 1
+
+            loaded = sum(map(len, ready))
+            shown = len(self.snapshot) if self.snapshot is not None else 0
+            if pending or next_index < len(self.file_paths):
+                if loaded >= max(SNAPSHOT_MIN, shown):
+                    self.snapshot = self._merge(ready)
+                    ready = []
+                self.progress.check()
+
+        return self._merge(ready)
+
+    def _merge(self, stores: List[LogStore]) -> LogStore:
+        if self.snapshot is not None:
+            stores = [self.snapshot] + stores
+        if not stores:
+            return LogStore(self.parser.lazy_text, self.parser.templates, self.parser.fields)
+        return LogStore.merge(stores)
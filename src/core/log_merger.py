@@ -0,0 +1,40 @@
+import heapq
+from itertools import islice
+import operator
+from typing import Iterable, Iterator, List, Sequence
+
+from core.log_entry import LogEntry
+
+
+# Entries held back per stream by reorder_stream()
+REORDER_WINDOW = 1024
+
+
+def _timestamp(entry: LogEntry):
+    return entry.timestamp
+
+
+def is_sorted(keys: Sequence) -> bool:
+    return all(map(operator.le, keys, islice(keys, 1, None)))
+
+
+def reorder_stream(entries: Iterable[LogEntry], window: int = REORDER_WINDOW) -> Iterator[LogEntry]:
+    # Streaming counterpart of LogStore.sort(): holds up to window entries
+    # in a heap, so a line at most window entries late comes out where the
+    # stable sort would put it. Later lines are passed on as they come
+    heap = []
+    for position, entry in enumerate(entries):
+        item = (entry.timestamp, position, entry)
+        if len(heap) < window:
+            heapq.heappush(heap, item)
+        else:
+            yield heapq.heappushpop(heap, item)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+def merge_streams(streams: List[Iterable[LogEntry]], window: int = REORDER_WINDOW) -> Iterator[LogEntry]:
+    # heapq.merge keeps the stream order for equal timestamps, like
+    # LogStore.merge(). Lines more than window entries late in their stream
+    # come out late, see reorder_stream()
+    return heapq.merge(*(reorder_stream(stream, window) for stream in streams), key=_timestamp)
@@ -1,59 +1,451 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import copy
+from dataclasses import dataclass
 from datetime import datetime
+import io
+from itertools import chain, islice
+import multiprocessing
 import os
-import re
-from typing import List, Optional
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+from core import perf
+from core.field_extractor import FieldExtractor
 from core.log_entry import LogEntry
+from core.log_formats import FORMATS, SAMPLE_LINES, LogFormat, detect_format
+from core.log_query import check_field_names
+from core.log_store import LogStore, to_micros
+from core.source_reader import compression_of, open_source
+from core.timestamp_decoder import TimestampDecoder
+
+
+@dataclass(slots=True)
+class FileTail:
+    # Where the parser stopped in a file: the bytes before offset (and the
+    # line_count lines in them) are parsed. device and inode tell a rotated
+    # file apart from the one that was read. format is the name of the log
+    # format chosen for the file, None until a line matched one
+    device: int
+    inode: int
+    offset: int = 0
+    line_count: int = 0
+    format: Optional[str] = None
+
+
+# Lines between two progress reports (and cancel checks) while parsing
+REPORT_LINES = 16384
+
+# Bytes read per step when looking back for the end of the last full line
+LINE_END_BLOCK = 65536
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class ParseProgress:
+    # Counters shared with the worker processes, and the flag that stops
+    # them. Passed to the pool initializer, as these cannot be pickled later
+
+    def __init__(self):
+        self.cancelled = multiprocessing.Event()
+        self.bytes_read = multiprocessing.Value('q', 0)
+        self.lines_read = multiprocessing.Value('q', 0)
+
+    def add(self, lines: int, size: int):
+        with self.lines_read.get_lock():
+            self.lines_read.value += lines
+        with self.bytes_read.get_lock():
+            self.bytes_read.value += size
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise LoadCancelled()
+
+
+# Progress of the load a pool worker belongs to, set by its initializer
+_worker_progress = None
+
+
+def _init_worker(progress: Optional[ParseProgress], timings: bool = False):
+    global _worker_progress
+    _worker_progress = progress
+    perf.set_enabled(timings)
+
+
+def _parse_in_worker(parser: 'LogParser', file_path: str):
+    # Timings taken in a pool process travel back with its result
+    return parser.parse_file(file_path), perf.take()
+
+
+class TimedDecoder:
+    # Wraps a TimestampDecoder and adds up the time spent decoding
+
+    def __init__(self, decoder: TimestampDecoder):
+        self.decoder = decoder
+        self.seconds = 0.0
+        self.count = 0
+
+    def __getattr__(self, name: str):
+        return getattr(self.decoder, name)
+
+    def decode(self, text: str) -> datetime:
+        start = time.perf_counter()
+        try:
+            return self.decoder.decode(text)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
 
 
 class LogParser:
-    
-    LOG_PATTERN = r'\[(.+?)\] \[(\w+)\] (.+)'
-    TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
 
+    def __init__(self, workers: Optional[int] = None, lazy_text: bool = False, cache=None,
+                 formats: Optional[List[LogFormat]] = None, templates: bool = False,
+                 fields: Iterable[str] = (), complete_lines: bool = False):
+        # None or 1 keeps the serial path, 0 uses one worker per CPU.
+        # lazy_text keeps only line offsets and reads the text back from the files.
+        # cache is an optional ParseCache for the per-file results.
+        # formats are the log formats a file may be in, all registered ones
+        # by default; the first is used when none matches.
+        # templates clusters the messages into templates while parsing.
+        # fields are the key=value names extracted from each message, see
+        # check_field_names() for the ones refused.
+        # complete_lines leaves a last line without its newline (still being
+        # written) to the next parse_appended(), for files followed later
+        self.workers = workers
+        self.complete_lines = complete_lines
+        self.lazy_text = lazy_text
+        self.cache = cache
+        self.templates = templates
+        self.fields = fields
+        self.formats = list(formats or FORMATS.values())
+        self.format_index = {log_format.name: log_format for log_format in self.formats}
+
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return self._fields
+
+
+    @fields.setter
+    def fields(self, names: Iterable[str]):
+        self._fields = check_field_names(names)
+        self.field_extractor = FieldExtractor(self._fields) if self._fields else None
+
+
+    def parse_files(self, file_paths: List[str]) -> LogStore:
+        # Each file is a time-ordered run, merge the runs by timestamp
+        return LogStore.merge(self._parse_each(file_paths))
+
+
+    def _parse_each(self, file_paths: List[str]):
+        workers = self.get_worker_count(len(file_paths))
+        if workers <= 1:
+            return map(self.parse_file, file_paths)
+
+        # Executor.map keeps the input order, so the result matches the serial path
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(None, perf.enabled)) as executor:
+            results = list(executor.map(_parse_in_worker, [self] * len(file_paths), file_paths))
+        for _, timings in results:
+            perf.merge(timings)
+        return [store for store, _ in results]
 
-    def parse_files(self, file_paths: List[str]) -> List[LogEntry]:
-        all_entries = []
-        for file_path in file_paths:
-            entries = self.parse_file(file_path)
-            all_entries.extend(entries)
-        
-        # Sort by timestamp
-        return sorted(all_entries, key=lambda x: x.timestamp)
 
+    def iter_parsed(self, file_paths: List[str], progress: ParseProgress) -> Iterator[Tuple[int, LogStore]]:
+        # (input index, store) per file as soon as it is parsed, so a caller
+        # can show part of the result. Raises LoadCancelled once progress is
+        # cancelled; running workers stop at their next report
+        workers = self.get_worker_count(len(file_paths))
+        if workers <= 1:
+            for index, file_path in enumerate(file_paths):
+                yield index, self.parse_file(file_path, progress)
+            return
 
-    def parse_file(self, file_path: str) -> List[LogEntry]:
-        entries = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(progress, perf.enabled)) as executor:
+            futures = {executor.submit(_parse_in_worker, self, path): index for index, path in enumerate(file_paths)}
+            try:
+                for future in as_completed(futures):
+                    store, timings = future.result()
+                    perf.merge(timings)
+                    yield futures[future], store
+            finally:
+                # Files not started yet are dropped when the caller stops early
+                for future in futures:
+                    future.cancel()
+
+
+    def get_worker_count(self, file_count: int) -> int:
+        workers = self.workers
+        if workers is None:
+            return 1
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        return max(1, min(workers, file_count))
+
+
+    def parse_file(self, file_path: str, progress: Optional[ParseProgress] = None) -> LogStore:
+        progress = progress or _worker_progress
+        if self.cache is None:
+            return self.read_file(file_path, progress)
+
+        with perf.Timer('cache load') as timer:
+            store = self.cache.load(file_path, self)
+            timer.items = len(store) if store is not None else 0
+        if store is None:
+            store = self.read_file(file_path, progress)
+            self.cache.save(file_path, store, self)
+        elif progress is not None:
+            tail = store.tails[file_path]
+            progress.add(tail.line_count, tail.offset)
+        return store
+
+
+    def read_file(self, file_path: str, progress: Optional[ParseProgress] = None) -> LogStore:
+        store = LogStore(self.lazy_text, self.templates, self.fields)
+        file_id = store.file_id(file_path)
         
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line_num, line in enumerate(f, 1):
-                    entry = self.parse_line(line, file_path, line_num)
-                    if entry:
-                        entries.append(entry)
+            if self.lazy_text:
+                store.text.record_signature(file_path)
+            # Compressed files are decompressed as a stream, offsets and the
+            # tail count decompressed bytes
+            with open_source(file_path) as f, perf.Timer('read file') as timer:
+                stat = os.fstat(f.fileno())
+                tail = store.tails[file_path] = FileTail(stat.st_dev, stat.st_ino)
+                # Compressed files are not appended to, their last line is complete
+                complete_lines = self.complete_lines and compression_of(file_path) is None
+                lines = self.read_lines(f, tail, complete_lines)
+                if progress is not None:
+                    lines = self.report_progress(lines, f, progress)
+                self.parse_lines(store, file_id, lines, tail)
+                timer.items, timer.nbytes = tail.line_count, stat.st_size
+        except LoadCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Error reading {file_path}: {str(e)}")
         
-        return entries
+        return store
 
 
-    def parse_line(self, line: str, file_path: str, line_num: int) -> Optional[LogEntry]:
-        line = line.rstrip('\n')
-        if not line.strip():
-            return None
-            
-        match = re.match(self.LOG_PATTERN, line)
-        if match:
-            try:
-                timestamp = datetime.strptime(match.group(1), self.TIME_FORMAT)
-                return LogEntry(
-                    timestamp=timestamp,
-                    level=match.group(2).lower(),
-                    message=match.group(3),
-                    file_name=os.path.basename(file_path),
-                    file_path=file_path,
-                    line_number=line_num,
-                    raw=line
-                )
-            except ValueError:
-                return None
-        return None    
\ No newline at end of file
+    def iter_entries(self, file_path: str) -> Iterator[LogEntry]:
+        # Entries of one file in file order, parsed as they are read, so
+        # only the current entry is in memory. It is yielded once the next
+        # one starts, as continuation lines may still follow
+        try:
+            with open_source(file_path) as f:
+                tail = FileTail(0, 0)
+                log_format, lines = self.choose_format(self.read_lines(f, tail), tail)
+                entry = None
+                for line_num, line, _ in lines:
+                    parsed = self.parse_line(line, file_path, line_num, log_format)
+                    if parsed:
+                        if entry:
+                            yield entry
+                        entry = parsed
+                    elif entry and line.strip():
+                        line = '\n' + line.rstrip('\n')
+                        entry.raw += line
+                        entry.message += line
+                if entry:
+                    yield entry
+        except Exception as e:
+            raise Exception(f"Error reading {file_path}: {str(e)}")
+
+
+    def parse_appended(self, file_path: str, tail: FileTail, complete_lines: bool = True) -> Tuple[LogStore, bool]:
+        # Entries in the lines written since the tail was last moved, and
+        # whether the file was rotated or truncated. Those are read again
+        # from the start, the tail is updated in place. With complete_lines
+        # a last line without its newline is left for the next call
+        store = LogStore(self.lazy_text, self.templates, self.fields)
+        file_id = store.file_id(file_path)
+
+        try:
+            stat = os.stat(file_path)
+            rotated = (stat.st_dev, stat.st_ino) != (tail.device, tail.inode)
+            if compression_of(file_path) is not None:
+                # Compressed files are replaced, not appended to
+                if not rotated:
+                    return store, False
+                restarted = True
+            else:
+                restarted = rotated or stat.st_size < tail.offset
+            if restarted:
+                tail.device, tail.inode, tail.offset, tail.line_count = stat.st_dev, stat.st_ino, 0, 0
+                tail.format = None
+            with open_source(file_path) as f:
+                if tail.offset:
+                    f.seek(tail.offset)
+                data = f.read()
+        except Exception as e:
+            raise Exception(f"Error reading {file_path}: {str(e)}")
+
+        if complete_lines:
+            # A line still being written waits for its newline
+            data = data[:data.rfind(b'\n') + 1]
+        if data:
+            if self.lazy_text:
+                store.text.record_signature(file_path)
+            self.parse_lines(store, file_id, self.read_lines(io.BytesIO(data), tail), tail)
+        return store, restarted
+
+
+    def report_progress(self, lines: Iterator, f: io.BufferedIOBase, progress: ParseProgress) -> Iterator:
+        # Passes lines through, adding to the shared counters every
+        # REPORT_LINES lines. Bytes are counted on disk (compressed bytes
+        # for compressed files), from the position of the file descriptor
+        fileno = f.fileno()
+        reported = os.lseek(fileno, 0, os.SEEK_CUR)
+        count = 0
+        for count, line in enumerate(lines, 1):
+            yield line
+            if not count % REPORT_LINES:
+                progress.check()
+                position = os.lseek(fileno, 0, os.SEEK_CUR)
+                progress.add(REPORT_LINES, position - reported)
+                reported = position
+        progress.add(count % REPORT_LINES, os.lseek(fileno, 0, os.SEEK_CUR) - reported)
+
+
+    def choose_format(self, lines: Iterable, tail: FileTail) -> Tuple[LogFormat, Iterator]:
+        # The format of a file and its lines. The one already chosen for the
+        # file is kept, otherwise the first SAMPLE_LINES lines are tried
+        # against each format and put back in front of the rest
+        log_format = self.format_index.get(tail.format)
+        if log_format is not None:
+            return log_format, iter(lines)
+        lines = iter(lines)
+        sample = list(islice(lines, SAMPLE_LINES))
+        log_format = detect_format((line for _, line, _ in sample), self.formats)
+        if log_format is None:
+            return self.formats[0], chain(sample, lines)
+        tail.format = log_format.name
+        return log_format, chain(sample, lines)
+
+
+    def parse_lines(self, store: LogStore, file_id: int,
+                    lines: Iterable[Tuple[int, str, Optional[Tuple[int, int]]]], tail: FileTail):
+        # Lines that are not entries (stack traces, wrapped messages) are
+        # added to the entry before them. Those before the first entry are
+        # dropped at the start of a file; when the parse resumes at the tail
+        # they are kept as store.continuations of the entry parsed before
+        resumed = tail.line_count > 0
+        log_format, lines = self.choose_format(lines, tail)
+        if perf.enabled:
+            self.parse_lines_timed(store, file_id, lines, log_format, resumed)
+            return
+        match = log_format.match
+        for line_num, line, span in lines:
+            fields = match(line)
+            if fields:
+                timestamp, level, raw, message_start = fields
+                store.append(to_micros(timestamp), level, file_id, line_num, raw, message_start, span)
+            elif len(store):
+                if line.strip():
+                    store.extend_last(line.rstrip('\n'), span)
+            elif resumed and line.strip():
+                store.add_continuation(file_id, line.rstrip('\n'), span)
+
+
+    def parse_lines_timed(self, store: LogStore, file_id: int,
+                          lines: Iterable[Tuple[int, str, Optional[Tuple[int, int]]]], log_format: LogFormat,
+                          resumed: bool = False):
+        # parse_lines() through a copy of the format with a timed decoder:
+        # match() time minus the decoding counts as regex matching
+        timed = copy.copy(log_format)
+        decoder = timed.decoder = TimedDecoder(log_format.decoder)
+        clock = time.perf_counter
+        matching = 0.0
+        count = 0
+        for line_num, line, span in lines:
+            start = clock()
+            fields = timed.match(line)
+            matching += clock() - start
+            count += 1
+            if fields:
+                timestamp, level, raw, message_start = fields
+                store.append(to_micros(timestamp), level, file_id, line_num, raw, message_start, span)
+            elif len(store):
+                if line.strip():
+                    store.extend_last(line.rstrip('\n'), span)
+            elif resumed and line.strip():
+                store.add_continuation(file_id, line.rstrip('\n'), span)
+        perf.add('regex match', matching - decoder.seconds, count)
+        perf.add('timestamp decode', decoder.seconds, decoder.count)
+
+
+    def read_lines(self, f: io.BufferedIOBase, tail: FileTail,
+                   complete_lines: bool = False) -> Iterator[Tuple[int, str, Optional[Tuple[int, int]]]]:
+        # Lines from the binary stream f, which is positioned at tail.offset.
+        # The tail moves past what was read once the stream is exhausted.
+        # With complete_lines a last line without its newline is not read,
+        # the tail stops before it (f must then be seekable)
+        line_num = tail.line_count
+        offset = tail.offset
+        if not self.lazy_text:
+            start = f.tell()
+            text = io.TextIOWrapper(f, encoding='utf-8', errors='ignore')
+            partial = False
+            for line_num, line in enumerate(text, line_num + 1):
+                if complete_lines and not line.endswith('\n'):
+                    # Only the last line can lack it
+                    partial = True
+                    line_num -= 1
+                    break
+                yield line_num, line, None
+            # The wrapper has consumed the stream up to its end
+            text.detach()
+            end = f.tell()
+            if partial:
+                end = line_start(f, end, start)
+            tail.offset, tail.line_count = offset + end - start, line_num
+            return
+
+        # Binary read to know where each line sits in the file. The span
+        # excludes the line ending so the text decodes to the same raw line
+        for line_num, data in enumerate(f, line_num + 1):
+            size = len(data)
+            if data.endswith(b'\n'):
+                data = data[:-1]
+            elif complete_lines:
+                line_num -= 1
+                break
+            if data.endswith(b'\r'):
+                data = data[:-1]
+            yield line_num, data.decode('utf-8', errors='ignore'), (offset, len(data))
+            offset += size
+        tail.offset, tail.line_count = offset, line_num
+
+
+    def parse_line(self, line: str, file_path: str, line_num: int,
+                   log_format: Optional[LogFormat] = None) -> Optional[LogEntry]:
+        fields = (log_format or self.formats[0]).match(line)
+        if fields:
+            timestamp, level, raw, message_start = fields
+            return LogEntry(
+                timestamp=timestamp,
+                level=level,
+                message=raw[message_start:],
+                file_name=os.path.basename(file_path),
+                file_path=file_path,
+                line_number=line_num,
+                raw=raw,
+                fields=self.field_extractor.extract(raw[message_start:]) if self.field_extractor else None
+            )
+        return None
+
+
+def line_start(f: io.BufferedIOBase, end: int, start: int) -> int:
+    # Position just after the last newline before end, start if there is
+    # none after it
+    position = end
+    while position > start:
+        block = max(start, position - LINE_END_BLOCK)
+        f.seek(block)
+        found = f.read(position - block).rfind(b'\n')
+        if found >= 0:
+            return block + found + 1
+        position = block
+    return start
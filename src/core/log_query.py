@@ -0,0 +1,561 @@
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from fnmatch import fnmatchcase
+from itertools import compress, filterfalse
+import re
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from core.log_entry import LogEntry
+from core.log_store import to_micros
+from core.text_search import compile_pattern
+
+# Filter queries: field:value terms, AND (or nothing), OR, NOT (or a
+# leading '-') and parentheses, e.g.
+#   level:error,warning file:db*.log -msg:"heartbeat" after:"2024-01-01 10:00:00"
+# A query is parsed once into a tree of predicates. Each predicate can
+# select the matching ids from a range of the store or refine a list of
+# candidate ids; an AND selects with its most selective, cheapest part and
+# refines with the others in order, using the level and file counts of the
+# LogIndex. Bare words are message text. Extracted key=value fields are
+# terms too (request_id:r42), looked up in the facets of the LogIndex
+
+
+# Relative cost of checking one entry, for ordering the parts of an AND
+INDEX_COST = 1.0
+TEXT_COST = 20.0
+REGEX_COST = 60.0
+
+# Share of the entries a text term is assumed to keep, its matches are not
+# known before it runs
+TEXT_SELECTIVITY = 0.1
+
+# Candidates up to this share of the store are checked one by one, more are
+# intersected with a full search (which TextSearch keeps for the next call)
+REFINE_SHARE = 0.25
+
+FIELDS = {
+    'level': 'level', 'levels': 'level',
+    'file': 'file',
+    'msg': 'msg', 'message': 'msg',
+    're': 're', 'regex': 're',
+    'after': 'after', 'from': 'after',
+    'before': 'before', 'to': 'before',
+}
+
+# What an extracted field name must look like to be used as a query term
+FIELD_NAME = re.compile(r'[A-Za-z_]\w*')
+
+# A '-' right before '(' or NOT is a token of its own (negate), before a
+# term it is part of the term (minus)
+TOKEN = re.compile(r'''\s*(?:(?P<open>\()|(?P<close>\))|(?P<negate>-)(?=-*(?:\(|NOT\b))|(?P<minus>-)?(?:(?P<field>[A-Za-z_]\w*):)?(?P<value>"(?:[^"\\]|\\.)*"|[^\s()"]+))''')
+
+KEYWORDS = ('AND', 'OR', 'NOT')
+
+
+class QueryError(ValueError):
+    pass
+
+
+class QueryContext:
+    # What predicates run against: a time-sorted store, its LogIndex and
+    # its TextSearch, built only when a text term needs it
+
+    def __init__(self, store, index, text_search: Callable):
+        self.store = store
+        self.index = index
+        self._text_search = text_search
+
+    @property
+    def text_search(self):
+        return self._text_search()
+
+
+def is_range(ids: Sequence[int]) -> bool:
+    return isinstance(ids, range) and ids.step == 1
+
+
+def union(parts: List[Sequence[int]]) -> Sequence[int]:
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return array('I')
+    if len(parts) == 1:
+        return parts[0]
+    return array('I', sorted(set().union(*parts)))
+
+
+class Predicate:
+    # A node of a compiled query. select() and refine() return sorted ids.
+    # key() is the same for queries that select the same entries however
+    # they were written (term order, list order), e.g. for caching results
+
+    def key(self) -> tuple:
+        return ('all',)
+
+    def estimate(self, context: QueryContext) -> Tuple[float, float]:
+        # (cost per entry checked, share of the entries kept)
+        return 0.0, 1.0
+
+    def select(self, context: QueryContext, low: int, high: int) -> Sequence[int]:
+        return range(low, high)
+
+    def refine(self, context: QueryContext, ids: Sequence[int]) -> Sequence[int]:
+        return ids
+
+    def matches(self, entry: LogEntry) -> bool:
+        return True
+
+
+class CodePredicate(Predicate, ABC):
+    # Level, file or field value: a set of codes answered from the LogIndex
+    # postings. Subclasses say which codes; files picks the file id column
+    # over the level codes
+
+    files = False
+
+    @abstractmethod
+    def codes(self, context: QueryContext) -> set:
+        # Codes of the entries that match, in the column of this predicate
+        ...
+
+    def column(self, context: QueryContext):
+        return context.store.file_ids if self.files else context.store.level_codes
+
+    def estimate(self, context):
+        total = len(context.store) or 1
+        return INDEX_COST, context.index.count(self.codes(context), self.files) / total
+
+    def select(self, context, low, high):
+        return context.index.select(self.codes(context), low, high, self.files)
+
+    def refine(self, context, ids):
+        if is_range(ids):
+            return self.select(context, ids.start, ids.stop)
+        codes = self.codes(context)
+        return array('I', compress(ids, map(codes.__contains__, map(self.column(context).__getitem__, ids))))
+
+
+class LevelPredicate(CodePredicate):
+
+    def __init__(self, levels: List[str]):
+        self.levels = [level.lower() for level in levels]
+
+    def key(self):
+        return ('level', tuple(sorted(set(self.levels))))
+
+    def codes(self, context):
+        level_index = context.store.level_index
+        return {level_index[level] for level in self.levels if level in level_index}
+
+    def matches(self, entry):
+        return entry.level in self.levels
+
+
+class FilePredicate(CodePredicate):
+    # Glob patterns on the file name, or on the path when they have a separator
+
+    files = True
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = [pattern.lower() for pattern in patterns]
+
+    def key(self):
+        return ('file', tuple(sorted(set(self.patterns))))
+
+    def matches_file(self, file_path: str, file_name: str) -> bool:
+        file_path, file_name = file_path.lower(), file_name.lower()
+        return any(fnmatchcase(file_path if '/' in pattern or '\\' in pattern else file_name, pattern)
+                   for pattern in self.patterns)
+
+    def codes(self, context):
+        return {file_id for file_id, (path, name) in enumerate(context.store.files) if self.matches_file(path, name)}
+
+    def matches(self, entry):
+        return self.matches_file(entry.file_path, entry.file_name)
+
+
+class FieldPredicate(CodePredicate):
+    # Exact values of an extracted field, a hash lookup per value
+
+    def __init__(self, name: str, values: List[str]):
+        self.name = name
+        self.values = values
+
+    def key(self):
+        return ('field', self.name, tuple(sorted(set(self.values))))
+
+    def codes(self, context):
+        column = context.store.fields.get(self.name)
+        if column is None:
+            return set()
+        return {column.index[value] for value in self.values if value in column.index}
+
+    def column(self, context):
+        return context.store.fields[self.name].ids
+
+    def estimate(self, context):
+        if self.name not in context.store.fields:
+            return INDEX_COST, 0.0
+        total = len(context.store) or 1
+        return INDEX_COST, context.index.count_field(self.name, self.codes(context)) / total
+
+    def select(self, context, low, high):
+        if self.name not in context.store.fields:
+            return array('I')
+        return context.index.select_field(self.name, self.codes(context), low, high)
+
+    def refine(self, context, ids):
+        if self.name not in context.store.fields:
+            return array('I')
+        return super().refine(context, ids)
+
+    def matches(self, entry):
+        return bool(entry.fields) and entry.fields.get(self.name) in self.values
+
+
+class TimePredicate(Predicate):
+    # Inclusive bounds, either may be None. Ids are time ordered, so both
+    # select and refine are bisections
+
+    def __init__(self, time_from: Optional[datetime], time_to: Optional[datetime]):
+        self.time_from = time_from
+        self.time_to = time_to
+
+    def key(self):
+        return ('time', self.time_from, self.time_to)
+
+    def bounds(self):
+        return (to_micros(self.time_from) if self.time_from else None,
+                to_micros(self.time_to) if self.time_to else None)
+
+    def estimate(self, context):
+        low, high = context.index.time_range(*self.bounds())
+        return 0.0, (high - low) / (len(context.store) or 1)
+
+    def select(self, context, low, high):
+        start, stop = context.index.time_range(*self.bounds())
+        start = max(low, start)
+        return range(start, max(start, min(high, stop)))
+
+    def refine(self, context, ids):
+        micros_from, micros_to = self.bounds()
+        key = context.store.timestamps.__getitem__
+        start = 0 if micros_from is None else bisect_left(ids, micros_from, key=key)
+        stop = len(ids) if micros_to is None else bisect_right(ids, micros_to, key=key)
+        return ids[start:max(start, stop)]
+
+    def matches(self, entry):
+        if self.time_from and entry.timestamp < self.time_from:
+            return False
+        return not (self.time_to and entry.timestamp > self.time_to)
+
+
+class TextPredicate(Predicate):
+    # Case-insensitive substring, or regular expression, on the message
+
+    def __init__(self, text: str, regex: bool = False):
+        self.regex = regex
+        if regex:
+            try:
+                self.pattern = compile_pattern(text, lowercase_text=False)
+            except re.error as e:
+                raise QueryError(f"invalid pattern '{text}': {e}")
+            self.text = text
+        else:
+            self.text = text.lower()
+
+    def key(self):
+        return ('re' if self.regex else 'msg', self.text)
+
+    def estimate(self, context):
+        return (REGEX_COST if self.regex else TEXT_COST), TEXT_SELECTIVITY
+
+    def find(self, context: QueryContext):
+        text_search = context.text_search
+        return text_search.find_regex(self.text) if self.regex else text_search.find(self.text)
+
+    def select(self, context, low, high):
+        found = self.find(context)
+        return found[bisect_left(found, low):bisect_left(found, high)]
+
+    def refine(self, context, ids):
+        if is_range(ids):
+            return self.select(context, ids.start, ids.stop)
+        if len(ids) <= REFINE_SHARE * len(context.store):
+            text_search = context.text_search
+            return text_search.refine_regex(ids, self.text) if self.regex else text_search.refine(ids, self.text)
+        found = set(self.find(context))
+        return array('I', filter(found.__contains__, ids))
+
+    def matches(self, entry):
+        if self.regex:
+            return bool(self.pattern.search(entry.message))
+        return self.text in entry.message.lower()
+
+
+class NotPredicate(Predicate):
+
+    def __init__(self, child: Predicate):
+        self.child = child
+
+    def key(self):
+        return ('not', self.child.key())
+
+    def estimate(self, context):
+        cost, share = self.child.estimate(context)
+        return cost, 1.0 - share
+
+    def select(self, context, low, high):
+        found = self.child.select(context, low, high)
+        if is_range(found):
+            if not len(found):
+                return range(low, high)
+            kept = array('I', range(low, found.start))
+            kept.extend(range(found.stop, high))
+            return kept
+        keep = bytearray(b'\x01') * (high - low)
+        for index in found:
+            keep[index - low] = 0
+        return array('I', compress(range(low, high), keep))
+
+    def refine(self, context, ids):
+        found = set(self.child.refine(context, ids))
+        if not found:
+            return ids
+        return array('I', filterfalse(found.__contains__, ids))
+
+    def matches(self, entry):
+        return not self.child.matches(entry)
+
+
+class AndPredicate(Predicate):
+
+    def __init__(self, children: List[Predicate]):
+        self.children = children
+
+    def key(self):
+        return ('and', *combined_keys(self.children, 'and'))
+
+    def ordered(self, context: QueryContext) -> List[Predicate]:
+        # Most entries removed per unit of cost first; free parts (time
+        # bounds) always come first
+        def rank(child):
+            cost, share = child.estimate(context)
+            return -(1.0 - share) / cost if cost else float('-inf')
+        return sorted(self.children, key=rank)
+
+    def estimate(self, context):
+        cost, share = 0.0, 1.0
+        for child in self.children:
+            child_cost, child_share = child.estimate(context)
+            cost += child_cost * share
+            share *= child_share
+        return cost, share
+
+    def select(self, context, low, high):
+        first, *rest = self.ordered(context)
+        ids = first.select(context, low, high)
+        for child in rest:
+            if not len(ids):
+                break
+            ids = child.refine(context, ids)
+        return ids
+
+    def refine(self, context, ids):
+        for child in self.ordered(context):
+            if not len(ids):
+                break
+            ids = child.refine(context, ids)
+        return ids
+
+    def matches(self, entry):
+        return all(child.matches(entry) for child in self.children)
+
+
+class OrPredicate(Predicate):
+
+    def __init__(self, children: List[Predicate]):
+        self.children = children
+
+    def key(self):
+        return ('or', *combined_keys(self.children, 'or'))
+
+    def estimate(self, context):
+        estimates = [child.estimate(context) for child in self.children]
+        return sum(cost for cost, _ in estimates), min(1.0, sum(share for _, share in estimates))
+
+    def select(self, context, low, high):
+        return union([child.select(context, low, high) for child in self.children])
+
+    def refine(self, context, ids):
+        if is_range(ids):
+            return self.select(context, ids.start, ids.stop)
+        return union([child.refine(context, ids) for child in self.children])
+
+    def matches(self, entry):
+        return any(child.matches(entry) for child in self.children)
+
+
+def combined_keys(children: List[Predicate], operator: str) -> List[tuple]:
+    # Keys of the children with nested ANDs (or ORs) flattened, without
+    # duplicates, in a fixed order
+    keys = set()
+    for child in children:
+        key = child.key()
+        keys.update(key[1:] if key[0] == operator else (key,))
+    return sorted(keys, key=repr)
+
+
+class QueryParser:
+    # Recursive descent over the tokens of a query:
+    #   or := and ('OR' and)*
+    #   and := unary (['AND'] unary)*
+    #   unary := ('NOT' | '-') unary | '(' or ')' | term
+
+    def __init__(self, text: str, fields: Sequence[str] = ()):
+        self.text = text
+        self.fields = fields
+        self.tokens = self.tokenize(text)
+        self.position = 0
+
+    def tokenize(self, text: str) -> List[re.Match]:
+        tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = TOKEN.match(text, position)
+            if match is None or match.end() == position:
+                raise QueryError(f"unexpected '{text[position:].strip()[:20]}' in query")
+            tokens.append(match)
+            position = match.end()
+        return tokens
+
+    def peek(self) -> Optional[re.Match]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def is_keyword(self, token: Optional[re.Match], keyword: str) -> bool:
+        return (token is not None and token['value'] == keyword
+                and not token['field'] and not token['minus'])
+
+    def parse(self) -> Predicate:
+        if not self.tokens:
+            return Predicate()
+        predicate = self.parse_or()
+        if self.peek() is not None:
+            raise QueryError("unbalanced ')' in query")
+        return predicate
+
+    def parse_or(self) -> Predicate:
+        children = [self.parse_and()]
+        while self.is_keyword(self.peek(), 'OR'):
+            self.position += 1
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else OrPredicate(children)
+
+    def parse_and(self) -> Predicate:
+        children = [self.parse_unary()]
+        while True:
+            token = self.peek()
+            if token is None or token['close'] or self.is_keyword(token, 'OR'):
+                break
+            if self.is_keyword(token, 'AND'):
+                self.position += 1
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else AndPredicate(children)
+
+    def parse_unary(self) -> Predicate:
+        token = self.peek()
+        if token is None:
+            raise QueryError("query ends where a term was expected")
+        self.position += 1
+        if token['negate'] or self.is_keyword(token, 'NOT'):
+            return NotPredicate(self.parse_unary())
+        if token['open']:
+            predicate = self.parse_or()
+            closing = self.peek()
+            if closing is None or not closing['close']:
+                raise QueryError("missing ')' in query")
+            self.position += 1
+            return predicate
+        if token['close'] or (token['value'] in KEYWORDS and not token['field']):
+            raise QueryError(f"unexpected '{token.group().strip()}' in query")
+        predicate = self.term(token['field'], self.unquote(token['value']))
+        return NotPredicate(predicate) if token['minus'] else predicate
+
+    def unquote(self, value: str) -> str:
+        # Only \" and \\ are escapes, so patterns keep their \d and \s
+        if value.startswith('"'):
+            return re.sub(r'\\([\\"])', r'\1', value[1:-1])
+        return value
+
+    def term(self, field: Optional[str], value: str) -> Predicate:
+        if field is None:
+            return TextPredicate(value)
+        name = FIELDS.get(field.lower())
+        if name is None and field in self.fields:
+            return FieldPredicate(field, split_list(value))
+        if name is None:
+            raise QueryError(f"unknown field '{field}'")
+        if name == 'level':
+            return LevelPredicate(split_list(value))
+        if name == 'file':
+            return FilePredicate(split_list(value))
+        if name in ('msg', 're'):
+            return TextPredicate(value, regex=name == 're')
+        timestamp = parse_time(value)
+        return TimePredicate(timestamp, None) if name == 'after' else TimePredicate(None, timestamp)
+
+
+def split_list(value: str) -> List[str]:
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def parse_time(value: str) -> datetime:
+    # 'YYYY-MM-DD HH:MM:SS' as in the time fields, a 'T', fractions or a
+    # date alone are accepted too
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise QueryError(f"invalid time '{value}', expected YYYY-MM-DD HH:MM:SS")
+
+
+def check_field_names(names: Iterable[str]) -> Tuple[str, ...]:
+    # Names of extracted fields, rejected (QueryError) when a query could
+    # not name them: not an identifier, or one of the built-in FIELDS,
+    # which would always win over the extracted field
+    names = tuple(names)
+    for name in names:
+        if not FIELD_NAME.fullmatch(name):
+            raise QueryError(f"invalid field name '{name}', use letters, digits and '_'")
+        if name.lower() in FIELDS:
+            raise QueryError(f"'{name}' is a built-in query field, it cannot be an extracted field")
+    return names
+
+
+def parse_query(text: str, fields: Sequence[str] = ()) -> Predicate:
+    # fields are the names of the extracted fields that may be used as
+    # terms. Raises QueryError for invalid queries
+    return QueryParser(text, fields).parse()
+
+
+def quote(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def format_query(levels: Optional[List[str]] = None,
+                 time_from: Optional[datetime] = None,
+                 time_to: Optional[datetime] = None,
+                 search_text: Optional[str] = None,
+                 regex: bool = False) -> str:
+    # The query for the fixed filters of LogFilter.apply()
+    terms = []
+    if levels:
+        terms.append(f"level:{','.join(levels)}")
+    if time_from:
+        terms.append(f"after:{quote(time_from.isoformat(' '))}")
+    if time_to:
+        terms.append(f"before:{quote(time_to.isoformat(' '))}")
+    if search_text:
+        terms.append(f"{'re' if regex else 'msg'}:{quote(search_text)}")
+    return ' '.join(terms)
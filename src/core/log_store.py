@@ -0,0 +1,504 @@
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import partial
+import heapq
+from itertools import accumulate, pairwise
+from operator import itemgetter, sub
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from core import perf
+from core.field_extractor import FieldColumn, FieldExtractor
+from core.log_entry import LogEntry
+from core.log_merger import is_sorted
+from core.mapped_text import MappedText
+from core.template_miner import TemplateMiner
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Known levels get fixed codes so stores built in different workers agree
+KNOWN_LEVELS = ['error', 'warning', 'info', 'debug', 'trace']
+
+# Column bytes per entry, on top of the UTF-8 bytes of the line itself:
+# timestamp 8, level 2, file id 4, line number 4, message start 2 (the
+# length of the line prefix) and line end 8, or with lazy_text offset 8 and
+# length 4 instead of the text. Mining templates adds 2 for the template id,
+# each extracted field 4
+ENTRY_OVERHEAD_TARGET = 32
+
+# Largest line prefix the 'H' message start column holds. Past it the whole
+# line is stored as the message rather than failing the load
+MAX_MESSAGE_START = 0xFFFF
+
+# Entries looked at per step when searching back for the last one of a file
+SEARCH_CHUNK = 4096
+
+
+def to_micros(timestamp: datetime) -> int:
+    return (timestamp - EPOCH) // MICROSECOND
+
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+class TextBuffer:
+    # All lines UTF-8 encoded back to back in one buffer, line i ends at ends[i]
+
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = array('Q')
+
+    def __len__(self):
+        return len(self.ends)
+
+    def append(self, text: str, span: Optional[Tuple[int, int]] = None):
+        self.data += text.encode('utf-8')
+        self.ends.append(len(self.data))
+
+    def extend_last(self, text: str, span: Optional[Tuple[int, int]] = None):
+        # A continuation line joins the last line after a newline
+        self.data += b'\n' + text.encode('utf-8')
+        self.ends[-1] = len(self.data)
+
+    def extend_entry(self, index: int, text: str, span: Optional[Tuple[int, int]] = None):
+        # extend_last() for any line, the lines after it move up
+        if index == len(self.ends) - 1:
+            self.extend_last(text, span)
+            return
+        added = b'\n' + text.encode('utf-8')
+        end = self.ends[index]
+        self.data[end:end] = added
+        shift = len(added)
+        self.ends[index:] = array('Q', map(shift.__add__, self.ends[index:]))
+
+    def start(self, index: int) -> int:
+        return self.ends[index - 1] if index else 0
+
+    def get(self, index: int, file_id: int) -> str:
+        return self.data[self.start(index):self.ends[index]].decode('utf-8')
+
+    def extend_from(self, other: 'TextBuffer', start: int, end: int):
+        if start == end:
+            return
+        first = other.start(start)
+        shift = len(self.data) - first
+        self.data += other.data[first:other.ends[end - 1]]
+        if shift:
+            self.ends.extend(map(shift.__add__, other.ends[start:end]))
+        else:
+            self.ends.extend(other.ends[start:end])
+
+    def truncate(self, size: int):
+        del self.data[self.start(size):]
+        del self.ends[size:]
+
+    def gather(self, texts: List['TextBuffer'], order: array):
+        # Appends the lines of texts, concatenated, in the given order.
+        # The buffers are not concatenated, each line is copied from its own
+        bases = list(accumulate(map(len, texts), initial=0))
+        sources = array('H', map(partial(bisect_right, bases[1:]), order))
+        data, ends = self.data, self.ends
+        views = [memoryview(text.data) for text in texts]
+        text_ends = [text.ends for text in texts]
+        try:
+            for source, position in zip(sources, map(sub, order, map(bases.__getitem__, sources))):
+                run_ends = text_ends[source]
+                data += views[source][run_ends[position - 1] if position else 0:run_ends[position]]
+                ends.append(len(data))
+        finally:
+            for view in views:
+                view.release()
+
+    def take(self, order: Sequence[int]) -> 'TextBuffer':
+        taken = TextBuffer()
+        ends, start = self.ends, self.start
+        with memoryview(self.data) as data:
+            for index in order:
+                taken.data += data[start(index):ends[index]]
+        taken.ends = array('Q', accumulate(ends[i] - start(i) for i in order))
+        return taken
+
+    def nbytes(self) -> int:
+        return len(self.data) + self.ends.itemsize * len(self.ends)
+
+    def text_nbytes(self) -> int:
+        return len(self.data)
+
+    def changed_files(self) -> List[str]:
+        return []
+
+
+class LogStore:
+    # Columnar storage for parsed entries, indexing it returns a LogEntry
+
+    COLUMNS = ('timestamps', 'level_codes', 'file_ids', 'line_numbers', 'message_starts')
+
+    def __init__(self, lazy_text: bool = False, templates: bool = False, fields: Iterable[str] = ()):
+        self.timestamps = array('q')
+        self.level_codes = array('H')
+        self.file_ids = array('I')
+        self.line_numbers = array('I')
+        self.message_starts = array('H')
+        # With templates each message is clustered as it is appended and
+        # template_ids holds its template, see TemplateMiner
+        self.template_ids = array('H')
+        self.templates = TemplateMiner() if templates else None
+        # key=value fields found in the messages, a FieldColumn per name
+        self.fields: Dict[str, FieldColumn] = {name: FieldColumn() for name in fields}
+        self.field_extractor = FieldExtractor(self.fields) if self.fields else None
+
+        self.levels = []
+        self.level_index = {}
+        self.files = []
+        self.file_index = {}
+        self.lazy_text = lazy_text
+        self.text = MappedText(self.files) if lazy_text else TextBuffer()
+        # Parser position per source file (a FileTail), used to follow appends
+        self.tails = {}
+        # Continuation lines a resumed parse started with, per file path.
+        # They belong to the last entry of the file parsed before, see
+        # attach_continuations()
+        self.continuations: Dict[str, List[Tuple[str, Optional[Tuple[int, int]]]]] = {}
+        for level in KNOWN_LEVELS:
+            self.level_code(level)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def columns(self) -> Tuple[str, ...]:
+        return self.COLUMNS + ('template_ids',) if self.templates is not None else self.COLUMNS
+
+    def __getitem__(self, index: int) -> LogEntry:
+        if index < 0:
+            index += len(self.timestamps)
+        file_id = self.file_ids[index]
+        raw = self.text.get(index, file_id)
+        file_path, file_name = self.files[file_id]
+        return LogEntry(
+            timestamp=from_micros(self.timestamps[index]),
+            level=self.levels[self.level_codes[index]],
+            message=raw[self.message_starts[index]:],
+            file_name=file_name,
+            file_path=file_path,
+            line_number=self.line_numbers[index],
+            raw=raw,
+            fields=self.entry_fields(index) if self.fields else None
+        )
+
+    def __iter__(self) -> Iterator[LogEntry]:
+        for index in range(len(self.timestamps)):
+            yield self[index]
+
+    def raw(self, index: int) -> str:
+        return self.text.get(index, self.file_ids[index])
+
+    def message(self, index: int) -> str:
+        return self.text.get(index, self.file_ids[index])[self.message_starts[index]:]
+
+    def entry_fields(self, index: int) -> Dict[str, str]:
+        fields = {}
+        for name, column in self.fields.items():
+            value_id = column.ids[index]
+            if value_id:
+                fields[name] = column.values[value_id]
+        return fields
+
+    def level_code(self, level: str) -> int:
+        code = self.level_index.get(level)
+        if code is None:
+            code = self.level_index[level] = len(self.levels)
+            self.levels.append(level)
+        return code
+
+    def file_id(self, file_path: str) -> int:
+        file_id = self.file_index.get(file_path)
+        if file_id is None:
+            file_id = self.file_index[file_path] = len(self.files)
+            self.files.append((file_path, os.path.basename(file_path)))
+        return file_id
+
+    def append(self, timestamp: int, level: str, file_id: int,
+               line_number: int, raw: str, message_start: int,
+               span: Optional[Tuple[int, int]] = None):
+        # span is the (byte offset, byte length) of the line in its file,
+        # needed when the text is read back lazily
+        self.timestamps.append(timestamp)
+        self.level_codes.append(self.level_code(level))
+        self.file_ids.append(file_id)
+        self.line_numbers.append(line_number)
+        if message_start > MAX_MESSAGE_START:
+            message_start = 0
+        self.message_starts.append(message_start)
+        self.text.append(raw, span)
+        if self.templates is not None:
+            self.template_ids.append(self.templates.add(raw[message_start:]))
+        if self.field_extractor is not None:
+            self.add_fields(self.field_extractor.extract(raw[message_start:]))
+
+    def add_fields(self, found: Dict[str, str]):
+        # Known values are a dict lookup, only new ones go through value_id()
+        for name, column in self.fields.items():
+            value = found.get(name)
+            if value is None:
+                column.ids.append(0)
+            else:
+                value_id = column.index.get(value)
+                column.ids.append(value_id if value_id is not None else column.value_id(value))
+
+    def extend_last(self, raw: str, span: Optional[Tuple[int, int]] = None):
+        # Adds a continuation line (a stack trace frame, say) to the message
+        # of the last entry
+        self.text.extend_last(raw, span)
+
+    def add_continuation(self, file_id: int, raw: str, span: Optional[Tuple[int, int]] = None):
+        # A continuation line with no entry before it in this store
+        self.continuations.setdefault(self.files[file_id][0], []).append((raw, span))
+
+    def attach_continuations(self, other: 'LogStore') -> int:
+        # Adds the continuation lines other starts with to the last entry of
+        # their file here, and returns the first id whose text changed (the
+        # length when none did). Lines of a file with no entry here yet are
+        # kept to be attached when this store is added to another
+        first = len(self)
+        for file_path, lines in other.continuations.items():
+            file_id = self.file_index.get(file_path)
+            index = self.last_of_file(file_id) if file_id is not None else -1
+            if index < 0:
+                self.continuations.setdefault(file_path, []).extend(lines)
+                continue
+            for raw, span in lines:
+                self.text.extend_entry(index, raw, span)
+            first = min(first, index)
+        return first
+
+    def last_of_file(self, file_id: int) -> int:
+        # Id of the last entry from the file, -1 if there is none. Searched
+        # back from the end, where appended lines find it right away
+        file_ids = self.file_ids
+        end = len(file_ids)
+        while end:
+            start = max(0, end - SEARCH_CHUNK)
+            chunk = file_ids[start:end]
+            chunk.reverse()
+            try:
+                return end - 1 - chunk.index(file_id)
+            except ValueError:
+                end = start
+        return -1
+
+    def append_entry(self, entry: LogEntry):
+        self.append(
+            to_micros(entry.timestamp),
+            entry.level,
+            self.file_id(entry.file_path),
+            entry.line_number,
+            entry.raw,
+            len(entry.raw) - len(entry.message)
+        )
+
+    def extend_from(self, other: 'LogStore', start: int, end: int):
+        self.timestamps.extend(other.timestamps[start:end])
+        self.line_numbers.extend(other.line_numbers[start:end])
+        self.message_starts.extend(other.message_starts[start:end])
+        self._extend_codes(self.level_codes, other.level_codes[start:end],
+                           [self.level_code(level) for level in other.levels])
+        self._extend_codes(self.file_ids, other.file_ids[start:end],
+                           [self.file_id(path) for path, _ in other.files])
+        self.text.extend_from(other.text, start, end)
+        self.tails.update(other.tails)
+        if self.templates is not None:
+            if other.templates is not None:
+                self._extend_codes(self.template_ids, other.template_ids[start:end],
+                                   self.templates.merge_from(other.templates))
+            else:
+                self.template_ids.extend(self.templates.add(other.message(i)) for i in range(start, end))
+        found = None
+        for name, column in self.fields.items():
+            other_column = other.fields.get(name)
+            if other_column is not None:
+                self._extend_codes(column.ids, other_column.ids[start:end], column.remap(other_column))
+                continue
+            if found is None:
+                found = [self.field_extractor.extract(other.message(i).partition('\n')[0]) for i in range(start, end)]
+            column.ids.extend(column.value_id(values.get(name)) for values in found)
+
+    def _extend_codes(self, column: array, codes: array, remap: List[int]):
+        if all(code == new for code, new in enumerate(remap)):
+            column.extend(codes)
+        else:
+            column.extend(map(remap.__getitem__, codes))
+
+    def sort(self) -> 'LogStore':
+        # Stable and in place, one column at a time to keep the peak low.
+        # Free when the file was already in time order
+        timestamps = self.timestamps
+        if is_sorted(timestamps):
+            return self
+        order = array('Q', sorted(range(len(timestamps)), key=timestamps.__getitem__))
+        for name in self.columns():
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, map(column.__getitem__, order)))
+        for column in self.fields.values():
+            column.ids = array('I', map(column.ids.__getitem__, order))
+        self.text = self.text.take(order)
+        return self
+
+    def truncate(self, size: int):
+        for name in self.columns():
+            del getattr(self, name)[size:]
+        for column in self.fields.values():
+            del column.ids[size:]
+        self.text.truncate(size)
+
+    def insert_sorted(self, other: 'LogStore') -> int:
+        # Adds the entries of other keeping the store in time order and
+        # returns the first id whose entry changed. That is the old length
+        # when everything went to the end, the usual case for appended lines.
+        # Otherwise only the entries after the insertion point are re-sorted.
+        # Continuation lines other starts with go to the entries they follow
+        changed = self.attach_continuations(other)
+        other.sort()
+        if not len(other):
+            return changed
+        first = bisect_right(self.timestamps, other.timestamps[0])
+        if first < len(self):
+            moved = type(self)(self.lazy_text, self.templates is not None, self.fields)
+            moved.extend_from(self, first, len(self))
+            moved.extend_from(other, 0, len(other))
+            self.truncate(first)
+            other = moved.sort()
+        self.extend_from(other, 0, len(other))
+        return min(first, changed)
+
+    @classmethod
+    def merge(cls, stores: Iterable['LogStore']) -> 'LogStore':
+        # Runs in time order that follow each other are concatenated, other
+        # runs go through merge_runs()
+        runs = list(stores)
+        if not runs:
+            return cls()
+        merged = cls(runs[0].lazy_text, runs[0].templates is not None, runs[0].fields)
+        for run in runs:
+            merged.attach_continuations(run)
+        runs = [run for run in runs if len(run)]
+        with perf.Timer('sort/merge', items=sum(map(len, runs))):
+            if (all(is_sorted(run.timestamps) for run in runs)
+                    and all(before.timestamps[-1] <= after.timestamps[0] for before, after in pairwise(runs))):
+                for run in runs:
+                    merged.extend_from(run, 0, len(run))
+            else:
+                merged.merge_runs(runs)
+        return merged
+
+    def merge_runs(self, runs: List['LogStore']):
+        # Stable sort of the concatenated runs into this empty store, done as
+        # a k-way merge. A run is one file, in time order apart from a few
+        # late lines, so only its order is sorted, the run is not copied.
+        # heapq.merge gives the merge order (equal timestamps in run order),
+        # then each column is gathered from the runs one at a time: on top
+        # of the result only the order (8 bytes an entry) and one column
+        # are held, never a sorted copy of everything
+        bases = list(accumulate((len(run) for run in runs), initial=0))
+        keyed = []
+        for run, base in zip(runs, bases):
+            timestamps = run.timestamps
+            if is_sorted(timestamps):
+                keyed.append(zip(timestamps, range(base, base + len(run))))
+            else:
+                run_order = array('I', sorted(range(len(run)), key=timestamps.__getitem__))
+                keyed.append(zip(map(timestamps.__getitem__, run_order), map(base.__add__, run_order)))
+        order = array('Q', map(itemgetter(1), heapq.merge(*keyed)))
+        del keyed
+
+        def gather(column: array, runs_codes: Iterable[Tuple[array, Optional[List[int]]]]) -> array:
+            # The column of the merged store from the same column of each
+            # run, codes translated through the remap of their run
+            concatenated = array(column.typecode)
+            for codes, remap in runs_codes:
+                if remap is None:
+                    concatenated.extend(codes)
+                else:
+                    self._extend_codes(concatenated, codes, remap)
+            return array(column.typecode, map(concatenated.__getitem__, order))
+
+        for name in ('timestamps', 'line_numbers', 'message_starts'):
+            setattr(self, name, gather(getattr(self, name), ((getattr(run, name), None) for run in runs)))
+        self.level_codes = gather(self.level_codes, ((run.level_codes, [self.level_code(level) for level in run.levels])
+                                                     for run in runs))
+        self.file_ids = gather(self.file_ids, ((run.file_ids, [self.file_id(path) for path, _ in run.files])
+                                               for run in runs))
+        if self.templates is not None:
+            self.template_ids = gather(self.template_ids, (
+                (run.template_ids, self.templates.merge_from(run.templates)) if run.templates is not None
+                else (array('H', (self.templates.add(run.message(i)) for i in range(len(run)))), None)
+                for run in runs))
+        for name, column in self.fields.items():
+            column.ids = gather(column.ids, (self._field_ids(column, name, run) for run in runs))
+        self.text.gather([run.text for run in runs], order)
+        for run in runs:
+            self.tails.update(run.tails)
+
+    def _field_ids(self, column: FieldColumn, name: str, run: 'LogStore') -> Tuple[array, Optional[List[int]]]:
+        # Value ids of a run for merge_runs(), extracted when the run has no such field
+        other_column = run.fields.get(name)
+        if other_column is not None:
+            return other_column.ids, column.remap(other_column)
+        found = (self.field_extractor.extract(run.message(i).partition('\n')[0]) for i in range(len(run)))
+        return array('I', (column.value_id(values.get(name)) for values in found)), None
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[LogEntry]) -> 'LogStore':
+        store = cls()
+        for entry in entries:
+            store.append_entry(entry)
+        return store
+
+    def count_levels(self, indices: Optional[Iterable[int]] = None) -> Counter:
+        codes = self.level_codes if indices is None else map(self.level_codes.__getitem__, indices)
+        return Counter({self.levels[code]: count for code, count in Counter(codes).items()})
+
+    def nbytes(self) -> int:
+        columns = [getattr(self, name) for name in self.columns()]
+        fields = sum(column.nbytes() for column in self.fields.values())
+        return self.text.nbytes() + sum(column.itemsize * len(column) for column in columns) + fields
+
+    def overhead_per_entry(self) -> float:
+        # Bytes per entry beyond the line text itself, compare with ENTRY_OVERHEAD_TARGET
+        if not len(self):
+            return 0.0
+        return (self.nbytes() - self.text.text_nbytes()) / len(self)
+
+    def changed_files(self) -> List[str]:
+        return self.text.changed_files()
+
+
+class LogSelection:
+    # A filtered subset of a LogStore, kept as an index array or a range
+
+    def __init__(self, store: LogStore, indices: Optional[array] = None):
+        self.store = store
+        self.indices = indices if indices is not None else array('I', range(len(store)))
+        self.level_counts = None
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index: int) -> LogEntry:
+        return self.store[self.indices[index]]
+
+    def __iter__(self) -> Iterator[LogEntry]:
+        store = self.store
+        for index in self.indices:
+            yield store[index]
+
+    def count_levels(self) -> Counter:
+        # Kept with the selection, which LogFilter may hand out again from
+        # its cache. The counts are for the entries when it was made
+        if self.level_counts is None:
+            self.level_counts = self.store.count_levels(self.indices)
+        return self.level_counts.copy()
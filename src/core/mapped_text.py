@@ -0,0 +1,190 @@
+from array import array
+from collections import OrderedDict
+import mmap
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.source_reader import compression_of, fingerprint, read_source
+
+
+CACHE_SIZE = 4096
+
+
+class SourceChangedError(Exception):
+    pass
+
+
+def file_signature(file_path: str) -> Tuple[int, int, int, int]:
+    stat = os.stat(file_path)
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def join_lines(text: str) -> str:
+    # The span of a multi-line entry covers the line endings and blank lines
+    # between its lines. Read as text, line endings become '\n' and blank
+    # continuation lines are dropped; this gives the same text
+    first, *rest = text.split('\n')
+    lines = [first.removesuffix('\r')]
+    lines.extend(line.removesuffix('\r') for line in rest if line.strip())
+    return '\n'.join(lines)
+
+
+class MappedText:
+    # Line text kept as (byte offset, byte length) in the source file and
+    # decoded on demand from an mmap of it. Only the file id comes from the
+    # owning LogStore, so the files list is shared with it. Compressed files
+    # cannot be mapped, they are decompressed into memory on first use
+
+    def __init__(self, files: List[Tuple[str, str]]):
+        self.files = files
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        # file_signature() and fingerprint() of each file when it was read
+        self.signatures: Dict[str, Tuple[int, int, int, int, str]] = {}
+        self._maps = {}
+        self._cache = OrderedDict()
+        # Background threads (search indexing, export) read lines too
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        state['_cache'] = OrderedDict()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, text: str, span: Optional[Tuple[int, int]] = None):
+        offset, length = span
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def extend_last(self, text: str, span: Optional[Tuple[int, int]] = None):
+        # The continuation follows the last line in the file, the span grows
+        # over the line ending up to the end of the continuation
+        offset, length = span
+        self.lengths[-1] = offset + length - self.offsets[-1]
+
+    def extend_entry(self, index: int, text: str, span: Optional[Tuple[int, int]] = None):
+        # extend_last() for the last line of a file that is not the last line here
+        offset, length = span
+        self.lengths[index] = offset + length - self.offsets[index]
+        with self._lock:
+            self._cache.pop(index, None)
+
+    def get(self, index: int, file_id: int) -> str:
+        with self._lock:
+            cache = self._cache
+            text = cache.get(index)
+            if text is not None:
+                cache.move_to_end(index)
+                return text
+
+            offset = self.offsets[index]
+            end = offset + self.lengths[index]
+            mapped = self._map(file_id)
+            if end > len(mapped):
+                # The line was appended after the file was mapped
+                self._unmap(file_id)
+                mapped = self._map(file_id)
+            data = mapped[offset:end]
+            text = data.decode('utf-8', errors='ignore')
+            if '\n' in text:
+                text = join_lines(text)
+            cache[index] = text
+            if len(cache) > CACHE_SIZE:
+                cache.popitem(last=False)
+            return text
+
+    def _map(self, file_id: int) -> mmap.mmap:
+        mapped = self._maps.get(file_id)
+        if mapped is None:
+            file_path = self.files[file_id][0]
+            if self.is_changed(file_path):
+                raise SourceChangedError(f"{file_path} changed since it was loaded")
+            if compression_of(file_path) is not None:
+                mapped = read_source(file_path)
+            else:
+                with open(file_path, 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[file_id] = mapped
+        return mapped
+
+    def record_signature(self, file_path: str):
+        signature = file_signature(file_path)
+        self.signatures[file_path] = signature + (fingerprint(file_path, signature[2]),)
+
+    def is_changed(self, file_path: str) -> bool:
+        # Appending keeps every recorded offset valid, replacing, truncating
+        # or rewriting the file does not. A file that grew or was written to
+        # keeps its recorded bytes only if their fingerprint still matches,
+        # which catches a copytruncate that grew again or a rewrite in place
+        try:
+            device, inode, size, mtime = file_signature(file_path)
+            known_device, known_inode, known_size, known_mtime, known_fingerprint = self.signatures[file_path]
+            if device != known_device or inode != known_inode or size < known_size:
+                return True
+            if size == known_size and mtime == known_mtime:
+                return False
+            return fingerprint(file_path, known_size) != known_fingerprint
+        except OSError:
+            return True
+
+    def changed_files(self) -> List[str]:
+        changed = [path for path in self.signatures if self.is_changed(path)]
+        if changed:
+            self.close()
+        return changed
+
+    def _unmap(self, file_id: int):
+        mapped = self._maps.pop(file_id)
+        if isinstance(mapped, mmap.mmap):
+            mapped.close()
+
+    def close(self):
+        with self._lock:
+            for file_id in list(self._maps):
+                self._unmap(file_id)
+            self._cache.clear()
+
+    def extend_from(self, other: 'MappedText', start: int, end: int):
+        self.offsets.extend(other.offsets[start:end])
+        self.lengths.extend(other.lengths[start:end])
+        self.signatures.update(other.signatures)
+
+    def truncate(self, size: int):
+        del self.offsets[size:]
+        del self.lengths[size:]
+        # Cached by entry id, ids past the cut get new entries
+        self._cache.clear()
+
+    def gather(self, texts: List['MappedText'], order: array):
+        # Appends the lines of texts, concatenated, in the given order
+        for name in ('offsets', 'lengths'):
+            column = getattr(self, name)
+            concatenated = array(column.typecode)
+            for text in texts:
+                concatenated.extend(getattr(text, name))
+            column.extend(map(concatenated.__getitem__, order))
+        for text in texts:
+            self.signatures.update(text.signatures)
+
+    def take(self, order: Sequence[int]) -> 'MappedText':
+        taken = MappedText(self.files)
+        taken.offsets = array('Q', map(self.offsets.__getitem__, order))
+        taken.lengths = array('I', map(self.lengths.__getitem__, order))
+        taken.signatures = self.signatures
+        return taken
+
+    def nbytes(self) -> int:
+        return self.offsets.itemsize * len(self.offsets) + self.lengths.itemsize * len(self.lengths)
+
+    def text_nbytes(self) -> int:
+        return 0
@@ -0,0 +1,235 @@
+from array import array
+import hashlib
+import json
+import os
+import sys
+from typing import Optional
+
+from core.field_extractor import FieldColumn
+from core.log_formats import SAMPLE_LINES
+from core.log_parser import FileTail
+from core.log_store import LogStore
+from core.source_reader import compression_of, fingerprint
+from core.template_miner import TemplateMiner
+
+
+# Bump when the layout of a cache file or the parsed representation changes
+CACHE_FORMAT = 6
+
+MAGIC = b'LVPC'
+
+# Default bound on the total size of the cache directory
+CACHE_BUDGET = 1024 * 1024 * 1024
+
+# Arrays of a single-file store, file_ids are all 0 and not written. The
+# text buffer bytes (in-memory mode) follow them. Extracted fields come
+# after the template ids, the value ids of each field in parser order
+STORE_COLUMNS = ('timestamps', 'level_codes', 'line_numbers', 'message_starts')
+TEMPLATE_COLUMNS = {False: (), True: ('template_ids',)}
+TEXT_COLUMNS = {False: ('ends',), True: ('offsets', 'lengths')}
+
+
+def default_cache_dir() -> str:
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'LogViewer', 'parse_cache')
+
+
+def ends_with_newline(file_path: str, offset: int) -> bool:
+    if not offset:
+        return True
+    with open(file_path, 'rb') as f:
+        f.seek(offset - 1)
+        return f.read(1) == b'\n'
+
+
+class ParseCache:
+    # Parsed per-file stores on disk, one file per (source path, parser,
+    # text mode): a JSON header followed by the raw column arrays. A source
+    # whose size and mtime match is loaded without parsing; one that only
+    # grew has its appended lines parsed and the entry rewritten. Anything
+    # that does not check out is a miss. Writes go through a temporary file
+    # and os.replace, so readers never see half an entry. The least recently
+    # used entries are removed once the directory is over budget
+
+    def __init__(self, directory: Optional[str] = None, budget: int = CACHE_BUDGET):
+        self.directory = directory or default_cache_dir()
+        self.budget = budget
+
+    def parser_key(self, parser) -> str:
+        # Anything that changes what the parser produces for the same bytes
+        formats = [log_format.key() for log_format in parser.formats]
+        return '|'.join((str(CACHE_FORMAT), type(parser).__name__, str(SAMPLE_LINES), *formats, sys.byteorder))
+
+    def entry_path(self, file_path: str, parser) -> str:
+        key = '|'.join((os.path.abspath(file_path), self.parser_key(parser), str(parser.lazy_text),
+                        str(parser.templates), ','.join(parser.fields), str(parser.complete_lines)))
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.bin')
+
+    def load(self, file_path: str, parser) -> Optional[LogStore]:
+        # The cached store brought up to date with the file, or None
+        entry_path = self.entry_path(file_path, parser)
+        try:
+            header, store = self.read_entry(entry_path, file_path, parser)
+        except (OSError, ValueError, KeyError, TypeError, EOFError):
+            # Missing, unreadable or written by another version
+            self.remove(entry_path)
+            return None
+
+        tail = store.tails[file_path]
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if (stat.st_dev, stat.st_ino) != (tail.device, tail.inode):
+            return None
+        if header['compressed']:
+            # Offsets count decompressed bytes, only the file on disk can be compared
+            if stat.st_size != header['source_size'] or stat.st_mtime_ns != header['mtime_ns']:
+                return None
+            os.utime(entry_path)
+            return store
+        if stat.st_size < tail.offset:
+            return None
+        if stat.st_size == tail.offset:
+            # Same size: unchanged, or rewritten in place
+            if stat.st_mtime_ns != header['mtime_ns']:
+                return None
+            os.utime(entry_path)
+            return store
+
+        # The file grew: trust the parsed part when its fingerprint still
+        # matches and parse what was appended. A last line without its
+        # newline was parsed as it was, so the rest of it cannot be added
+        if not header['line_end'] or fingerprint(file_path, tail.offset) != header['fingerprint']:
+            return None
+        appended, restarted = parser.parse_appended(file_path, tail, complete_lines=parser.complete_lines)
+        if restarted:
+            return None
+        if not len(appended) and not appended.continuations:
+            # Only part of a line was added, it waits for its newline
+            os.utime(entry_path)
+            return store
+        store.attach_continuations(appended)
+        store.extend_from(appended, 0, len(appended))
+        if parser.lazy_text:
+            store.text.record_signature(file_path)
+        self.save(file_path, store, parser)
+        return store
+
+    def read_entry(self, entry_path: str, file_path: str, parser):
+        with open(entry_path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("not a parse cache entry")
+            header_size = int.from_bytes(f.read(4), 'little')
+            header = json.loads(f.read(header_size).decode('utf-8'))
+            if header['parser'] != self.parser_key(parser) or header['path'] != os.path.abspath(file_path):
+                raise ValueError("entry for another parser or file")
+
+            store = LogStore(parser.lazy_text, parser.templates, parser.fields)
+            store.file_id(file_path)
+            for level in header['levels']:
+                store.level_code(level)
+            if parser.templates:
+                store.templates = TemplateMiner.from_templates(header['templates'], header['overflow'])
+            for name in parser.fields:
+                store.fields[name] = FieldColumn(header['fields'][name])
+            columns = [(store, name) for name in STORE_COLUMNS + TEMPLATE_COLUMNS[parser.templates]]
+            columns += [(store.fields[name], 'ids') for name in parser.fields]
+            columns += [(store.text, name) for name in TEXT_COLUMNS[parser.lazy_text]]
+            for (owner, name), count in zip(columns, header['counts']):
+                column = array(getattr(owner, name).typecode)
+                column.fromfile(f, count)
+                setattr(owner, name, column)
+            if not parser.lazy_text:
+                store.text.data = bytearray(f.read(header['text_bytes']))
+                if len(store.text.data) != header['text_bytes']:
+                    raise EOFError("truncated parse cache entry")
+
+        store.file_ids = array('I', bytes(4 * len(store.timestamps)))
+        store.tails[file_path] = FileTail(**header['tail'])
+        if parser.lazy_text:
+            store.text.record_signature(file_path)
+        return header, store
+
+    def save(self, file_path: str, store: LogStore, parser):
+        tail = store.tails.get(file_path)
+        if tail is None:
+            return
+        try:
+            stat = os.stat(file_path)
+            compressed = compression_of(file_path) is not None
+            header = {
+                'parser': self.parser_key(parser),
+                'path': os.path.abspath(file_path),
+                'compressed': compressed,
+                'source_size': stat.st_size,
+                # A file that grew while it was parsed gets no mtime, the
+                # next load then goes through the fingerprint check
+                'mtime_ns': stat.st_mtime_ns if compressed or stat.st_size == tail.offset else None,
+                'fingerprint': None if compressed else fingerprint(file_path, tail.offset),
+                'line_end': compressed or ends_with_newline(file_path, tail.offset),
+                'tail': {'device': tail.device, 'inode': tail.inode,
+                         'offset': tail.offset, 'line_count': tail.line_count, 'format': tail.format},
+                'levels': store.levels,
+            }
+            if parser.templates:
+                header['templates'] = [' '.join(tokens) for tokens in store.templates.templates]
+                header['overflow'] = store.templates.overflow
+            header['fields'] = {name: store.fields[name].values[1:] for name in parser.fields}
+            columns = [getattr(store, name) for name in STORE_COLUMNS + TEMPLATE_COLUMNS[parser.templates]]
+            columns += [store.fields[name].ids for name in parser.fields]
+            columns += [getattr(store.text, name) for name in TEXT_COLUMNS[parser.lazy_text]]
+            header['counts'] = [len(column) for column in columns]
+            header['text_bytes'] = 0 if parser.lazy_text else len(store.text.data)
+
+            os.makedirs(self.directory, exist_ok=True)
+            entry_path = self.entry_path(file_path, parser)
+            temp_path = f"{entry_path}.{os.getpid()}.tmp"
+            encoded = json.dumps(header).encode('utf-8')
+            with open(temp_path, 'wb') as f:
+                f.write(MAGIC)
+                f.write(len(encoded).to_bytes(4, 'little'))
+                f.write(encoded)
+                for column in columns:
+                    column.tofile(f)
+                if not parser.lazy_text:
+                    f.write(store.text.data)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            # The cache is an optimisation, a read-only or full disk is not an error
+            return
+        self.evict()
+
+    def evict(self):
+        # Remove least recently used entries (by mtime, bumped on every hit)
+        # until the directory is within budget
+        try:
+            stats = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                           for entry in os.scandir(self.directory) if entry.name.endswith('.bin'))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in stats)
+        for _, size, path in stats:
+            if total <= self.budget:
+                break
+            self.remove(path)
+            total -= size
+
+    def remove(self, entry_path: str):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+    def clear(self):
+        try:
+            entries = [entry.path for entry in os.scandir(self.directory)]
+        except OSError:
+            return
+        for path in entries:
+            self.remove(path)
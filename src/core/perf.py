@@ -0,0 +1,175 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+# Timings of the hot paths, per phase. Off by default: a Timer then costs
+# one flag check per operation (a file, a filter, a render), never per line.
+# The parser switches to a timed loop only when enabled
+enabled = False
+
+# When set, operations wrapped in a Profiler leave a cProfile dump of
+# their last run here
+profile_dir: Optional[str] = None
+
+_stats: Dict[str, 'PhaseStats'] = {}
+_lock = threading.Lock()
+
+
+def default_profile_dir() -> str:
+    return os.path.join(tempfile.gettempdir(), 'LogViewer', 'profiles')
+
+
+def set_enabled(on: bool):
+    global enabled
+    enabled = on
+
+
+def set_profile_dir(directory: Optional[str]):
+    global profile_dir
+    profile_dir = directory
+
+
+class PhaseStats:
+    __slots__ = ('count', 'seconds', 'items', 'nbytes')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.items = 0
+        self.nbytes = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'seconds': self.seconds,
+            'items': self.items,
+            'bytes': self.nbytes,
+            'items_per_second': self.items / self.seconds if self.seconds else 0.0,
+            'bytes_per_second': self.nbytes / self.seconds if self.seconds else 0.0,
+        }
+
+
+def add(phase: str, seconds: float, items: int = 0, nbytes: int = 0, count: int = 1):
+    with _lock:
+        stats = _stats.get(phase)
+        if stats is None:
+            stats = _stats[phase] = PhaseStats()
+        stats.count += count
+        stats.seconds += seconds
+        stats.items += items
+        stats.nbytes += nbytes
+
+
+def snapshot() -> Dict[str, dict]:
+    with _lock:
+        return {phase: stats.to_dict() for phase, stats in _stats.items()}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def take() -> Dict[str, tuple]:
+    # The raw counters, cleared, so a pool worker can send them back with
+    # its result. Empty when timings are off
+    with _lock:
+        taken = {phase: (stats.count, stats.seconds, stats.items, stats.nbytes)
+                 for phase, stats in _stats.items()}
+        _stats.clear()
+    return taken
+
+
+def merge(taken: Dict[str, tuple]):
+    for phase, (count, seconds, items, nbytes) in taken.items():
+        add(phase, seconds, items, nbytes, count)
+
+
+def memory() -> Dict[str, Optional[float]]:
+    # Peak resident size of the process and, when tracemalloc is running,
+    # the peak of traced Python allocations, in bytes
+    peak_rss = None
+    try:
+        import resource
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        peak_rss *= 1 if sys.platform == 'darwin' else 1024
+    except (ImportError, OSError):
+        pass
+    traced_peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+    return {'peak_rss': peak_rss, 'traced_peak': traced_peak}
+
+
+class Timer:
+    # with Timer('filter', items=n) as timer: ... ; items and nbytes may
+    # also be set on the timer before the block ends
+
+    __slots__ = ('phase', 'items', 'nbytes', 'start')
+
+    def __init__(self, phase: str, items: int = 0, nbytes: int = 0):
+        self.phase = phase
+        self.items = items
+        self.nbytes = nbytes
+        self.start = None
+
+    def __enter__(self) -> 'Timer':
+        if enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            add(self.phase, time.perf_counter() - self.start, self.items, self.nbytes)
+        return False
+
+
+class Profiler:
+    # with Profiler('load'): ... runs cProfile over the block when a
+    # profile_dir is set, and writes <operation>.prof (for pstats or
+    # snakeviz) and <operation>.txt (top functions by cumulative time).
+    # Only the calling thread is profiled, one operation at a time
+
+    __slots__ = ('operation', 'profile')
+    TOP_FUNCTIONS = 40
+    _active = threading.Lock()
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.profile = None
+
+    def __enter__(self) -> 'Profiler':
+        if profile_dir is not None and self._active.acquire(blocking=False):
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError:
+                # Another profiler (a debugger, sys.monitoring) is active
+                self.profile = None
+                self._active.release()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profile is None:
+            return False
+        self.profile.disable()
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            path = os.path.join(profile_dir, self.operation)
+            self.profile.dump_stats(path + '.prof')
+            summary = io.StringIO()
+            pstats.Stats(self.profile, stream=summary).sort_stats('cumulative').print_stats(self.TOP_FUNCTIONS)
+            with open(path + '.txt', 'w', encoding='utf-8') as f:
+                f.write(summary.getvalue())
+        except OSError:
+            pass
+        finally:
+            self.profile = None
+            self._active.release()
+        return False
@@ -0,0 +1,162 @@
+import bz2
+from fnmatch import fnmatch
+import glob
+import gzip
+import hashlib
+import io
+import lzma
+import os
+import queue
+import re
+import threading
+from typing import List
+
+
+# Leading bytes of each supported format, and the module that reads it
+MAGIC_NUMBERS = (
+    (b'\x1f\x8b', gzip),
+    (b'BZh', bz2),
+    (b'\xfd7zXZ\x00', lzma),
+)
+
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.xz', '.lzma')
+
+
+class LzmaAlone:
+    # Opens the legacy .lzma format (lzma_alone), which has no magic number
+
+    @staticmethod
+    def open(file_path: str, mode: str = 'rb'):
+        return lzma.open(file_path, mode, format=lzma.FORMAT_ALONE)
+
+
+# Formats without a magic number, known by the extension instead
+EXTENSION_FORMATS = {'.lzma': LzmaAlone}
+
+# Files picked up from a folder. A compressed file counts when its name
+# without the extension and a rotation number matches (app.log.1.gz)
+LOG_PATTERNS = ('*.trc', '*.log', '*.txt')
+
+# Decompressed bytes per hand-off from the prefetch thread, and how many
+# chunks it may run ahead of the parser
+CHUNK_SIZE = 1024 * 1024
+PREFETCH_CHUNKS = 8
+
+# Bytes hashed at the start of a file and before a given offset, to notice
+# a file rewritten with the same or a larger size
+FINGERPRINT_BYTES = 4096
+
+
+def fingerprint(file_path: str, offset: int) -> str:
+    # Hash of the first and the last FINGERPRINT_BYTES of file[:offset]
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+        f.seek(max(0, offset - FINGERPRINT_BYTES))
+        digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+    return digest.hexdigest()
+
+
+def compression_of(file_path: str):
+    # The gzip, bz2 or lzma module for a compressed file (LzmaAlone for a
+    # .lzma file that is not xz), None for plain text
+    with open(file_path, 'rb') as f:
+        head = f.read(6)
+    for magic, module in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return module
+    return EXTENSION_FORMATS.get(os.path.splitext(file_path)[1].lower())
+
+
+def strip_compression(file_name: str) -> str:
+    # 'app.log.1.gz' -> 'app.log.1'
+    root, extension = os.path.splitext(file_name)
+    return root if extension.lower() in COMPRESSED_EXTENSIONS else file_name
+
+
+def find_log_files(folder: str) -> List[str]:
+    log_files = []
+    for pattern in LOG_PATTERNS:
+        log_files += glob.glob(os.path.join(folder, pattern))
+    for extension in COMPRESSED_EXTENSIONS:
+        for path in glob.glob(os.path.join(folder, '*' + extension)):
+            name = re.sub(r'\.\d+$', '', strip_compression(os.path.basename(path)))
+            if any(fnmatch(name, pattern) for pattern in LOG_PATTERNS):
+                log_files.append(path)
+    return log_files
+
+
+def open_source(file_path: str) -> io.BufferedReader:
+    # Binary stream of the (decompressed) file content. tell() counts
+    # decompressed bytes, fileno() is the file on disk
+    module = compression_of(file_path)
+    if module is None:
+        return open(file_path, 'rb')
+    return io.BufferedReader(PrefetchReader(module.open(file_path, 'rb')), CHUNK_SIZE)
+
+
+def read_source(file_path: str) -> bytes:
+    with open_source(file_path) as f:
+        return f.read()
+
+
+class PrefetchReader(io.RawIOBase):
+    # Runs a decompressing stream in a thread, CHUNK_SIZE bytes at a time,
+    # so decompression (which releases the GIL) overlaps with the parsing
+    # of the previous chunks. The queue bounds how far it runs ahead
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.chunks = queue.Queue(PREFETCH_CHUNKS)
+        self.pending = memoryview(b'')
+        self.position = 0
+        self.stopped = False
+        self.thread = threading.Thread(target=self._prefetch, daemon=True)
+        self.thread.start()
+
+    def _prefetch(self):
+        try:
+            while not self.stopped:
+                chunk = self.stream.read(CHUNK_SIZE)
+                self.chunks.put(chunk)
+                if not chunk:
+                    return
+        except Exception as e:
+            self.chunks.put(e)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.pending:
+            chunk = self.chunks.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                # Keep reporting the end to later reads
+                self.chunks.put(chunk)
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        self.position += size
+        return size
+
+    def tell(self) -> int:
+        return self.position
+
+    def fileno(self) -> int:
+        return self.stream.fileno()
+
+    def close(self):
+        if not self.closed:
+            self.stopped = True
+            # Unblock the thread if it waits on a full queue
+            while self.thread.is_alive():
+                try:
+                    self.chunks.get_nowait()
+                except queue.Empty:
+                    self.thread.join(0.01)
+            self.stream.close()
+        super().close()
@@ -0,0 +1,212 @@
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from operator import eq, itemgetter
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Tokens with a digit in them (ids, numbers, durations, addresses) are
+# variables before a message reaches the tree
+HAS_DIGIT = re.compile(r'\d').search
+WILDCARD = '<*>'
+
+# A message without its digits is the key of its shape. Deleting them from
+# the UTF-8 bytes is several times faster than str.translate
+DIGITS = b'0123456789'
+
+# Share of tokens a message must have in common with a template to join it
+SIMILARITY = 0.5
+
+# Leading tokens that pick the leaf of a message along with its token
+# count, and templates per leaf. A message reaching a full leaf joins its
+# most similar template, which bounds the work per message
+PREFIX_TOKENS = 2
+MAX_LEAF = 16
+
+# Templates per miner, kept below the range of the 'H' template id column
+MAX_TEMPLATES = 4096
+
+# Shapes remembered with their template, so repeated shapes skip the
+# tree. Past this many new shapes go through the tree every time
+SHAPE_LIMIT = 65536
+
+
+class TemplateMiner:
+    # Online Drain-style clustering of messages into templates. A message
+    # whose shape was seen before gets the same template straight away.
+    # Otherwise it goes to the leaf for its token count and first tokens.
+    # There it joins the first template whose fixed tokens it has, else the
+    # most similar one, whose differing tokens become wildcards; below
+    # SIMILARITY it starts a new template with its variable tokens masked.
+    # Fixed tokens never have digits, so only new templates need masking.
+    # Template ids never change once given out, only the template text gets
+    # more general. Memory grows with the number of templates and shapes,
+    # not with the number of messages
+
+    def __init__(self, max_templates: int = MAX_TEMPLATES):
+        self.max_templates = max_templates
+        self.templates: List[List[str]] = []
+        # Per template, a getter for its non-wildcard positions and their tokens
+        self.fixed: List[Tuple[Optional[itemgetter], tuple]] = []
+        self.tree: Dict[Tuple, List[int]] = {}
+        self.shapes: Dict[bytes, int] = {}
+        self.overflow: Optional[int] = None
+
+    def __getstate__(self):
+        # The shapes are a cache, stores travel back from the workers without it
+        state = self.__dict__.copy()
+        state['shapes'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.templates)
+
+    def add(self, message: str) -> int:
+        # Only the first line: continuation lines (stack traces) vary too much
+        if '\n' in message:
+            message = message[:message.index('\n')]
+        shape = message.encode('utf-8').translate(None, DIGITS)
+        template_id = self.shapes.get(shape)
+        if template_id is None:
+            template_id = self.add_tokens(message.split())
+            if len(self.shapes) < SHAPE_LIMIT:
+                self.shapes[shape] = template_id
+        return template_id
+
+    def add_tokens(self, tokens: List[str]) -> int:
+        leaf = self.tree.setdefault(self.leaf_key(tokens), [])
+        # A template that already covers the message needs no change. The
+        # one found moves to the front, the general ones end up first
+        fixed = self.fixed
+        for position, template_id in enumerate(leaf):
+            getter, values = fixed[template_id]
+            if getter is None or getter(tokens) == values:
+                if position:
+                    del leaf[position]
+                    leaf.insert(0, template_id)
+                return template_id
+
+        best, best_score = None, -1.0
+        for template_id in leaf:
+            score = self.similarity(template_id, tokens)
+            if score > best_score:
+                best, best_score = template_id, score
+
+        full = len(self.templates) >= self.max_templates - 1 or len(leaf) >= MAX_LEAF
+        if best is not None and (best_score >= SIMILARITY or full):
+            template = self.templates[best]
+            self.set_template(best, [known if known == token else WILDCARD for known, token in zip(template, tokens)])
+            return best
+        if full:
+            # Messages for a new leaf once the miner is full
+            if self.overflow is None:
+                self.overflow = len(self.templates)
+                self.set_template(self.overflow, [WILDCARD])
+            return self.overflow
+
+        leaf.append(len(self.templates))
+        self.set_template(len(self.templates), [WILDCARD if HAS_DIGIT(token) else token for token in tokens])
+        return len(self.templates) - 1
+
+    def set_template(self, template_id: int, tokens: List[str]):
+        positions = [position for position, token in enumerate(tokens) if token != WILDCARD]
+        # A single position makes itemgetter return the token, not a tuple
+        getter = itemgetter(*positions) if positions else None
+        entry = (getter, getter(tokens) if getter else ())
+        if template_id == len(self.templates):
+            self.templates.append(tokens)
+            self.fixed.append(entry)
+        else:
+            self.templates[template_id] = tokens
+            self.fixed[template_id] = entry
+
+    def leaf_key(self, tokens: List[str]) -> Tuple:
+        return (len(tokens), *[WILDCARD if HAS_DIGIT(token) else token for token in tokens[:PREFIX_TOKENS]])
+
+    def similarity(self, template_id: int, tokens: List[str]) -> float:
+        # Share of the tokens that are equal or under a wildcard
+        if not tokens:
+            return 1.0
+        getter, values = self.fixed[template_id]
+        if getter is None:
+            return 1.0
+        found = getter(tokens)
+        if not isinstance(values, tuple):
+            found, values = (found,), (values,)
+        return (len(tokens) - len(values) + sum(map(eq, found, values))) / len(tokens)
+
+    def template(self, template_id: int) -> str:
+        return ' '.join(self.templates[template_id])
+
+    def variables(self, template_id: int, message: str) -> List[str]:
+        # The parts of a message that the wildcards of its template stand for
+        first_line = message.partition('\n')[0]
+        tokens = first_line.split()
+        template = self.templates[template_id]
+        if len(tokens) != len(template):
+            return [first_line]
+        return [token for known, token in zip(template, tokens) if known == WILDCARD]
+
+    def merge_from(self, other: 'TemplateMiner') -> List[int]:
+        # Ids here for the templates of another miner, in its id order
+        return [self.add(' '.join(tokens)) for tokens in other.templates]
+
+    @classmethod
+    def from_templates(cls, templates: Iterable[str], overflow: Optional[int] = None) -> 'TemplateMiner':
+        # A miner with these templates under their list positions as ids
+        miner = cls()
+        miner.overflow = overflow
+        for template in templates:
+            tokens = template.split()
+            if len(miner.templates) != overflow:
+                miner.tree.setdefault(miner.leaf_key(tokens), []).append(len(miner.templates))
+            miner.set_template(len(miner.templates), tokens)
+        return miner
+
+
+@dataclass
+class TemplateGroup:
+    # Entries of one template within a selection, rows of the grouped view.
+    # first and last are entry ids, the store is time sorted
+    template_id: int
+    template: str
+    count: int
+    first: int
+    last: int
+    levels: Counter = field(default_factory=Counter)
+
+
+def group_templates(store, indices: Optional[Sequence[int]] = None) -> List[TemplateGroup]:
+    # Templates of the entries (all, or the given ids in order), most
+    # frequent first. Each pass runs over C iterators only
+    template_ids = store.template_ids
+    if indices is None:
+        indices = range(len(template_ids))
+        ids = template_ids
+    else:
+        ids = array('H', map(template_ids.__getitem__, indices))
+    codes = map(store.level_codes.__getitem__, indices)
+
+    by_level = Counter(zip(ids, codes))
+    last = dict(zip(ids, indices))
+    first = dict(zip(reversed(ids), reversed(indices)))
+
+    groups = {}
+    miner, levels = store.templates, store.levels
+    for (template_id, code), count in by_level.items():
+        group = groups.get(template_id)
+        if group is None:
+            group = groups[template_id] = TemplateGroup(template_id, miner.template(template_id), 0,
+                                                        first[template_id], last[template_id])
+        group.count += count
+        group.levels[levels[code]] += count
+    return sorted(groups.values(), key=lambda group: (-group.count, group.first))
+
+
+def template_entries(store, template_id: int, indices: Optional[Iterable[int]] = None) -> array:
+    # Entry ids of one template, among the given ids when there are some
+    template_ids = store.template_ids
+    if indices is None:
+        indices = range(len(template_ids))
+    return array('I', (index for index in indices if template_ids[index] == template_id))
@@ -0,0 +1,256 @@
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import accumulate
+import re
+import sys
+import threading
+from typing import List, Optional
+
+from core.log_store import LogStore
+
+
+BLOCK_SIZE = 65536
+
+# Bytes of lowercased blocks kept in low memory mode (lazy_text), least
+# recently used blocks beyond it are dropped and built again when needed
+TEXT_SEARCH_BUDGET = 64 * 1024 * 1024
+
+REGEX_CACHE_SIZE = 64
+
+# Up to this many literal alternatives, one str.find pass each beats a
+# single pass of the regex engine over the alternation
+LITERAL_PASSES = 8
+
+# Characters that make an alternative more than a plain literal
+REGEX_SPECIAL = set('.^$*+?{}[]\\|()')
+
+
+@lru_cache(maxsize=REGEX_CACHE_SIZE)
+def compile_pattern(pattern: str, lowercase_text: bool = True) -> re.Pattern:
+    # Raises re.error for invalid patterns. The indexed text is lowercased,
+    # so case folding is only switched on (and the engine's literal
+    # optimisations lost) when the pattern itself has uppercase letters
+    flags = re.MULTILINE
+    if not lowercase_text or any(char.isupper() for char in re.sub(r'\\.', '', pattern)):
+        flags |= re.IGNORECASE
+    return re.compile(pattern, flags)
+
+
+def literal_alternatives(pattern: str) -> Optional[List[str]]:
+    # "timeout|refused|reset" -> ['timeout', 'refused', 'reset'], None for real regexes
+    parts = pattern.split('|')
+    if all(part and not REGEX_SPECIAL.intersection(part) for part in parts):
+        return parts
+    return None
+
+
+class TextSearch:
+    # Case-insensitive substring search over the messages of a LogStore.
+    # Messages are lowercased once and joined with '\n' into one string per
+    # block of entries, so a full scan is a run of str.find calls. When a
+    # query contains the previous one, only the previous matches are checked.
+    # An optional TrigramIndex supplies candidates for the other queries.
+    # With a budget only that many bytes of blocks are kept (None for a
+    # dropped block), the others are built again from the store when a
+    # search reaches them: slower searches for a bounded copy
+
+    def __init__(self, store: LogStore, budget: Optional[int] = None):
+        self.store = store
+        self.blocks = []
+        self.budget = budget
+        # Sizes of the blocks kept under the budget, least recently used first
+        self.held = OrderedDict()
+        self.held_bytes = 0
+        self.size = 0
+        self.last_query = None
+        self.last_matches = None
+        self.last_size = 0
+        self.lock = threading.Lock()
+        self.trigrams = None
+
+    def update(self):
+        # Index entries appended since the last call. Safe to run from a
+        # background thread, the lock is held for one block at a time
+        while self._extend():
+            pass
+
+    def _extend(self) -> bool:
+        with self.lock:
+            total = len(self.store)
+            if self.size == total:
+                return False
+            # The last block may be partial, it is rebuilt with the new entries
+            if self.blocks and self.size % BLOCK_SIZE:
+                self.blocks.pop()
+                self._release(len(self.blocks))
+                self.size -= self.size % BLOCK_SIZE
+            last = min(total, self.size + BLOCK_SIZE)
+            self.blocks.append(self._build_block(self.size, last))
+            self._hold(len(self.blocks) - 1)
+            self.size = last
+            return True
+
+    def block(self, block_no: int):
+        # (haystack, starts) of a block, built again if it was dropped. None
+        # past the indexed entries. Safe to call from a background thread
+        with self.lock:
+            if block_no >= len(self.blocks):
+                return None
+            block = self.blocks[block_no]
+            if block is None:
+                first = block_no * BLOCK_SIZE
+                block = self.blocks[block_no] = self._build_block(first, min(self.size, first + BLOCK_SIZE))
+                self._hold(block_no)
+            elif self.budget is not None:
+                self.held.move_to_end(block_no)
+            return block
+
+    def _hold(self, block_no: int):
+        # Counts a built block against the budget, dropping the least
+        # recently used others to stay within it. Called with the lock held
+        if self.budget is None:
+            return
+        size = block_nbytes(self.blocks[block_no])
+        self.held[block_no] = size
+        self.held_bytes += size
+        while self.held_bytes > self.budget and len(self.held) > 1:
+            dropped, size = self.held.popitem(last=False)
+            self.blocks[dropped] = None
+            self.held_bytes -= size
+
+    def _release(self, block_no: int):
+        size = self.held.pop(block_no, None)
+        if size is not None:
+            self.held_bytes -= size
+
+    def rollback(self, first: int):
+        # Drops the blocks from the one holding entry first on, for when the
+        # entries there changed; update() builds them again
+        with self.lock:
+            keep = min(first // BLOCK_SIZE, len(self.blocks))
+            for block_no in range(keep, len(self.blocks)):
+                self._release(block_no)
+            del self.blocks[keep:]
+            self.size = min(self.size, keep * BLOCK_SIZE)
+            self.last_query = self.last_matches = None
+            self.last_size = 0
+
+    def _build_block(self, first: int, last: int):
+        message = self.store.message
+        messages = [message(index).lower() for index in range(first, last)]
+        # starts[k] is where message k begins, message k ends one before starts[k + 1]
+        starts = array('Q', accumulate((len(text) + 1 for text in messages), initial=0))
+        return '\n'.join(messages), starts
+
+    def find(self, query: str) -> array:
+        # query must already be lowercased, returns matching entry ids in order
+        self.update()
+        if '\n' in query:
+            return array('I')
+
+        if query == self.last_query:
+            # Same query after entries were appended (follow mode)
+            matches = self.last_matches
+            if self.last_size < self.size:
+                matches.extend(self._scan(query, self.last_size))
+        elif self.last_query is not None and self.last_query in query:
+            matches = self._refine(self.last_matches, query)
+            if self.last_size < self.size:
+                matches.extend(self._scan(query, self.last_size))
+        else:
+            indexed = self.trigrams.search(query) if self.trigrams else None
+            if indexed is None:
+                matches = self._scan(query, 0)
+            else:
+                # Verify the trigram candidates, scan what the index does not cover yet
+                candidates, covered = indexed
+                matches = self._refine(candidates, query)
+                matches.extend(self._scan(query, covered))
+
+        self.last_query, self.last_matches, self.last_size = query, matches, self.size
+        return matches
+
+    def find_regex(self, pattern: str) -> array:
+        # Entries whose message matches the pattern, case-insensitive
+        self.update()
+        literals = literal_alternatives(pattern)
+        if literals is not None and len(literals) <= LITERAL_PASSES:
+            # str.find per literal is much faster than the regex alternation
+            if len(literals) == 1:
+                return self._scan(literals[0].lower(), 0)
+            found = set()
+            for literal in literals:
+                found.update(self._scan(literal.lower(), 0))
+            return array('I', sorted(found))
+
+        search = compile_pattern(pattern).search
+        matches = array('I')
+        for block_no in range(len(self.blocks)):
+            haystack, starts = self.block(block_no)
+            base = block_no * BLOCK_SIZE
+            size = len(haystack)
+            match = search(haystack)
+            while match is not None:
+                local = bisect_right(starts, match.start()) - 1
+                end = starts[local + 1] - 1
+                # A match running into the next message (through '\n') only
+                # counts if the message matches on its own
+                if match.end() <= end or search(haystack, starts[local], end):
+                    matches.append(base + local)
+                if end >= size:
+                    break
+                match = search(haystack, end + 1)
+        return matches
+
+    def refine(self, candidates, query: str) -> array:
+        # The candidate ids whose message contains query (lowercased)
+        self.update()
+        if '\n' in query:
+            return array('I')
+        return self._refine(candidates, query)
+
+    def refine_regex(self, candidates, pattern: str) -> array:
+        # The candidate ids whose message matches the pattern
+        self.update()
+        search = compile_pattern(pattern).search
+        matches = array('I')
+        block = self.block
+        for index in candidates:
+            haystack, starts = block(index // BLOCK_SIZE)
+            local = index % BLOCK_SIZE
+            if search(haystack, starts[local], starts[local + 1] - 1):
+                matches.append(index)
+        return matches
+
+    def _scan(self, query: str, first: int) -> array:
+        matches = array('I')
+        for block_no in range(first // BLOCK_SIZE, len(self.blocks)):
+            haystack, starts = self.block(block_no)
+            base = block_no * BLOCK_SIZE
+            pos = haystack.find(query, starts[max(0, first - base)])
+            while pos != -1:
+                local = bisect_right(starts, pos) - 1
+                matches.append(base + local)
+                # Continue from the next message, one match per entry
+                pos = haystack.find(query, starts[local + 1])
+        return matches
+
+    def _refine(self, candidates: array, query: str) -> array:
+        matches = array('I')
+        block = self.block
+        for index in candidates:
+            haystack, starts = block(index // BLOCK_SIZE)
+            local = index % BLOCK_SIZE
+            if haystack.find(query, starts[local], starts[local + 1] - 1) != -1:
+                matches.append(index)
+        return matches
+
+    def nbytes(self) -> int:
+        return sum(block_nbytes(block) for block in self.blocks if block is not None)
+
+
+def block_nbytes(block) -> int:
+    haystack, starts = block
+    return sys.getsizeof(haystack) + starts.itemsize * len(starts)
@@ -0,0 +1,71 @@
+from array import array
+from bisect import bisect_left
+from functools import partial
+from operator import sub
+from typing import Dict, List, Tuple
+
+from core.log_index import LogIndex
+
+
+# Equal-width bins between the first and the last timestamp. Counts are
+# kept per bin edge, so a histogram of up to this many buckets never
+# looks at the entries
+TIMELINE_BINS = 4096
+
+
+class Timeline:
+    # Entry counts per level over time for a time-sorted LogStore. For each
+    # level, cumulative[code][i] is the number of its entries before bin
+    # edge i, taken from the LogIndex postings. A bucket made of whole bins
+    # is one subtraction per level; buckets narrower than a bin (deep zoom)
+    # are counted exactly by bisecting the timestamps and the postings
+
+    def __init__(self, index: LogIndex):
+        self.index = index
+        self.store = index.store
+        self.size = 0
+        self.start = 0
+        self.end = 0
+        self.width = 1
+        self.cumulative: Dict[int, array] = {}
+        self.build()
+
+    def build(self):
+        timestamps = self.store.timestamps
+        self.size = len(timestamps)
+        self.cumulative = {}
+        if not self.size:
+            return
+        self.start = timestamps[0]
+        self.end = timestamps[-1] + 1
+        self.width = -(-(self.end - self.start) // TIMELINE_BINS)
+        positions = [bisect_left(timestamps, self.start + i * self.width) for i in range(TIMELINE_BINS + 1)]
+        for code, posting in self.index.postings.items():
+            if posting:
+                self.cumulative[code] = array('I', map(partial(bisect_left, posting), positions))
+
+    def counts(self, start: int, end: int, buckets: int) -> Tuple[List[int], Dict[str, List[int]]]:
+        # Bucket edges (µs) and entry counts per bucket for each level over
+        # [start, end). When a bucket spans at least one bin the edges are
+        # moved to the nearest bin edge, by less than one bin
+        if not self.size or end <= start or buckets <= 0:
+            return [start, end], {}
+        edges = [start + (end - start) * i // buckets for i in range(buckets + 1)]
+        levels = self.store.levels
+
+        if (end - start) // buckets >= self.width:
+            bins = [min(TIMELINE_BINS, max(0, round((edge - self.start) / self.width))) for edge in edges]
+            edges = [self.start + b * self.width for b in bins]
+            result = {}
+            for code, cumulative in self.cumulative.items():
+                before = [cumulative[b] for b in bins]
+                result[levels[code]] = list(map(sub, before[1:], before[:-1]))
+            return edges, result
+
+        timestamps = self.store.timestamps
+        positions = [bisect_left(timestamps, edge) for edge in edges]
+        result = {}
+        for code in self.cumulative:
+            before = list(map(partial(bisect_left, self.index.postings[code]), positions))
+            result[levels[code]] = list(map(sub, before[1:], before[:-1]))
+        return edges, result
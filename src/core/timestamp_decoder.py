@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+import re
+
+
+FIXED_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Positions of the separators in "YYYY-MM-DD HH:MM:SS.ffffff"
+FIXED_SEPARATORS = ((4, '-'), (7, '-'), (10, ' '), (13, ':'), (16, ':'), (19, '.'))
+
+ISO_FORMAT = 'iso8601'
+
+# The fraction and a colon-less offset, rewritten for Pythons whose
+# fromisoformat() only takes three or six digits and '+HH:MM'
+FRACTION = re.compile(r'[.,](\d+)')
+COMPACT_OFFSET = re.compile(r'([+-]\d\d)(\d\d)$')
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class TimestampDecoder:
+
+    def __init__(self, time_format: str = FIXED_FORMAT):
+        self.time_format = time_format
+        self.fast_path = time_format == FIXED_FORMAT
+
+
+    def decode(self, text: str) -> datetime:
+        # Fast path: fixed-width ASCII timestamps go through the C parser.
+        # Anything else (short fractions, unpadded fields, non-ASCII digits)
+        # is left to strptime so the accepted and rejected inputs stay the same
+        if self.fast_path and self.is_fixed_width(text):
+            try:
+                return datetime.fromisoformat(text)
+            except ValueError:
+                pass
+        return datetime.strptime(text, self.time_format)
+
+
+    def is_fixed_width(self, text: str) -> bool:
+        if len(text) != 26 or not text.isascii():
+            return False
+        for pos, char in FIXED_SEPARATORS:
+            if text[pos] != char:
+                return False
+        return text[20:].isdigit()
+
+
+class IsoTimestampDecoder:
+    # ISO 8601 timestamps: 'T' or space separated, any fraction, 'Z' or an
+    # offset. Times with an offset are converted to UTC and kept naive like
+    # all other timestamps. Numbers are taken as Unix time in seconds,
+    # milliseconds or microseconds (JSON logs)
+
+    time_format = ISO_FORMAT
+
+    def decode(self, text: str) -> datetime:
+        try:
+            timestamp = datetime.fromisoformat(text)
+        except ValueError:
+            timestamp = datetime.fromisoformat(self.normalize(text))
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp
+
+
+    def normalize(self, text: str) -> str:
+        text = text.strip()
+        if text.endswith(('Z', 'z')):
+            text = text[:-1] + '+00:00'
+        text = FRACTION.sub(lambda match: '.' + match.group(1)[:6].ljust(6, '0'), text, count=1)
+        return COMPACT_OFFSET.sub(r'\1:\2', text)
+
+
+    def decode_number(self, value: float) -> datetime:
+        if abs(value) >= 1e14:
+            value /= 1e6
+        elif abs(value) >= 1e11:
+            value /= 1e3
+        return EPOCH + timedelta(seconds=value)
@@ -0,0 +1,117 @@
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+import threading
+from typing import Optional, Tuple
+
+from core.log_index import trim_postings
+from core.text_search import BLOCK_SIZE, TextSearch
+
+
+# Default memory budget for the posting lists
+TRIGRAM_BUDGET = 256 * 1024 * 1024
+
+# Rough per-trigram cost of the dict slot, key string and array header
+KEY_OVERHEAD = 200
+
+
+class TrigramIndex:
+    # Maps every 3-character substring of the lowercased messages to the
+    # sorted ids of the entries containing it. Built block by block, usually
+    # in a background thread; entries past `covered` are not indexed yet (or
+    # never, once the memory budget is reached) and are scanned instead
+
+    def __init__(self, text_search: TextSearch, budget: int = TRIGRAM_BUDGET):
+        self.text_search = text_search
+        self.budget = budget
+        self.postings = defaultdict(lambda: array('I'))
+        self.covered = 0
+        self.posting_count = 0
+        self.complete = False
+        self.full = False
+        self.cancelled = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.build, daemon=True)
+        self.thread.start()
+
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def rollback(self, first: int):
+        # Forget the entries from first on, the way LogIndex.rollback() does,
+        # for when the entries there changed. A running build is stopped
+        # first; the next one indexes them again
+        self.cancel()
+        if self.thread is not None:
+            self.thread.join()
+        if first < self.covered:
+            self.posting_count -= trim_postings(self.postings, first)
+            self.covered = first
+            self.full = False
+        self.complete = False
+        self.cancelled = False
+
+    def build(self):
+        # Indexes the entries from covered on, so calling it again after
+        # entries were appended picks up only the new ones
+        self.complete = False
+        text_search = self.text_search
+        text_search.update()
+        postings = self.postings
+        block_no = self.covered // BLOCK_SIZE
+        while not self.cancelled:
+            block = text_search.block(block_no)
+            if block is None:
+                break
+            haystack, starts = block
+
+            base = block_no * BLOCK_SIZE
+            # Messages may span several lines (continuation lines), so they
+            # are cut out by their offsets rather than split on '\n'
+            for local in range(max(0, self.covered - base), len(starts) - 1):
+                if self.cancelled:
+                    return
+                message = haystack[starts[local]:starts[local + 1] - 1]
+                trigrams = {message[i:i + 3] for i in range(len(message) - 2)}
+                for trigram in trigrams:
+                    postings[trigram].append(base + local)
+                self.posting_count += len(trigrams)
+                self.covered = base + local + 1
+                if self.nbytes() > self.budget:
+                    # Stop here and leave the rest of the entries to the scan
+                    self.full = True
+                    return
+            if len(starts) - 1 < BLOCK_SIZE:
+                break
+            block_no += 1
+        self.complete = not self.cancelled
+
+    def search(self, query: str) -> Optional[Tuple[array, int]]:
+        # Candidate ids among the covered entries, to be verified exactly,
+        # and the first entry id that is not covered. Short queries are
+        # left to the scan
+        if len(query) < 3 or not self.covered:
+            return None
+        covered = self.covered
+        trigrams = {query[i:i + 3] for i in range(len(query) - 2)}
+        postings = []
+        for trigram in trigrams:
+            posting = self.postings.get(trigram)
+            if posting is None:
+                return array('I'), covered
+            postings.append(posting[:bisect_left(posting, covered)])
+
+        # Intersect from the smallest lists; the exact check removes the rest
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:3]:
+            candidates.intersection_update(posting)
+        return array('I', sorted(candidates)), covered
+
+    def nbytes(self) -> int:
+        return self.posting_count * 4 + len(self.postings) * KEY_OVERHEAD
@@ -1,17 +1,38 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, PhotoImage
-import glob
+from tkinter import ttk, filedialog, messagebox, simpledialog, PhotoImage
 from datetime import datetime
-from collections import Counter
 import os
+import re
+import time
 
+from core import perf
+from core.exporter import ExportJob
+from core.field_extractor import DEFAULT_FIELDS
 from core.log_filter import LogFilter
+from core.log_loader import LoadJob
 from core.log_parser import LogParser
+from core.log_query import QueryError, check_field_names, format_query, parse_query, quote
+from core.parse_cache import ParseCache
+from core.source_reader import find_log_files
+from core.log_store import LogStore
+from core.text_search import compile_pattern
 from gui.styles import *
 from gui.context_menu import ContextMenuManager
+from gui.field_panel import FieldPanel
 from gui.icon_loader import IconLoader
+from gui.log_view import LogView
+from gui.perf_panel import PerfPanel
+from gui.template_view import TemplateView
+from gui.timeline_view import TimelineView
 
 class AppWindow:
+    # Delay between the last keystroke in the search box and the filter run
+    SEARCH_DELAY_MS = 200
+    # How often followed files are checked for appended lines
+    FOLLOW_INTERVAL_MS = 1000
+    # How often a running load reports progress and shows what it has so far
+    LOAD_POLL_MS = 250
+
     def __init__(self, root):
         self.root = root
         self.root.title("Log Viewer")
@@ -22,16 +43,35 @@ class AppWindow:
         except:
             self.root.attributes('-zoomed', True)
 
-        self.parser = LogParser()
+        # Loaded files may be followed, a line still being written waits for its newline
+        self.parser = LogParser(workers=0, complete_lines=True)
+        self.parse_cache = ParseCache()
         self.filter = LogFilter()     
         
         # Data storage
         self.original_entries = []
         self.filtered_entries = []
         self.file_paths = []
+        self.lazy_text_var = tk.BooleanVar(value=False)
+        self.text_index_var = tk.BooleanVar(value=True)
+        self.follow_var = tk.BooleanVar(value=False)
+        self.cache_var = tk.BooleanVar(value=True)
+        # Off by default like the fields below: mining templates makes every
+        # load about 60% slower
+        self.templates_var = tk.BooleanVar(value=False)
+        # key=value fields extracted and indexed while parsing, none unless
+        # chosen: extraction and the facets cost time on every load
+        self.field_names = []
+        self.filter_args = None
         self.color_scheme = COLORS
         self.text_colors = TEXT_COLORS
         self.log_text = None  
+        self.search_job = None
+        self.follow_job = None
+        self.load_job = None
+        self.export_job = None
+        self.perf_panel = None
+        self.template_view = None
         
         # Setup
         self.create_widgets()
@@ -56,9 +96,17 @@ class AppWindow:
         file_menu.add_command(label="Open Files", command=self.open_files)
         file_menu.add_command(label="Open Folder", command=self.open_folder)
         file_menu.add_command(label="Close Files", command=self.close_files)
+        file_menu.add_checkbutton(label="Low Memory Mode", variable=self.lazy_text_var)
+        file_menu.add_checkbutton(label="Index Text for Search", variable=self.text_index_var)
+        file_menu.add_checkbutton(label="Follow New Lines", variable=self.follow_var, command=self.toggle_follow)
+        file_menu.add_checkbutton(label="Cache Parsed Files", variable=self.cache_var)
+        file_menu.add_command(label="Clear Parse Cache", command=self.clear_parse_cache)
+        file_menu.add_checkbutton(label="Group Message Templates", variable=self.templates_var)
+        file_menu.add_command(label="Extracted Fields...", command=self.edit_fields)
         file_menu.add_separator()
         file_menu.add_command(label="Export TXT", command=self.export_txt)
         file_menu.add_command(label="Export JSON", command=self.export_json)
+        file_menu.add_command(label="Export NDJSON", command=self.export_ndjson)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         
@@ -96,6 +144,12 @@ class AppWindow:
         edit_menu.add_command(label="Copy", command=self.copy_selected, accelerator="Ctrl+C")
         edit_menu.add_command(label="Select All", command=self.context_menu.select_all, accelerator="Ctrl+A")
         #edit_menu.add_command(label="Find...", command=self.open_search_dialog, accelerator="Ctrl+F")        
+        
+        # Tools menu
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+        tools_menu.add_command(label="Message Templates...", command=self.show_templates)
+        tools_menu.add_command(label="Performance...", command=self.show_performance)
     
     def setup_styles(self):
         style = ttk.Style()
@@ -162,44 +216,46 @@ class AppWindow:
         self.search_var = tk.StringVar()
         self.search_entry = ttk.Entry(toolbar_frame, textvariable=self.search_var, width=25)
         self.search_entry.pack(side=tk.LEFT, padx=2)
-        self.search_var.trace('w', lambda *args: self.apply_filters())
+        self.search_var.trace('w', lambda *args: self.schedule_search())
+        
+        self.regex_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(toolbar_frame, text="Regex", variable=self.regex_var, command=self.apply_filters).pack(side=tk.LEFT, padx=2)
         
         ttk.Separator(toolbar_frame, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=10, fill=tk.Y)
         
         # Clear All Filters button
         ttk.Button(toolbar_frame, text="Clear All", command=self.clear_all_filters, width=8).pack(side=tk.RIGHT, padx=2)
         
+        # Query bar, the fields above are shortcuts for its common terms
+        query_frame = ttk.Frame(main_frame, relief=tk.RAISED, borderwidth=1)
+        query_frame.pack(side=tk.TOP, fill=tk.X, padx=1, pady=(0, 3))
+        
+        ttk.Label(query_frame, text="Query:").pack(side=tk.LEFT, padx=(5, 2))
+        self.query_var = tk.StringVar()
+        self.query_entry = ttk.Entry(query_frame, textvariable=self.query_var)
+        self.query_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2, pady=2)
+        self.query_entry.bind('<Return>', lambda event: self.apply_filters())
+        ttk.Button(query_frame, text="Apply", width=6, command=lambda: self.apply_filters()).pack(side=tk.LEFT, padx=(2, 5))
+        ttk.Label(query_frame, text='e.g. level:error,warning file:db*.log -msg:"heartbeat" (timeout OR re:"retr(y|ied)")',
+                  foreground='gray').pack(side=tk.LEFT, padx=(0, 5))
+        
         # MAIN DISPLAY AREA
         display_frame = ttk.Frame(main_frame)
         display_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=1, pady=(0, 1))
         
+        # Entries over time, dragging across it sets the time filter
+        self.timeline_view = TimelineView(display_frame, on_select=self.select_time_range)
+        
+        # Top values of the extracted fields, on the right of the entries
+        self.field_panel = FieldPanel(display_frame, on_select=self.filter_field_value)
+        
         # Text widget with scrollbars - using pack with expand
         text_frame = ttk.Frame(display_frame)
         text_frame.pack(fill=tk.BOTH, expand=True)
         
-        # Horizontal scrollbar at the bottom
-        x_scrollbar = ttk.Scrollbar(text_frame, orient=tk.HORIZONTAL)
-        x_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
-        
-        # Vertical scrollbar on the right
-        y_scrollbar = ttk.Scrollbar(text_frame)
-        y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # Main text widget in the center
-        self.log_text = tk.Text(
-            text_frame, 
-            wrap=tk.NONE,
-            yscrollcommand=y_scrollbar.set,
-            xscrollcommand=x_scrollbar.set,
-            font=('Courier', 10), 
-            bg='white',
-            relief=tk.FLAT
-        )
-        self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        # Configure scrollbars
-        y_scrollbar.config(command=self.log_text.yview)
-        x_scrollbar.config(command=self.log_text.xview)
+        # Virtualized view, only the visible rows live in the Text widget
+        self.log_view = LogView(text_frame)
+        self.log_text = self.log_view.text
         
         # STATUS BAR
         status_frame = ttk.Frame(main_frame, relief=tk.SUNKEN, borderwidth=1)
@@ -225,12 +281,18 @@ class AppWindow:
             padding=(5, 2)
         )
         status_right_label.pack(side=tk.RIGHT, fill=tk.X, expand=True)
+        
+        # Shown while files load or entries are exported in the background
+        self.cancel_button = ttk.Button(status_frame, text="Cancel", width=8, command=self.cancel_background)
+        self.progress_bar = ttk.Progressbar(status_frame, orient=tk.HORIZONTAL, length=200, maximum=1.0)
+        self.root.bind("<Escape>", lambda e: self.cancel_background())
     
     def open_files(self):
         files = filedialog.askopenfilenames(
             title="Select log files",
             filetypes=[
                 ("Log files", "*.log; *.trc; *.txt"),                
+                ("Compressed logs", "*.gz; *.bz2; *.xz; *.lzma"),
                 ("All files", "*.*")
             ]
         )
@@ -245,18 +307,21 @@ class AppWindow:
         folder = filedialog.askdirectory(title="Select folder with log files")
         if folder:
             self.close_files()
-            log_files = glob.glob(os.path.join(folder, "*.trc")) + \
-                        glob.glob(os.path.join(folder, "*.log")) + \
-                        glob.glob(os.path.join(folder, "*.txt"))
+            # Plain logs plus their gzip, bz2 and xz compressed rotations
+            log_files = find_log_files(folder)
             for file in log_files:
                 if file not in self.file_paths:
                     self.file_paths.append(file)
             self.load_logs()
     
     def close_files(self):
+        self.cancel_load()
+        self.stop_follow()
         self.file_paths.clear()
-        self.filtered_entries.clear()
-        self.original_entries.clear()
+        self.filtered_entries = []
+        self.original_entries = []
+        self.filter_args = None
+        self.filter.reset()
         self.clear_log_display()
         self.update_statistics()
         self.status_left.set("Cleared all files")
@@ -266,14 +331,202 @@ class AppWindow:
             messagebox.showwarning("No Files", "Please select log files first")
             return
         
-        self.original_entries = self.parser.parse_files(self.file_paths)
-        self.apply_filters()
-        self.status_left.set(f"Loaded {len(self.original_entries)} log entries from {len(self.file_paths)} file(s)")
+        # Parsing runs in a background thread, poll_load() picks up progress,
+        # partial results and the end of the load
+        self.cancel_load()
+        self.stop_follow()
+        # Low memory mode reads message text back from the files when needed
+        self.parser.lazy_text = self.lazy_text_var.get()
+        # Unchanged files come from the cache, grown ones only parse their new lines
+        self.parser.cache = self.parse_cache if self.cache_var.get() else None
+        # Messages are clustered into templates while they are parsed
+        self.parser.templates = self.templates_var.get()
+        # and their key=value fields extracted for the field panel and queries
+        self.parser.fields = self.field_names
+        self.load_job = LoadJob(self.parser, self.file_paths)
+        self.load_job.start()
+        self.cancel_button.pack(side=tk.RIGHT, padx=2)
+        self.progress_bar.pack(side=tk.RIGHT, padx=5)
+        self.root.after(self.LOAD_POLL_MS, self.poll_load)
+    
+    def poll_load(self):
+        job = self.load_job
+        if job is None:
+            return
+        
+        if not job.done:
+            snapshot = job.snapshot
+            if snapshot is not None and snapshot is not self.original_entries:
+                self.show_entries(snapshot)
+            
+            fraction = job.bytes_read / job.total_bytes if job.total_bytes else 0.0
+            self.progress_bar['value'] = min(1.0, fraction)
+            self.status_left.set(
+                f"Loading {job.files_done}/{len(job.file_paths)} files, "
+                f"{job.bytes_read / (1024 * 1024):.0f} of {job.total_bytes / (1024 * 1024):.0f} MB, "
+                f"{job.lines_per_second:,.0f} lines/sec"
+            )
+            self.root.after(self.LOAD_POLL_MS, self.poll_load)
+            return
+        
+        self.load_job = None
+        self.hide_progress()
+        if job.error is not None:
+            self.original_entries = []
+            self.filtered_entries = []
+            self.filter.reset()
+            self.clear_log_display()
+            self.update_statistics()
+            messagebox.showerror("Load Error", str(job.error))
+            return
+        
+        self.show_entries(job.result)
+        self.update_fields()
+        elapsed = max(time.monotonic() - job.started, 1e-6)
+        self.status_left.set(f"Loaded {len(self.original_entries)} log entries from {len(self.file_paths)} file(s) in {elapsed:.1f}s")
+        
+        if self.text_index_var.get():
+            self.filter.start_text_index(self.original_entries)
+            self.root.after(500, self.report_text_index)
+        
+        if self.follow_var.get():
+            self.schedule_follow()
+    
+    def clear_parse_cache(self):
+        self.parse_cache.clear()
+        self.status_left.set("Parse cache cleared")
+    
+    def show_entries(self, store):
+        # Display a (partial or final) load result through the current filters.
+        # Entry ids change with every merge, highlights are for one store
+        if store is not self.original_entries:
+            self.log_view.highlights.clear()
+        self.original_entries = store
+        self.filter.prepare(store)
+        if self.filter_args is None:
+            self.apply_filters()
+        else:
+            self.show_filtered(keep_position=True)
+    
+    def cancel_background(self):
+        # The export works on entries of the current load, stop it first
+        self.cancel_export()
+        self.cancel_load()
+    
+    def cancel_load(self):
+        job = self.load_job
+        if job is None:
+            return
+        # Drop everything loaded so far, the worker stops on its own
+        job.cancel()
+        self.load_job = None
+        self.hide_progress()
+        self.original_entries = []
+        self.filtered_entries = []
+        self.filter.reset()
+        self.clear_log_display()
+        self.update_statistics()
+        self.status_left.set("Loading cancelled")
+    
+    def hide_progress(self):
+        if self.load_job is None and self.export_job is None:
+            self.progress_bar.pack_forget()
+            self.cancel_button.pack_forget()
+    
+    def toggle_follow(self):
+        # A running load starts following when it finishes
+        if self.follow_var.get() and self.original_entries and self.load_job is None:
+            self.schedule_follow()
+        else:
+            self.stop_follow()
+    
+    def schedule_follow(self):
+        self.stop_follow()
+        self.follow_job = self.root.after(self.FOLLOW_INTERVAL_MS, self.follow_files)
+    
+    def stop_follow(self):
+        if self.follow_job:
+            self.root.after_cancel(self.follow_job)
+            self.follow_job = None
+    
+    def follow_files(self):
+        # Parse only what was appended to each file since the last poll and
+        # add it to the loaded entries, indexes are extended in place
+        self.follow_job = None
+        store = self.original_entries
+        if not self.follow_var.get() or not store:
+            return
+        
+        if self.export_job is not None:
+            # New lines can reorder the store, they wait for the export
+            self.schedule_follow()
+            return
+        
+        added = []
+        restarted = False
+        for file_path in self.file_paths:
+            tail = store.tails.get(file_path)
+            if tail is None:
+                continue
+            try:
+                appended, rotated = self.parser.parse_appended(file_path, tail)
+            except Exception:
+                # Missing for a moment while it is rotated, retried on the next poll
+                continue
+            restarted = restarted or rotated
+            if len(appended) or appended.continuations:
+                added.append(appended)
+        
+        if restarted and store.lazy_text:
+            # Entries of a replaced or truncated file can no longer be read
+            # back from it, so load everything again
+            self.load_logs()
+            return
+        
+        if added:
+            first = store.insert_sorted(LogStore.merge(added))
+            self.filter.entries_added(store, first)
+            self.log_view.highlights.drop_from(first)
+            self.update_fields()
+            if self.filter_args is not None:
+                self.show_filtered(keep_position=True)
+            self.status_left.set(f"Following {len(self.file_paths)} file(s): {sum(map(len, added))} new entries, {len(store)} total")
+        
+        self.schedule_follow()
+    
+    def report_text_index(self):
+        text_search = self.filter.text_search
+        if text_search is None or text_search.trigrams is None or text_search.store is not self.original_entries:
+            return
+        
+        trigrams = text_search.trigrams
+        if trigrams.is_running():
+            self.root.after(500, self.report_text_index)
+            return
+        
+        size_mb = trigrams.nbytes() / (1024 * 1024)
+        if trigrams.complete:
+            self.status_left.set(f"Search index ready ({size_mb:.1f} MB)")
+        elif not trigrams.cancelled:
+            self.status_left.set(f"Search index limited to {trigrams.covered} of {len(self.original_entries)} entries ({size_mb:.1f} MB)")
+    
+    def schedule_search(self):
+        # Debounce typing, only the last keystroke in a burst runs the filter
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(self.SEARCH_DELAY_MS, self.apply_filters)
     
     def apply_filters(self):
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+            self.search_job = None
+        
         if not self.original_entries:
             return
         
+        if not self.check_sources():
+            return
+        
         # Get filter criteria from UI
         selected_levels = [
             level for level, var in self.level_vars.items() 
@@ -299,20 +552,93 @@ class AppWindow:
                 return
             
         # Get search text            
-        search_text = self.search_var.get().lower().strip()
-        
-        # Use filter service
-        self.filtered_entries = self.filter.apply(
-            self.original_entries,
-            levels=selected_levels,
-            time_from=time_from,
-            time_to=time_to,
-            search_text=search_text
-        )
+        regex = self.regex_var.get()
+        if regex:
+            # Patterns keep their case (\D is not \d), invalid ones are
+            # reported in the status bar and the current view is kept
+            search_text = self.search_var.get().strip()
+            try:
+                compile_pattern(search_text)
+            except re.error as e:
+                self.status_left.set(f"Invalid pattern: {e}")
+                return
+        else:
+            search_text = self.search_var.get().lower().strip()
+        
+        # The toolbar fields and the query bar make one query, compiled once.
+        # Invalid queries are reported like invalid patterns
+        query_text = format_query(selected_levels, time_from, time_to, search_text, regex)
+        if self.query_var.get().strip():
+            query_text = f"{query_text} ({self.query_var.get().strip()})".strip()
+        try:
+            query = parse_query(query_text, getattr(self.original_entries, 'fields', ()))
+        except QueryError as e:
+            self.status_left.set(f"Invalid query: {e}")
+            return
         
-        # Update display
-        self.display_logs()
-        self.update_statistics()
+        # Kept so followed lines go through the filters that were applied,
+        # not through half-edited toolbar fields
+        self.filter_args = dict(
+            query=query,
+            levels=selected_levels
+        )
+        self.show_filtered()
+    
+    def show_filtered(self, keep_position=False):
+        with perf.Profiler('filter'):
+            # Use filter service
+            self.filtered_entries = self.filter.apply_query(self.original_entries, self.filter_args['query'])
+            
+            # Update display
+            self.display_logs(keep_position)
+            self.update_statistics()
+            self.update_timeline()
+            self.update_templates()
+    
+    def show_templates(self):
+        if self.template_view is not None and self.template_view.exists():
+            self.template_view.window.lift()
+        else:
+            self.template_view = TemplateView(self.root, on_select=self.show_entry)
+        self.update_templates()
+    
+    def update_templates(self):
+        # Only while the window is open, grouping looks at every shown entry
+        if self.template_view is not None and self.template_view.exists():
+            self.template_view.set_entries(self.filtered_entries)
+    
+    def edit_fields(self):
+        names = simpledialog.askstring(
+            "Extracted Fields",
+            "key=value fields to extract and index, separated by commas.\nApplies to the next load:",
+            initialvalue=', '.join(self.field_names or DEFAULT_FIELDS), parent=self.root)
+        if names is None:
+            return
+        try:
+            self.field_names = list(check_field_names(name.strip() for name in names.split(',') if name.strip()))
+        except QueryError as e:
+            messagebox.showerror("Extracted Fields", str(e))
+    
+    def update_fields(self):
+        if isinstance(self.original_entries, LogStore):
+            self.field_panel.set_index(self.filter.get_index(self.original_entries))
+    
+    def filter_field_value(self, name, value):
+        # Adds the value as a term of the query bar
+        term = f"{name}:{quote(value)}"
+        query = self.query_var.get().strip()
+        self.query_var.set(f"{query} {term}" if query else term)
+        self.apply_filters()
+    
+    def show_entry(self, entry_id):
+        if not self.log_view.scroll_to_entry(entry_id):
+            self.status_left.set("That entry is not in the current view")
+    
+    def show_performance(self):
+        if self.perf_panel is not None and self.perf_panel.exists():
+            self.perf_panel.window.lift()
+            return
+        self.perf_panel = PerfPanel(self.root)
 
     def clear_all_filters(self):
         # Clear level checkboxes
@@ -323,29 +649,47 @@ class AppWindow:
         self.time_from_var.set('')
         self.time_to_var.set('')
 
-        # Clear search
+        # Clear search and query
         self.search_var.set('')
+        self.query_var.set('')
+        self.timeline_view.reset_zoom()
 
         # Re-apply filters
         self.apply_filters()    
     
-    def display_logs(self):
-        self.clear_log_display()
-        
+    def display_logs(self, keep_position=False):
         if not self.filtered_entries:
-            self.log_text.insert(tk.END, "No log entries match the current filters.")
+            self.log_view.show_message("No log entries match the current filters.")
             return
         
-        for entry in self.filtered_entries:
-            time_str = entry.timestamp.strftime(TIME_FORMAT_DISPLAY)[:-3]
-            line = f"[{time_str}] {entry.message} {entry.file_name}:{entry.line_number}\n"
-            self.log_text.insert(tk.END, line, f'tag_{entry.level}')
-        
-        # Scroll to top
-        self.log_text.see(1.0)
+        self.log_view.set_entries(self.filtered_entries, keep_position)
+    
+    def check_sources(self):
+        changed = self.original_entries.changed_files() if self.original_entries else []
+        if changed:
+            messagebox.showwarning("Files Changed", "These files changed since they were loaded, please reload them:\n" + "\n".join(changed))
+            return False
+        return True
     
     def clear_log_display(self):
-        self.log_text.delete(1.0, tk.END)
+        self.log_view.clear()
+        self.timeline_view.clear()
+        self.field_panel.clear()
+        if self.template_view is not None:
+            self.template_view.clear()
+    
+    def update_timeline(self):
+        # Counts come from the whole store, only the selected levels are stacked
+        if not isinstance(self.original_entries, LogStore):
+            self.timeline_view.clear()
+            return
+        timeline = self.filter.get_timeline(self.original_entries)
+        self.timeline_view.set_timeline(timeline, set(self.filter_args['levels']))
+    
+    def select_time_range(self, time_from, time_to):
+        self.time_from_var.set(time_from.strftime(TIME_FORMAT_INPUT))
+        self.time_to_var.set(time_to.strftime(TIME_FORMAT_INPUT))
+        self.apply_filters()
     
     def update_statistics(self):
         if not self.original_entries:
@@ -355,9 +699,7 @@ class AppWindow:
         filtered = len(self.filtered_entries)
         
         # Count by level
-        level_counts = Counter()
-        for entry in self.filtered_entries:
-            level_counts[entry.level] += 1
+        level_counts = self.filtered_entries.count_levels()
         
         stats_text = f"Showing: {filtered} | "
         for level in ['error', 'warning', 'info', 'debug', 'trace']:
@@ -367,45 +709,74 @@ class AppWindow:
         self.status_right.set(stats_text.rstrip(' | '))
     
     def export_txt(self):
+        self.export_entries('txt', [("Text files", "*.txt"), ("Gzip compressed", "*.txt.gz"), ("All files", "*.*")])
+    
+    def export_json(self):
+        self.export_entries('json', [("JSON files", "*.json"), ("Gzip compressed", "*.json.gz")])
+    
+    def export_ndjson(self):
+        self.export_entries('ndjson', [("NDJSON files", "*.ndjson"), ("Gzip compressed", "*.ndjson.gz")])
+    
+    def export_entries(self, export_format, filetypes):
         if not self.filtered_entries:
             messagebox.showwarning("No Data", "No log entries to export")
             return
         
-        file_path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if not self.check_sources():
+            return
+        
+        if self.export_job is not None:
+            messagebox.showwarning("Export Running", "Wait for the current export to finish or cancel it")
+            return
+        
+        file_path = filedialog.asksaveasfilename(defaultextension=f".{export_format}", filetypes=filetypes)
         
         if file_path:
-            try:
-                from core.exporter import export_to_txt
-                if export_to_txt(self.filtered_entries, file_path):
-                    messagebox.showinfo("Export Complete", f"Successfully exported {len(self.filtered_entries)} entries to:\n{file_path}")
-                    self.status_left.set(f"Exported to {os.path.basename(file_path)}")
-            
-            except Exception as e:
-                messagebox.showerror("Export Error", f"Error exporting file: {str(e)}")
+            # Written in a background thread, a .gz name is compressed on the fly
+            self.export_job = ExportJob(self.filtered_entries, file_path, export_format,
+                                        compress=file_path.lower().endswith('.gz'))
+            self.export_job.start()
+            self.cancel_button.pack(side=tk.RIGHT, padx=2)
+            self.progress_bar.pack(side=tk.RIGHT, padx=5)
+            self.root.after(self.LOAD_POLL_MS, self.poll_export)
     
-    def export_json(self):
-        if not self.filtered_entries:
-            messagebox.showwarning("No Data", "No log entries to export")
+    def poll_export(self):
+        job = self.export_job
+        if job is None:
             return
         
-        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
+        if not job.done:
+            self.progress_bar['value'] = job.written / job.total if job.total else 0.0
+            self.status_left.set(f"Exporting {job.written} of {job.total} entries")
+            self.root.after(self.LOAD_POLL_MS, self.poll_export)
+            return
         
-        if file_path:
-            try:
-                from core.exporter import export_to_json
-                if export_to_json(self.filtered_entries, file_path):
-                    messagebox.showinfo("Export Complete", f"Successfully exported {len(self.filtered_entries)} entries to JSON")
-                    self.status_left.set(f"Exported JSON to {os.path.basename(file_path)}")
-            
-            except Exception as e:
-                messagebox.showerror("Export Error", f"Error exporting JSON: {str(e)}")
+        self.export_job = None
+        self.hide_progress()
+        if job.error is not None:
+            messagebox.showerror("Export Error", f"Error exporting file: {str(job.error)}")
+        elif job.cancelled:
+            self.status_left.set("Export cancelled")
+        else:
+            messagebox.showinfo("Export Complete", f"Successfully exported {job.total} entries to:\n{job.file_path}")
+            self.status_left.set(f"Exported to {os.path.basename(job.file_path)}")
+    
+    def cancel_export(self):
+        if self.export_job is not None:
+            self.export_job.cancel()
     
     def copy_selected(self, event=None):
         try:
+            # Select All covers every filtered entry, not only the rendered rows
+            if self.log_view.all_selected:
+                selected_text = self.log_view.get_all_text()
             # Check if there's a selection in the text widget
-            if self.log_text.tag_ranges("sel"):
+            elif self.log_text.tag_ranges("sel"):
                 selected_text = self.log_text.get(tk.SEL_FIRST, tk.SEL_LAST)
-                
+            else:
+                selected_text = None
+            
+            if selected_text:
                 # Clear clipboard and append text
                 self.root.clipboard_clear()
                 self.root.clipboard_append(selected_text)
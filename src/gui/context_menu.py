@@ -12,7 +12,6 @@ class ContextMenuManager:
             ('Pink', 'lightpink'),
             ('Orange', 'orange')
         ]
-        self.current_highlight_tag = None
         self.setup_all()
     
     def setup_all(self):
@@ -117,9 +116,7 @@ class ContextMenuManager:
         return "break"  # Prevent default behavior
     
     def select_all(self):
-        self.log_text.tag_add('sel', '1.0', 'end')
-        self.log_text.mark_set(tk.INSERT, '1.0')
-        self.log_text.see('1.0')
+        self.app.log_view.select_all()
     
     def focus_search_filter(self, event=None):
         if hasattr(self.app, 'search_entry'):
@@ -128,28 +125,24 @@ class ContextMenuManager:
         return "break"
 
     def highlight_selected(self, color="yellow"):
-        if not self.log_text.tag_ranges("sel"):
+        # Highlights are stored by entry id and character range, the view
+        # tags whichever of them are on screen
+        spans = self.app.log_view.selection_spans()
+        if not spans:
             self.app.status_left.set("No text selected to highlight")
             return
         
-        # Create a unique tag name for this highlight
-        import time
-        tag_name = f"highlight_{int(time.time() * 1000)}"
-        
-        # Configure the tag with the chosen color
-        self.log_text.tag_config(tag_name, background=color)
-        
-        # Apply the tag to the selected text
-        self.log_text.tag_add(tag_name, tk.SEL_FIRST, tk.SEL_LAST)
-        
-        # Store this as the current highlight tag
-        self.current_highlight_tag = tag_name
+        highlights = self.app.log_view.highlights
+        for entry_id, start, end in spans:
+            highlights.add(entry_id, start, end, color)
         
         # Update status
         self.app.status_left.set(f"Text highlighted with {color}")
         
         # Auto-clear selection after highlighting
+        self.app.log_view.all_selected = False
         self.log_text.tag_remove("sel", "1.0", "end")
+        self.app.log_view.render()
     
     def highlight_with_custom_color(self):
         # Simple color dialog
@@ -164,81 +157,42 @@ class ContextMenuManager:
             self.highlight_selected(color[1])
     
     def clear_highlight(self):
-        if not self.log_text.tag_ranges("sel"):
+        spans = self.app.log_view.selection_spans()
+        if not spans:
             self.app.status_left.set("Select text to clear highlight")
             return
         
-        # Find all highlight tags in the selection
-        selection_start = self.log_text.index(tk.SEL_FIRST)
-        selection_end = self.log_text.index(tk.SEL_LAST)
-        
-        # Get all tags in the selection
-        tags_in_selection = set()
-        pos = selection_start
+        highlights = self.app.log_view.highlights
+        cleared = sum(highlights.remove(entry_id, start, end) for entry_id, start, end in spans)
+        self.app.log_view.render()
         
-        while self.log_text.compare(pos, "<", selection_end):
-            tags = self.log_text.tag_names(pos)
-            # Filter for highlight tags
-            highlight_tags = [t for t in tags if t.startswith("highlight_")]
-            tags_in_selection.update(highlight_tags)
-            pos = self.log_text.index(f"{pos}+1c")
-        
-        # Remove all highlight tags from the selection
-        for tag in tags_in_selection:
-            self.log_text.tag_remove(tag, selection_start, selection_end)
-        
-        if tags_in_selection:
-            self.app.status_left.set(f"Cleared {len(tags_in_selection)} highlight(s)")
+        if cleared:
+            self.app.status_left.set(f"Cleared {cleared} highlight(s)")
         else:
             self.app.status_left.set("No highlights in selection")
     
     def clear_all_highlights(self):
-        # Find all highlight tags
-        all_tags = self.log_text.tag_names()
-        highlight_tags = [t for t in all_tags if t.startswith("highlight_")]
-        
-        # Remove each highlight tag
-        for tag in highlight_tags:
-            self.log_text.tag_remove(tag, "1.0", "end")
+        cleared = self.app.log_view.highlights.clear()
+        self.app.log_view.render()
         
-        self.app.status_left.set(f"Cleared all highlights ({len(highlight_tags)} removed)")
+        self.app.status_left.set(f"Cleared all highlights ({cleared} removed)")
     
     def get_all_highlights(self):
-        highlights = []
-        all_tags = self.log_text.tag_names()
-        highlight_tags = [t for t in all_tags if t.startswith("highlight_")]
-        
-        for tag in highlight_tags:
-            # Get tag configuration
-            bg_color = self.log_text.tag_cget(tag, "background")
-            
-            # Find all ranges with this tag
-            ranges = []
-            start_idx = "1.0"
-            
-            while True:
-                # Find next occurrence of this tag
-                start_pos = self.log_text.tag_nextrange(tag, start_idx)
-                if not start_pos:
-                    break
-                
-                # Get the text at this range
-                text = self.log_text.get(start_pos[0], start_pos[1])
-                ranges.append({
-                    'start': start_pos[0],
-                    'end': start_pos[1],
-                    'text': text[:50] + "..." if len(text) > 50 else text
-                })
-                
-                # Move to next position
-                start_idx = start_pos[1]
-            
-            if ranges:
-                highlights.append({
-                    'tag': tag,
-                    'color': bg_color,
-                    'ranges': ranges,
-                    'count': len(ranges)
-                })
-        
-        return highlights        
\ No newline at end of file
+        # Highlights grouped by color, with the highlighted text of each range
+        log_view = self.app.log_view
+        store = self.app.original_entries
+        by_color = {}
+        for entry_id, (start, end, color) in log_view.highlights.items():
+            ranges = by_color.setdefault(color, [])
+            text = ''
+            if entry_id < len(store):
+                text = log_view.format_entry(store[entry_id])[start:end]
+            ranges.append({
+                'entry_id': entry_id,
+                'start': start,
+                'end': end,
+                'text': text[:50] + "..." if len(text) > 50 else text
+            })
+        
+        return [{'color': color, 'ranges': ranges, 'count': len(ranges)}
+                for color, ranges in by_color.items()]
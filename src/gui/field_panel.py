@@ -0,0 +1,54 @@
+import tkinter as tk
+from tkinter import ttk
+
+from core import perf
+
+
+class FieldPanel:
+    # Side panel with the most frequent values of the file name and of each
+    # extracted field, read from the facets of the LogIndex so it costs a
+    # hash index walk rather than a scan. Counts are over all loaded
+    # entries; double-clicking a value filters on it
+
+    TOP_VALUES = 10
+
+    def __init__(self, parent, on_select):
+        self.on_select = on_select
+        # Tree item -> (query field, value)
+        self.items = {}
+
+        self.frame = ttk.Frame(parent, width=260)
+        self.frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(3, 0))
+        self.frame.pack_propagate(False)
+        ttk.Label(self.frame, text="Top values (double-click to filter)", anchor=tk.W).pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
+
+        self.tree = ttk.Treeview(self.frame, columns=('count',))
+        self.tree.heading('#0', text='Field / Value')
+        self.tree.column('#0', width=170)
+        self.tree.heading('count', text='Count')
+        self.tree.column('count', width=70, anchor=tk.E)
+        self.tree.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.tree.bind('<Double-1>', self.on_double_click)
+
+    def clear(self):
+        self.items.clear()
+        self.tree.delete(*self.tree.get_children())
+
+    def set_index(self, index):
+        # index is the LogIndex of the loaded store
+        opened = {self.tree.item(item, 'text') for item in self.tree.get_children() if self.tree.item(item, 'open')}
+        self.clear()
+        with perf.Timer('field values', items=len(index.store)):
+            facets = [('file', index.top_files(self.TOP_VALUES))]
+            facets += [(name, index.top_values(name, self.TOP_VALUES)) for name in index.store.fields]
+        for name, values in facets:
+            parent = self.tree.insert('', tk.END, text=name, values=(len(values) or '',),
+                                      open=not opened or name in opened)
+            for value, count in values:
+                item = self.tree.insert(parent, tk.END, text=value, values=(count,))
+                self.items[item] = (name, value)
+
+    def on_double_click(self, event):
+        selected = self.items.get(self.tree.identify_row(event.y))
+        if selected is not None:
+            self.on_select(*selected)
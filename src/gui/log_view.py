@@ -0,0 +1,200 @@
+from bisect import bisect_left
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk
+
+from core import perf
+from core.highlight_map import HighlightMap
+from gui.styles import TIME_FORMAT_DISPLAY
+
+
+class LogView:
+    # Virtualized log display: the Text widget only ever holds the rows in
+    # the viewport (plus a small margin), the vertical scrollbar is mapped to
+    # the row index in the entry sequence instead of the Text content.
+    # Highlights live in a HighlightMap by entry id and are tagged on the
+    # rendered rows only
+
+    MARGIN = 5
+    WHEEL_ROWS = 3
+
+    def __init__(self, parent):
+        self.entries = []
+        self.first = 0
+        self.all_selected = False
+        self.highlights = HighlightMap()
+        self.highlight_tags = set()
+
+        # Horizontal scrollbar at the bottom
+        self.x_scrollbar = ttk.Scrollbar(parent, orient=tk.HORIZONTAL)
+        self.x_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+
+        # Vertical scrollbar on the right, driven by the row index
+        self.y_scrollbar = ttk.Scrollbar(parent, command=self.yview)
+        self.y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Main text widget in the center
+        self.text = tk.Text(
+            parent,
+            wrap=tk.NONE,
+            xscrollcommand=self.x_scrollbar.set,
+            font=('Courier', 10),
+            bg='white',
+            relief=tk.FLAT
+        )
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.x_scrollbar.config(command=self.text.xview)
+
+        self.line_height = tkfont.Font(font=self.text['font']).metrics('linespace')
+        self.setup_bindings()
+
+    def setup_bindings(self):
+        self.text.bind("<Configure>", lambda e: self.render())
+        self.text.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.text.bind("<Button-4>", lambda e: self.scroll(-self.WHEEL_ROWS))
+        self.text.bind("<Button-5>", lambda e: self.scroll(self.WHEEL_ROWS))
+        self.text.bind("<Prior>", lambda e: self.scroll(-self.page_rows()))
+        self.text.bind("<Next>", lambda e: self.scroll(self.page_rows()))
+        self.text.bind("<Control-Home>", lambda e: self.scroll_to(0))
+        self.text.bind("<Control-End>", lambda e: self.scroll_to(len(self.entries)))
+        self.text.bind("<Button-1>", lambda e: self.clear_all_selected(), add='+')
+
+    def set_entries(self, entries, keep_position=False):
+        # keep_position is for entries added to the current view: the first
+        # row stays, or the view sticks to the end if it was showing it
+        at_end = keep_position and self.first >= self.max_first()
+        self.entries = entries
+        if not keep_position:
+            self.first = 0
+            self.all_selected = False
+        elif at_end:
+            self.first = self.max_first()
+        self.render()
+
+    def show_message(self, message):
+        self.set_entries([])
+        self.text.insert(tk.END, message)
+
+    def clear(self):
+        self.highlights.clear()
+        self.set_entries([])
+
+    def page_rows(self) -> int:
+        return max(1, self.text.winfo_height() // self.line_height)
+
+    def max_first(self) -> int:
+        return max(0, len(self.entries) - self.page_rows())
+
+    def render(self):
+        self.text.delete(1.0, tk.END)
+        total = len(self.entries)
+        if not total:
+            self.y_scrollbar.set(0, 1)
+            return
+
+        rows = self.page_rows()
+        self.first = min(self.first, self.max_first())
+        last = min(total, self.first + rows + self.MARGIN)
+        with perf.Timer('render', items=last - self.first):
+            for index in range(self.first, last):
+                entry = self.entries[index]
+                self.text.insert(tk.END, self.format_entry(entry), f'tag_{entry.level}')
+            self.render_highlights(last)
+
+        if self.all_selected:
+            self.text.tag_add('sel', '1.0', 'end')
+        self.text.yview_moveto(0)
+        self.y_scrollbar.set(self.first / total, min(1.0, (self.first + rows) / total))
+
+    def render_highlights(self, last: int):
+        if not self.highlights:
+            return
+        for line, index in enumerate(range(self.first, last), 1):
+            for start, end, color in self.highlights.get(self.entry_id(index)):
+                self.text.tag_add(self.highlight_tag(color), f"{line}.{start}", f"{line}.{end}")
+
+    def highlight_tag(self, color: str) -> str:
+        # One tag per color, configured once
+        tag = f"highlight_{color}"
+        if tag not in self.highlight_tags:
+            self.text.tag_config(tag, background=color)
+            self.text.tag_raise('sel')
+            self.highlight_tags.add(tag)
+        return tag
+
+    def entry_id(self, row: int) -> int:
+        # Store index of a row; plain lists have no store behind them
+        indices = getattr(self.entries, 'indices', None)
+        return indices[row] if indices is not None else row
+
+    def selection_spans(self):
+        # (entry id, start, end) of the selected characters of each row
+        if not self.text.tag_ranges('sel'):
+            return []
+        first_line, first_col = map(int, self.text.index(tk.SEL_FIRST).split('.'))
+        last_line, last_col = map(int, self.text.index(tk.SEL_LAST).split('.'))
+        spans = []
+        for line in range(first_line, last_line + 1):
+            row = self.first + line - 1
+            if row >= len(self.entries):
+                break
+            start = first_col if line == first_line else 0
+            end = last_col if line == last_line else int(self.text.index(f"{line}.end").split('.')[1])
+            if end > start:
+                spans.append((self.entry_id(row), start, end))
+        return spans
+
+    def format_entry(self, entry) -> str:
+        # One row per entry: continuation lines are counted, not shown
+        time_str = entry.timestamp.strftime(TIME_FORMAT_DISPLAY)[:-3]
+        message = entry.message
+        if '\n' in message:
+            more = message.count('\n')
+            first_line = message.partition('\n')[0].rstrip()
+            message = f"{first_line} (+{more} lines)"
+        return f"[{time_str}] {message} {entry.file_name}:{entry.line_number}\n"
+
+    def yview(self, *args):
+        if args[0] == tk.MOVETO:
+            self.scroll_to(int(float(args[1]) * len(self.entries)))
+        elif args[0] == tk.SCROLL:
+            count = int(args[1])
+            self.scroll(count * self.page_rows() if args[2] == tk.PAGES else count)
+
+    def scroll(self, rows: int):
+        self.scroll_to(self.first + rows)
+        return "break"
+
+    def scroll_to(self, first: int):
+        first = max(0, min(first, self.max_first()))
+        if first != self.first:
+            self.first = first
+            self.render()
+        return "break"
+
+    def scroll_to_entry(self, entry_id: int) -> bool:
+        # Brings the row of a store entry to the top, False when it is not shown
+        indices = getattr(self.entries, 'indices', None)
+        if indices is None:
+            return False
+        row = bisect_left(indices, entry_id)
+        if row == len(indices) or indices[row] != entry_id:
+            return False
+        self.scroll_to(row)
+        return True
+
+    def on_mouse_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small deltas
+        notches = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll(-notches * self.WHEEL_ROWS)
+
+    def select_all(self):
+        self.all_selected = True
+        self.text.tag_add('sel', '1.0', 'end')
+        self.text.mark_set(tk.INSERT, '1.0')
+
+    def clear_all_selected(self):
+        self.all_selected = False
+
+    def get_all_text(self) -> str:
+        return ''.join(self.format_entry(entry) for entry in self.entries)
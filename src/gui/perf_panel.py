@@ -0,0 +1,101 @@
+import tkinter as tk
+import tracemalloc
+from tkinter import ttk
+
+from core import perf
+
+
+class PerfPanel:
+    # Window with the timings of core.perf per phase and the peak memory,
+    # refreshed while it is open. The switches here are the only place
+    # timings, profiling and allocation tracing are turned on
+
+    REFRESH_MS = 1000
+    COLUMNS = (
+        ('count', 'Calls', 60),
+        ('seconds', 'Time (ms)', 90),
+        ('items', 'Items', 90),
+        ('items_per_second', 'Items/s', 100),
+        ('bytes_per_second', 'MB/s', 70),
+    )
+
+    def __init__(self, root):
+        self.window = tk.Toplevel(root)
+        self.window.title("Performance")
+        self.window.geometry("620x360")
+
+        self.timings_var = tk.BooleanVar(value=perf.enabled)
+        self.profile_var = tk.BooleanVar(value=perf.profile_dir is not None)
+        self.trace_var = tk.BooleanVar(value=tracemalloc.is_tracing())
+
+        switches = ttk.Frame(self.window)
+        switches.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+        ttk.Checkbutton(switches, text="Record Timings", variable=self.timings_var,
+                        command=self.toggle_timings).pack(side=tk.LEFT, padx=2)
+        ttk.Checkbutton(switches, text="Profile Operations", variable=self.profile_var,
+                        command=self.toggle_profile).pack(side=tk.LEFT, padx=2)
+        ttk.Checkbutton(switches, text="Trace Allocations", variable=self.trace_var,
+                        command=self.toggle_trace).pack(side=tk.LEFT, padx=2)
+        ttk.Button(switches, text="Reset", width=8, command=self.reset).pack(side=tk.RIGHT, padx=2)
+
+        self.tree = ttk.Treeview(self.window, columns=[name for name, _, _ in self.COLUMNS])
+        self.tree.heading('#0', text='Phase')
+        self.tree.column('#0', width=150)
+        for name, title, width in self.COLUMNS:
+            self.tree.heading(name, text=title)
+            self.tree.column(name, width=width, anchor=tk.E)
+        self.tree.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=5)
+
+        self.memory_var = tk.StringVar()
+        self.profile_path_var = tk.StringVar()
+        ttk.Label(self.window, textvariable=self.memory_var, anchor=tk.W).pack(side=tk.TOP, fill=tk.X, padx=5)
+        ttk.Label(self.window, textvariable=self.profile_path_var, anchor=tk.W).pack(side=tk.TOP, fill=tk.X, padx=5, pady=(0, 5))
+
+        self.refresh()
+
+    def exists(self) -> bool:
+        return bool(self.window.winfo_exists())
+
+    def toggle_timings(self):
+        perf.set_enabled(self.timings_var.get())
+
+    def toggle_profile(self):
+        perf.set_profile_dir(perf.default_profile_dir() if self.profile_var.get() else None)
+
+    def toggle_trace(self):
+        # Slows every allocation down, for finding where the memory goes
+        if self.trace_var.get():
+            tracemalloc.start()
+        else:
+            tracemalloc.stop()
+
+    def reset(self):
+        perf.reset()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.refresh(schedule=False)
+
+    def refresh(self, schedule=True):
+        if not self.exists():
+            return
+        self.tree.delete(*self.tree.get_children())
+        for phase, stats in sorted(perf.snapshot().items()):
+            self.tree.insert('', tk.END, text=phase, values=(
+                stats['count'],
+                f"{stats['seconds'] * 1000:.1f}",
+                stats['items'],
+                f"{stats['items_per_second']:,.0f}",
+                f"{stats['bytes_per_second'] / 1e6:.1f}" if stats['bytes'] else '',
+            ))
+
+        memory = perf.memory()
+        text = []
+        if memory['peak_rss'] is not None:
+            text.append(f"Peak RSS: {memory['peak_rss'] / 1e6:.1f} MB")
+        if memory['traced_peak'] is not None:
+            text.append(f"Traced peak: {memory['traced_peak'] / 1e6:.1f} MB")
+        self.memory_var.set(" | ".join(text) or "Memory figures not available")
+        self.profile_path_var.set(f"Profiles of the last load, filter and export: {perf.profile_dir}"
+                                  if perf.profile_dir else "")
+        if schedule:
+            self.window.after(self.REFRESH_MS, self.refresh)
@@ -0,0 +1,114 @@
+import tkinter as tk
+from tkinter import ttk
+
+from core import perf
+from core.log_store import from_micros
+from core.template_miner import group_templates, template_entries
+from gui.styles import TIME_FORMAT_DISPLAY
+
+
+class TemplateView:
+    # Window grouping the shown entries by message template, with their
+    # count, first and last time and count per level. Opening a template
+    # lists its entries with the values of its wildcards, double-clicking
+    # an entry shows it in the log view
+
+    EXPAND_LIMIT = 500
+    COLUMNS = (
+        ('count', 'Count', 70),
+        ('first', 'First / Time', 170),
+        ('last', 'Last', 170),
+        ('levels', 'Levels', 200),
+        ('values', 'Values', 220),
+    )
+
+    def __init__(self, root, on_select):
+        self.on_select = on_select
+        self.store = None
+        self.indices = None
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Message Templates")
+        self.window.geometry("1100x500")
+
+        self.summary_var = tk.StringVar()
+        ttk.Label(self.window, textvariable=self.summary_var, anchor=tk.W).pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+
+        frame = ttk.Frame(self.window)
+        frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
+        self.tree = ttk.Treeview(frame, columns=[name for name, _, _ in self.COLUMNS])
+        self.tree.heading('#0', text='Template')
+        self.tree.column('#0', width=420)
+        for name, title, width in self.COLUMNS:
+            self.tree.heading(name, text=title)
+            self.tree.column(name, width=width, anchor=tk.E if name == 'count' else tk.W)
+        scrollbar = ttk.Scrollbar(frame, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind('<<TreeviewOpen>>', self.on_open)
+        self.tree.bind('<Double-1>', self.on_double_click)
+
+    def exists(self) -> bool:
+        return bool(self.window.winfo_exists())
+
+    def clear(self):
+        if self.exists():
+            self.store = self.indices = None
+            self.tree.delete(*self.tree.get_children())
+            self.summary_var.set("No entries")
+
+    def set_entries(self, entries):
+        # entries is the filtered LogSelection, or a store
+        if not entries:
+            self.clear()
+            return
+        if not self.exists():
+            return
+        self.tree.delete(*self.tree.get_children())
+        self.store = getattr(entries, 'store', entries)
+        self.indices = getattr(entries, 'indices', None)
+        if getattr(self.store, 'templates', None) is None:
+            self.summary_var.set("Templates are mined while loading: turn on File > Group Message Templates and reload")
+            return
+
+        with perf.Timer('template groups', items=len(entries)):
+            groups = group_templates(self.store, self.indices)
+        self.summary_var.set(f"{len(groups)} templates in {len(entries)} entries")
+        timestamps = self.store.timestamps
+        for group in groups:
+            levels = ', '.join(f"{level}: {count}" for level, count in group.levels.most_common())
+            item = self.tree.insert('', tk.END, iid=f"t{group.template_id}", text=group.template, values=(
+                group.count, self.format_time(timestamps[group.first]),
+                self.format_time(timestamps[group.last]), levels, ''))
+            # Placeholder so the template can be opened, replaced on open
+            self.tree.insert(item, tk.END, text='...')
+
+    def on_open(self, event=None):
+        item = self.tree.focus()
+        if not item.startswith('t'):
+            return
+        children = self.tree.get_children(item)
+        if len(children) != 1 or self.tree.item(children[0], 'text') != '...':
+            return
+        self.tree.delete(*children)
+
+        template_id = int(item[1:])
+        store, miner = self.store, self.store.templates
+        entry_ids = template_entries(store, template_id, self.indices)
+        for entry_id in entry_ids[:self.EXPAND_LIMIT]:
+            message = store.message(entry_id)
+            self.tree.insert(item, tk.END, iid=f"e{entry_id}", text=message.partition('\n')[0], values=(
+                '', self.format_time(store.timestamps[entry_id]), '',
+                store.levels[store.level_codes[entry_id]], ', '.join(miner.variables(template_id, message))))
+        if len(entry_ids) > self.EXPAND_LIMIT:
+            self.tree.insert(item, tk.END, text=f"{len(entry_ids) - self.EXPAND_LIMIT} more entries, narrow the filters to see them")
+
+    def on_double_click(self, event):
+        item = self.tree.identify_row(event.y)
+        if item.startswith('e'):
+            self.on_select(int(item[1:]))
+
+    def format_time(self, micros: int) -> str:
+        return from_micros(micros).strftime(TIME_FORMAT_DISPLAY)[:-3]
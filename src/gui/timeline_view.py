@@ -0,0 +1,153 @@
+import tkinter as tk
+from datetime import timedelta
+
+from core.log_store import KNOWN_LEVELS, from_micros
+from gui.styles import TEXT_COLORS, TIME_FORMAT_INPUT
+
+
+class TimelineView:
+    # Histogram of entry counts over time, stacked by level. Counts come
+    # from a core Timeline, so a redraw costs the same for any number of
+    # entries. Dragging selects a time range (passed to on_select and zoomed
+    # into), the wheel zooms around the pointer, a double click shows all
+
+    HEIGHT = 90
+    BAR_PIXELS = 4
+    AXIS_HEIGHT = 14
+    ZOOM_FACTOR = 2
+    # Smallest range the view zooms into, in µs
+    MIN_SPAN = 1000
+
+    def __init__(self, parent, on_select=None):
+        self.on_select = on_select
+        self.timeline = None
+        self.levels = None
+        self.view = None
+        self.drag_start = None
+
+        self.canvas = tk.Canvas(parent, height=self.HEIGHT, bg='white', highlightthickness=0)
+        self.canvas.pack(side=tk.TOP, fill=tk.X)
+        self.setup_bindings()
+
+    def setup_bindings(self):
+        self.canvas.bind("<Configure>", lambda e: self.draw())
+        self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_release)
+        self.canvas.bind("<Double-Button-1>", lambda e: self.reset_zoom())
+        self.canvas.bind("<MouseWheel>", lambda e: self.zoom(e.x, e.delta > 0))
+        self.canvas.bind("<Button-4>", lambda e: self.zoom(e.x, True))
+        self.canvas.bind("<Button-5>", lambda e: self.zoom(e.x, False))
+
+    def set_timeline(self, timeline, levels=None):
+        # levels limits the stacked levels to the ones selected in the filter
+        if timeline is not self.timeline and (timeline is None or self.timeline is None
+                                              or timeline.store is not self.timeline.store):
+            self.view = None
+        self.timeline = timeline
+        self.levels = levels
+        self.draw()
+
+    def clear(self):
+        self.set_timeline(None)
+
+    def reset_zoom(self):
+        self.view = None
+        self.draw()
+
+    def span(self):
+        if self.view is not None:
+            return self.view
+        return self.timeline.start, self.timeline.end
+
+    def x_to_time(self, x: float) -> int:
+        start, end = self.span()
+        width = max(1, self.canvas.winfo_width())
+        return start + int((end - start) * min(max(x, 0), width) / width)
+
+    def time_to_x(self, micros: int) -> float:
+        start, end = self.span()
+        return (micros - start) * self.canvas.winfo_width() / (end - start)
+
+    def draw(self):
+        self.canvas.delete('all')
+        timeline = self.timeline
+        if timeline is None or not timeline.size:
+            return
+
+        width = self.canvas.winfo_width()
+        bottom = self.HEIGHT - self.AXIS_HEIGHT
+        start, end = self.span()
+        edges, counts = timeline.counts(start, end, max(1, width // self.BAR_PIXELS))
+        levels = [level for level in KNOWN_LEVELS + sorted(set(counts) - set(KNOWN_LEVELS))
+                  if level in counts and (self.levels is None or level in self.levels)]
+        totals = [sum(column) for column in zip(*(counts[level] for level in levels))]
+        peak = max(totals, default=0)
+
+        if peak:
+            scale = (bottom - 2) / peak
+            for i, total in enumerate(totals):
+                if not total:
+                    continue
+                x0, x1 = self.time_to_x(edges[i]), self.time_to_x(edges[i + 1])
+                y = bottom
+                for level in levels:
+                    count = counts[level][i]
+                    if count:
+                        height = count * scale
+                        color = TEXT_COLORS.get(level, TEXT_COLORS['default'])
+                        self.canvas.create_rectangle(x0, y - height, max(x0 + 1, x1 - 1), y, fill=color, width=0)
+                        y -= height
+
+        self.canvas.create_line(0, bottom, width, bottom, fill='gray')
+        self.canvas.create_text(2, 2, anchor=tk.NW, text=f"{peak}", fill='gray', font=('TkDefaultFont', 8))
+        self.canvas.create_text(2, self.HEIGHT - 1, anchor=tk.SW, font=('TkDefaultFont', 8),
+                                text=from_micros(start).strftime(TIME_FORMAT_INPUT))
+        self.canvas.create_text(width - 2, self.HEIGHT - 1, anchor=tk.SE, font=('TkDefaultFont', 8),
+                                text=from_micros(end).strftime(TIME_FORMAT_INPUT))
+
+    def zoom(self, x: int, zoom_in: bool):
+        if self.timeline is None or not self.timeline.size:
+            return
+        start, end = self.span()
+        pointer = self.x_to_time(x)
+        factor = 1 / self.ZOOM_FACTOR if zoom_in else self.ZOOM_FACTOR
+        new_start = pointer - int((pointer - start) * factor)
+        new_end = pointer + int((end - pointer) * factor)
+        self.set_view(new_start, new_end)
+
+    def set_view(self, start: int, end: int):
+        full_start, full_end = self.timeline.start, self.timeline.end
+        start, end = max(start, full_start), min(end, full_end)
+        if end - start < self.MIN_SPAN:
+            return
+        self.view = None if (start, end) == (full_start, full_end) else (start, end)
+        self.draw()
+
+    def on_press(self, event):
+        self.drag_start = event.x if self.timeline is not None and self.timeline.size else None
+
+    def on_drag(self, event):
+        if self.drag_start is None:
+            return
+        self.canvas.delete('selection')
+        self.canvas.create_rectangle(self.drag_start, 0, event.x, self.HEIGHT - self.AXIS_HEIGHT,
+                                     outline='gray', tags='selection')
+
+    def on_release(self, event):
+        if self.drag_start is None:
+            return
+        x0, x1 = sorted((self.drag_start, event.x))
+        self.drag_start = None
+        self.canvas.delete('selection')
+        if x1 - x0 < 3:
+            return
+        start, end = self.x_to_time(x0), self.x_to_time(x1)
+        self.set_view(start, end)
+        if self.on_select:
+            # The time fields take whole seconds, round outwards
+            time_from = from_micros(start).replace(microsecond=0)
+            time_to = from_micros(end)
+            if time_to.microsecond:
+                time_to = time_to.replace(microsecond=0) + timedelta(seconds=1)
+            self.on_select(time_from, time_to)
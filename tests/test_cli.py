@@ -0,0 +1,25 @@
+import json
+
+from cli import run
+
+
+def line(second, message):
+    return f"[2024-01-01 10:00:{second:02d}.000000] [INFO] {message}\n"
+
+
+def test_late_lines_within_the_window_are_sorted(tmp_path, capfd):
+    path = tmp_path / 'app.log'
+    path.write_text(line(2, 'b') + line(3, 'c') + line(1, 'late'))
+    assert run(['--no-gui', str(path), '--window', '4', '--format', 'ndjson']) == 0
+    out, err = capfd.readouterr()
+    assert [json.loads(text)['message'] for text in out.splitlines()] == ['late', 'b', 'c']
+    assert not err
+
+
+def test_late_lines_beyond_the_window_are_reported(tmp_path, capfd):
+    path = tmp_path / 'app.log'
+    path.write_text(line(2, 'b') + line(3, 'c') + line(4, 'd') + line(1, 'late'))
+    assert run(['--no-gui', str(path), '--window', '2', '--format', 'ndjson']) == 0
+    out, err = capfd.readouterr()
+    assert [json.loads(text)['message'] for text in out.splitlines()] == ['b', 'late', 'c', 'd']
+    assert '1 entries were more than 2 entries late' in err
@@ -0,0 +1,100 @@
+import pytest
+
+from core.log_parser import LogParser
+from core.parse_cache import ParseCache
+from core.text_search import TextSearch
+from core.trigram_index import TrigramIndex
+
+
+FIRST = "[2024-01-01 10:00:00.000000] [ERROR] boom\n  at a.b(c)\n"
+APPENDED = "  at g.h(i)\n[2024-01-01 10:00:01.000000] [INFO] next\n"
+
+
+def write(path, text, mode='w'):
+    with open(path, mode, newline='') as f:
+        f.write(text)
+
+
+@pytest.mark.parametrize('lazy_text', [False, True])
+def test_follow_keeps_leading_continuation(tmp_path, lazy_text):
+    path = str(tmp_path / 'app.log')
+    write(path, FIRST)
+    parser = LogParser(lazy_text=lazy_text)
+    store = parser.parse_files([path])
+
+    write(path, APPENDED, 'a')
+    appended, restarted = parser.parse_appended(path, store.tails[path])
+    assert not restarted
+    first = store.insert_sorted(appended)
+
+    assert first == 0
+    assert [entry.message for entry in store] == ['boom\n  at a.b(c)\n  at g.h(i)', 'next']
+
+
+@pytest.mark.parametrize('lazy_text', [False, True])
+def test_follow_continuation_of_earlier_entry(tmp_path, lazy_text):
+    # The last entry of the file is not the last entry of the store
+    path, other = str(tmp_path / 'app.log'), str(tmp_path / 'other.log')
+    write(path, FIRST)
+    write(other, "[2024-01-01 10:00:05.000000] [INFO] later\n")
+    parser = LogParser(lazy_text=lazy_text)
+    store = parser.parse_files([path, other])
+
+    write(path, APPENDED, 'a')
+    appended, _ = parser.parse_appended(path, store.tails[path])
+    first = store.insert_sorted(appended)
+
+    assert first == 0
+    assert [entry.message for entry in store] == ['boom\n  at a.b(c)\n  at g.h(i)', 'next', 'later']
+
+
+@pytest.mark.parametrize('lazy_text', [False, True])
+def test_cache_append_keeps_leading_continuation(tmp_path, lazy_text):
+    path = str(tmp_path / 'app.log')
+    write(path, FIRST)
+    parser = LogParser(lazy_text=lazy_text, cache=ParseCache(str(tmp_path / 'cache')))
+    parser.parse_file(path)
+
+    write(path, APPENDED, 'a')
+    store = parser.parse_file(path)
+
+    assert [entry.message for entry in store] == ['boom\n  at a.b(c)\n  at g.h(i)', 'next']
+    # The rewritten entry has them too
+    assert [entry.message for entry in parser.parse_file(path)] == ['boom\n  at a.b(c)\n  at g.h(i)', 'next']
+
+
+def test_leading_continuation_of_new_file_is_dropped(tmp_path):
+    path = str(tmp_path / 'app.log')
+    write(path, "  orphan\n" + FIRST)
+    store = LogParser().parse_files([path])
+    assert [entry.message for entry in store] == ['boom\n  at a.b(c)']
+    assert not store.continuations
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_lazy_text_matches_in_memory(tmp_path, newline):
+    path = str(tmp_path / 'app.log')
+    lines = ["[2024-01-01 10:00:00.000000] [ERROR] boom", "  at a.b(c)", "", "   ", "  at d.e(f)",
+             "[2024-01-01 10:00:01.000000] [INFO] next", ""]
+    write(path, newline.join(lines))
+    in_memory = [entry.raw for entry in LogParser().parse_files([path])]
+    lazy = [entry.raw for entry in LogParser(lazy_text=True).parse_files([path])]
+    assert lazy == in_memory
+    assert in_memory[0].endswith('boom\n  at a.b(c)\n  at d.e(f)')
+
+
+@pytest.mark.parametrize('lazy_text', [False, True])
+def test_trigram_index_over_continuation_entries(tmp_path, lazy_text):
+    path = str(tmp_path / 'app.log')
+    write(path, FIRST + "  at d.e(f)\n[2024-01-01 10:00:01.000000] [INFO] next step\n"
+                        "[2024-01-01 10:00:02.000000] [WARN] slow step\n  caused by disk\n")
+    store = LogParser(lazy_text=lazy_text).parse_files([path])
+    text_search = TextSearch(store)
+    trigrams = text_search.trigrams = TrigramIndex(text_search)
+    trigrams.build()
+
+    assert trigrams.complete and trigrams.covered == len(store) == 3
+    assert list(text_search.find('step')) == [1, 2]
+    assert list(text_search.find('at d.e')) == [0]
+    assert list(text_search.find('caused by')) == [2]
+    assert list(text_search.find('boom')) == [0]
@@ -0,0 +1,167 @@
+import random
+
+import pytest
+
+from core.log_filter import LogFilter
+from core.log_index import LogIndex
+from core.log_parser import LogParser
+from core.log_query import CodePredicate, QueryError, parse_query
+from core.text_search import TextSearch
+from core.trigram_index import TRIGRAM_BUDGET, TrigramIndex
+
+
+WORDS = ['timeout', 'refused', 'reset', 'cache', 'retry', 'commit', 'socket']
+
+
+def lines(count, seconds, seed):
+    rng = random.Random(seed)
+    for number in range(count):
+        second = seconds[number]
+        yield (f"[2024-01-01 10:{second // 60:02d}:{second % 60:02d}.000000] [INFO] "
+               f"user=u{rng.randint(1, 20)} {rng.choice(WORDS)} {rng.choice(WORDS)} #{number}\n")
+
+
+def test_rollback_keeps_indexes_equal_to_fresh_ones(tmp_path):
+    path = str(tmp_path / 'app.log')
+    with open(path, 'w') as f:
+        f.writelines(lines(3000, [number // 2 for number in range(3000)], 1))
+    parser = LogParser(fields=('user',))
+    store = parser.parse_files([path])
+
+    log_filter = LogFilter()
+    index = log_filter.get_index(store)
+    index.top_values('user', 5)
+    trigrams = log_filter.start_text_index(store)
+    trigrams.thread.join()
+    assert trigrams.complete
+
+    # Late lines land in the middle of the store
+    with open(path, 'a') as f:
+        f.writelines(lines(50, [600 + number for number in range(50)], 2))
+    appended, _ = parser.parse_appended(path, store.tails[path])
+    first = store.insert_sorted(appended)
+    assert first < 3000
+    log_filter.entries_added(store, first)
+    # Rolled back in place, not rebuilt
+    assert log_filter.text_search.trigrams is trigrams
+    trigrams.thread.join()
+    assert trigrams.complete and trigrams.covered == len(store)
+
+    fresh_search = TextSearch(store)
+    fresh = fresh_search.trigrams = TrigramIndex(fresh_search)
+    fresh.build()
+    assert {key: list(posting) for key, posting in trigrams.postings.items()} == \
+           {key: list(posting) for key, posting in fresh.postings.items()}
+    assert trigrams.posting_count == fresh.posting_count
+    for query in ('timeout', 'cache retry', 'u7 '):
+        assert list(log_filter.find_text(store, query, False)) == list(fresh_search.find(query))
+
+    index = log_filter.get_index(store)
+    fresh_index = LogIndex(store)
+    assert index.top_values('user', 20) == fresh_index.top_values('user', 20)
+    assert {key: list(posting) for key, posting in index.facet('user').items()} == \
+           {key: list(posting) for key, posting in fresh_index.facet('user').items()}
+
+
+def test_budgeted_text_search_finds_the_same(tmp_path, monkeypatch):
+    from core import text_search, trigram_index
+    monkeypatch.setattr(text_search, 'BLOCK_SIZE', 256)
+    monkeypatch.setattr(trigram_index, 'BLOCK_SIZE', 256)
+    path = str(tmp_path / 'app.log')
+    with open(path, 'w') as f:
+        f.writelines(lines(3000, [number // 2 for number in range(3000)], 3))
+    store = LogParser(lazy_text=True).parse_files([path])
+
+    full = TextSearch(store)
+    budgeted = TextSearch(store, budget=1)
+    for query in ('timeout', 'cache retry', '#12'):
+        assert list(budgeted.find(query)) == list(full.find(query))
+    assert list(budgeted.find_regex('re(set|try) c')) == list(full.find_regex('re(set|try) c'))
+    assert list(budgeted.refine(range(0, 3000, 7), 'socket')) == list(full.refine(range(0, 3000, 7), 'socket'))
+    # Only the last block used is kept
+    assert sum(block is not None for block in budgeted.blocks) == 1
+    assert budgeted.nbytes() < full.nbytes() / 5
+
+    budgeted.trigrams = TrigramIndex(budgeted)
+    budgeted.trigrams.build()
+    assert list(budgeted.find('commit socket')) == list(full.find('commit socket'))
+
+
+def test_field_names_clashing_with_query_fields_are_rejected():
+    for names in (('level',), ('request_id', 'File'), ('to',), ('bad-name',)):
+        with pytest.raises(QueryError):
+            LogParser(fields=names)
+    assert LogParser(fields=('request_id', 'thread')).fields == ('request_id', 'thread')
+    assert LogParser().fields == ()
+
+
+def test_code_predicate_needs_codes():
+    with pytest.raises(TypeError):
+        CodePredicate()
+
+
+LEVELS = ['INFO', 'ERROR', 'WARN', 'DEBUG']
+
+TEXT_QUERIES = ['timeout', 'Cache Retry', 'u7 ', 'at com.', 'zzz']
+REGEX_QUERIES = ['ret(ry|ried)', r'u1\d ', 'timeout|refused']
+QUERIES = ['timeout -(cache OR reset)', 'level:error socket', r're:"u1\d " OR refused',
+           'NOT timeout', '-(timeout OR retry) level:warning,debug', '"cache retry" #1']
+
+
+def mixed_lines(count, seconds, seed):
+    # Mixed levels and case, every fifth entry with continuation lines
+    rng = random.Random(seed)
+    for number in range(count):
+        second = seconds[number]
+        yield (f"[2024-01-01 10:{second // 60:02d}:{second % 60:02d}.000000] [{rng.choice(LEVELS)}] "
+               f"user=u{rng.randint(1, 20)} {rng.choice(WORDS).upper()} {rng.choice(WORDS)} #{number}\n")
+        if number % 5 == 0:
+            yield f"  at com.app.{rng.choice(WORDS)}(Main.java:{number})\n"
+
+
+def check_indexed_equals_scan(log_filter, store):
+    # The trigram index and the LogIndex answer as a plain look at every entry
+    trigrams = log_filter.text_search.trigrams
+    if trigrams.is_running():
+        trigrams.thread.join()
+    entries = list(store)
+    everything = range(len(store))
+    plain = LogFilter()
+    for search_text in TEXT_QUERIES:
+        expected = list(filter(plain.matcher(None, None, None, search_text, False), entries))
+        assert [store[i].raw for i in log_filter.find_text(store, search_text, False)] == \
+               [entry.raw for entry in expected]
+        assert list(plain.scan(store, everything, None, None, None, search_text, False).indices) == \
+               list(log_filter.apply(store, search_text=search_text).indices)
+    for pattern in REGEX_QUERIES:
+        expected = list(filter(plain.matcher(None, None, None, pattern, True), entries))
+        assert [store[i].raw for i in log_filter.find_text(store, pattern, True)] == \
+               [entry.raw for entry in expected]
+    for text in QUERIES:
+        query = parse_query(text)
+        assert [entry.raw for entry in log_filter.apply_query(store, query)] == \
+               [entry.raw for entry in plain.apply_query(entries, query)]
+
+
+@pytest.mark.parametrize('lazy_text, budget', [(False, TRIGRAM_BUDGET), (True, TRIGRAM_BUDGET), (False, 20000)],
+                         ids=['in_memory', 'lazy_text', 'full_index'])
+def test_indexed_search_equals_scan(tmp_path, lazy_text, budget):
+    path = str(tmp_path / 'app.log')
+    with open(path, 'w') as f:
+        f.writelines(mixed_lines(2000, [number // 2 for number in range(2000)], 4))
+    parser = LogParser(lazy_text=lazy_text)
+    store = parser.parse_files([path])
+
+    log_filter = LogFilter()
+    trigrams = log_filter.start_text_index(store, budget)
+    trigrams.thread.join()
+    assert trigrams.full == (budget != TRIGRAM_BUDGET)
+    check_indexed_equals_scan(log_filter, store)
+
+    # Follow mode: lines at the end, then late lines landing in the middle
+    for seconds in ([1000 + number for number in range(40)], [300 + number for number in range(40)]):
+        with open(path, 'a') as f:
+            f.writelines(mixed_lines(40, seconds, seconds[0]))
+        appended, _ = parser.parse_appended(path, store.tails[path])
+        log_filter.entries_added(store, store.insert_sorted(appended))
+        check_indexed_equals_scan(log_filter, store)
@@ -0,0 +1,34 @@
+from core.log_filter import LogFilter
+from core.log_parser import LogParser
+from core.log_query import parse_query
+
+
+ISO_LINES = [
+    "2024-01-01T10:00:00Z Starting server",
+    "2024-01-01T10:00:01Z main INFO hello",
+    "2024-01-01T10:00:02.5Z ERROR boom",
+    "[2024-01-01T10:00:03+00:00] [warn] disk at 90%",
+    "2024-01-01 10:00:04,250 Error: lost connection",
+    "2024-01-01T10:00:05Z errors are counted",
+    "2024-01-01T10:00:06Z [Information] ready",
+]
+
+
+def test_iso_lines_with_and_without_levels(tmp_path):
+    path = str(tmp_path / 'app.log')
+    with open(path, 'w') as f:
+        f.write('\n'.join(ISO_LINES) + '\n')
+    store = LogParser().parse_files([path])
+
+    assert [(entry.level, entry.message) for entry in store] == [
+        ('info', 'Starting server'),
+        ('info', 'main INFO hello'),
+        ('error', 'boom'),
+        ('warning', 'disk at 90%'),
+        ('error', 'lost connection'),
+        ('info', 'errors are counted'),
+        ('info', 'ready'),
+    ]
+    # The level filter the GUI always adds keeps all of them
+    selection = LogFilter().apply_query(store, parse_query('level:error,warning,info,debug,trace'))
+    assert len(selection) == len(ISO_LINES)
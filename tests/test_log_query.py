@@ -0,0 +1,34 @@
+import pytest
+
+from core.log_query import QueryError, QueryParser
+
+
+def key(query):
+    return QueryParser(query).parse().key()
+
+
+NOT_A_OR_B = ('not', ('or', ('msg', 'a'), ('msg', 'b')))
+
+
+@pytest.mark.parametrize('query', ['-(a OR b)', 'NOT (a OR b)', 'NOT(a OR b)', ' -(a OR b) '])
+def test_negated_group(query):
+    assert key(query) == NOT_A_OR_B
+
+
+def test_minus_before_operators():
+    assert set(key('x -(a OR b)')) == {'and', NOT_A_OR_B, ('msg', 'x')}
+    assert key('--(a)') == ('not', ('not', ('msg', 'a')))
+    assert key('-NOT a') == ('not', ('not', ('msg', 'a')))
+
+
+def test_minus_before_terms_is_unchanged():
+    assert key('-a') == ('not', ('msg', 'a'))
+    assert key('-level:error') == ('not', ('level', ('error',)))
+    assert key('--verbose') == ('not', ('msg', '-verbose'))
+    assert key('a - b') == ('and', ('msg', '-'), ('msg', 'a'), ('msg', 'b'))
+
+
+def test_negation_needs_an_operand():
+    for query in ('-(', 'NOT', '-()'):
+        with pytest.raises(QueryError):
+            QueryParser(query).parse()
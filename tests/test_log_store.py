@@ -0,0 +1,75 @@
+import pytest
+
+from core.log_parser import LogParser
+from core.log_store import ENTRY_OVERHEAD_TARGET, LogStore
+
+
+def make_store(file_path, timestamps, lazy_text=False):
+    # One entry per timestamp, the raw line names the file and position
+    store = LogStore(lazy_text)
+    file_id = store.file_id(file_path)
+    offset = 0
+    for line_number, timestamp in enumerate(timestamps, 1):
+        raw = f"{file_path}:{line_number}"
+        store.append(timestamp, 'info', file_id, line_number, raw, 0, (offset, len(raw)))
+        offset += len(raw) + 1
+    return store
+
+
+def reference_order(runs):
+    # Stable sort of the concatenated runs
+    entries = [(timestamp, run.raw(index)) for run in runs for index, timestamp in enumerate(run.timestamps)]
+    return [raw for _, raw in sorted(entries, key=lambda entry: entry[0])]
+
+
+@pytest.mark.parametrize('timestamps', [
+    # Interleaved, with equal timestamps across and within runs
+    [[1, 3, 3, 5, 7], [2, 3, 4, 7, 8], [0, 3, 9]],
+    # Late lines inside a run
+    [[1, 5, 2, 6, 3], [4, 4, 0]],
+    # Runs that follow each other, concatenated
+    [[1, 2, 3], [3, 4], [5, 6]],
+    # A single unsorted run
+    [[3, 1, 2]],
+])
+def test_merge_is_stable_sort(timestamps):
+    runs = [make_store(f"app{number}.log", run) for number, run in enumerate(timestamps)]
+    merged = LogStore.merge(runs)
+    assert [merged.raw(index) for index in range(len(merged))] == reference_order(runs)
+    assert list(merged.timestamps) == sorted(merged.timestamps)
+    for index in range(len(merged)):
+        file_path, _ = merged.files[merged.file_ids[index]]
+        assert merged.raw(index) == f"{file_path}:{merged.line_numbers[index]}"
+
+
+def test_merge_keeps_runs_unchanged():
+    runs = [make_store('a.log', [2, 1]), make_store('b.log', [0, 3])]
+    LogStore.merge(runs)
+    assert [list(run.timestamps) for run in runs] == [[2, 1], [0, 3]]
+
+
+def test_merge_of_nothing():
+    assert len(LogStore.merge([])) == 0
+    assert len(LogStore.merge([LogStore(), make_store('a.log', [1])])) == 1
+
+
+
+@pytest.mark.parametrize('lazy_text', [False, True])
+def test_overhead_per_entry_within_target(lazy_text):
+    store = make_store('app.log', range(100000), lazy_text)
+    assert store.overhead_per_entry() <= ENTRY_OVERHEAD_TARGET
+
+
+def test_overhead_per_entry_of_empty_store():
+    assert LogStore().overhead_per_entry() == 0.0
+
+
+@pytest.mark.parametrize('lazy_text', [False, True])
+def test_long_line_prefix_keeps_the_whole_line(tmp_path, lazy_text):
+    path = str(tmp_path / 'app.log')
+    long_line = "2024-01-01T10:00:00Z ERROR" + " " * 70000 + "boom"
+    with open(path, 'w') as f:
+        f.write(long_line + "\n2024-01-01T10:00:01Z INFO next\n")
+    store = LogParser(lazy_text=lazy_text).parse_files([path])
+    assert [entry.message for entry in store] == [long_line, 'next']
+    assert store[0].level == 'error'
@@ -0,0 +1,55 @@
+import os
+
+from core.mapped_text import MappedText
+
+
+LINES = "[2024-01-01 10:00:00.000000] [INFO] first\n[2024-01-01 10:00:01.000000] [INFO] second\n"
+
+
+def recorded(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    mapped = MappedText([(path, os.path.basename(path))])
+    mapped.record_signature(path)
+    return mapped
+
+
+def rewrite(path, text, mode='w'):
+    # Written a second later, as mtime resolution may be coarse
+    stat = os.stat(path)
+    with open(path, mode) as f:
+        f.write(text)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+
+def test_append_and_touch_are_not_changes(tmp_path):
+    path = str(tmp_path / 'app.log')
+    mapped = recorded(path, LINES)
+    rewrite(path, LINES, 'a')
+    assert not mapped.is_changed(path)
+    os.utime(path, ns=(0, 0))
+    assert not mapped.is_changed(path)
+
+
+def test_rewrite_in_place_is_a_change(tmp_path):
+    path = str(tmp_path / 'app.log')
+    mapped = recorded(path, LINES)
+    rewrite(path, LINES.replace('first', 'FIRST'))
+    assert mapped.is_changed(path)
+
+
+def test_copytruncate_and_regrowth_is_a_change(tmp_path):
+    path = str(tmp_path / 'app.log')
+    mapped = recorded(path, LINES)
+    rewrite(path, LINES.replace('10:00', '11:00') * 2)
+    assert mapped.is_changed(path)
+
+
+def test_truncate_and_removal_are_changes(tmp_path):
+    path = str(tmp_path / 'app.log')
+    mapped = recorded(path, LINES)
+    rewrite(path, LINES[:10])
+    assert mapped.is_changed(path)
+    os.remove(path)
+    assert mapped.is_changed(path)
+    assert mapped.changed_files() == [path]
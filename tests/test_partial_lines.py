@@ -0,0 +1,49 @@
+import pytest
+
+from core.log_parser import LogParser
+from core.parse_cache import ParseCache
+
+
+COMPLETE = "[2024-01-01 10:00:00.000000] [ERROR] boom\n"
+PARTIAL = "[2024-01-01 10:00:01.000000] [INFO] hal"
+
+
+def write(path, text, mode='w'):
+    with open(path, mode, newline='') as f:
+        f.write(text)
+
+
+@pytest.mark.parametrize('lazy_text', [False, True])
+def test_half_written_line_waits_for_newline(tmp_path, lazy_text):
+    path = str(tmp_path / 'app.log')
+    write(path, COMPLETE + PARTIAL)
+    parser = LogParser(lazy_text=lazy_text, complete_lines=True)
+    store = parser.parse_files([path])
+    assert [entry.message for entry in store] == ['boom']
+    assert store.tails[path].offset == len(COMPLETE)
+    assert store.tails[path].line_count == 1
+
+    write(path, "f written\n", 'a')
+    appended, _ = parser.parse_appended(path, store.tails[path])
+    store.insert_sorted(appended)
+    assert [entry.message for entry in store] == ['boom', 'half written']
+    assert [entry.line_number for entry in store] == [1, 2]
+
+
+@pytest.mark.parametrize('lazy_text', [False, True])
+def test_half_written_line_through_cache(tmp_path, lazy_text):
+    path = str(tmp_path / 'app.log')
+    write(path, COMPLETE + PARTIAL)
+    parser = LogParser(lazy_text=lazy_text, complete_lines=True, cache=ParseCache(str(tmp_path / 'cache')))
+    assert [entry.message for entry in parser.parse_file(path)] == ['boom']
+    assert [entry.message for entry in parser.parse_file(path)] == ['boom']
+
+    write(path, "f written\n", 'a')
+    assert [entry.message for entry in parser.parse_file(path)] == ['boom', 'half written']
+
+
+def test_last_line_parsed_without_complete_lines(tmp_path):
+    path = str(tmp_path / 'app.log')
+    write(path, COMPLETE + PARTIAL)
+    store = LogParser().parse_files([path])
+    assert [entry.message for entry in store] == ['boom', 'hal']
@@ -0,0 +1,28 @@
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+from core.log_parser import LogParser
+from core.source_reader import find_log_files, read_source
+
+
+TEXT = b"[2024-01-01 10:00:00.000000] [INFO] compressed\n"
+
+
+@pytest.mark.parametrize('name, compress', [
+    ('app.log', bytes),
+    ('app.log.1.gz', gzip.compress),
+    ('app.log.bz2', bz2.compress),
+    ('app.log.xz', lzma.compress),
+    ('app.log.lzma', lambda data: lzma.compress(data, format=lzma.FORMAT_ALONE)),
+    # xz data under the legacy extension is still found by its magic number
+    ('old.log.lzma', lzma.compress),
+])
+def test_compressed_sources_are_read(tmp_path, name, compress):
+    path = tmp_path / name
+    path.write_bytes(compress(TEXT))
+    assert read_source(str(path)) == TEXT
+    assert str(path) in find_log_files(str(tmp_path))
+    assert [entry.message for entry in LogParser().parse_files([str(path)])] == ['compressed']